@@ -1,16 +1,54 @@
-from openai import OpenAI
+import asyncio
 import config
 import json
 import os
-import json
+import time
 from datetime import datetime
 from zoneinfo import ZoneInfo
+from llm_cache import LLMCache, request_key, response_cost
+
+LLM_CONCURRENCY = config.LLM_CONCURRENCY
+
+# 保有ポジションの一括レビューの構造化出力（condition_id とアウトカムの組ごとに維持・売却）
+POSITION_REVIEW_FORMAT = {
+    "type": "json_schema",
+    "name": "position_review",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "verdicts": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "condition_id": {"type": "string"},
+                        "outcome": {"type": "string"},
+                        "verdict": {"type": "string", "enum": ["維持", "売却"]},
+                        "reason": {"type": "string"},
+                    },
+                    "required": ["condition_id", "outcome", "verdict", "reason"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["verdicts"],
+        "additionalProperties": False,
+    },
+}
+
+
+def position_review_key(condition_id, outcome):
+    """判断のキー。同じマーケットの両方のアウトカムを持っていても別々に判断する"""
+    return f"{condition_id}:{outcome}"
 
 
 class Agent(object):
     def __init__(self):
-        self.openai_client = OpenAI(api_key=config.OPENAI_API_KEY)
+        self._openai_client = None
         self.model = config.MODEL
+        # 同じ入力への応答は TTL の間キャッシュから返す（self.cache.stats() で節約額を確認できる）
+        self.cache = LLMCache() if config.LLM_CACHE_ENABLED else None
 
         # ログ保存先
         self.log_dir = "openai_logs"
@@ -57,6 +95,40 @@ class Agent(object):
         ]
 
 
+    @property
+    def openai_client(self):
+        # openai は読み込みが重いので、LLMを実際に呼ぶ時に読み込む
+        if self._openai_client is None:
+            from openai import OpenAI
+            self._openai_client = OpenAI(api_key=config.OPENAI_API_KEY)
+        return self._openai_client
+
+    def _create(self, kind: str, extract, **request):
+        """
+        responses.create を呼んで extract(response) を返す
+        同じ種類・同じ引数の呼び出しがキャッシュにあれば、APIを呼ばずにその結果を返す
+        """
+        key, cached = self._lookup(kind, request)
+        if cached is not None:
+            return cached
+        started = time.perf_counter()
+        response = self.openai_client.responses.create(**request)
+        return self._finish(kind, key, extract, response, time.perf_counter() - started)
+
+    def _lookup(self, kind: str, request: dict):
+        key = request_key(kind, request)
+        if self.cache is None:
+            return key, None
+        return key, self.cache.get(kind, key)
+
+    def _finish(self, kind: str, key: str, extract, response, elapsed: float):
+        # ログ保存
+        self._save_openai_response_json(response)
+        result = extract(response)
+        if self.cache is not None and result is not None:
+            self.cache.put(kind, key, result, cost=response_cost(self.model, response), elapsed=elapsed)
+        return result
+
     # --- ユーティリティ: レスポンスJSONを保存 ---
     def _save_openai_response_json(self, response_obj) -> str:
         """
@@ -64,13 +136,13 @@ class Agent(object):
         保存構造:
             openai_log/
                 YYYYmmdd/
-                    HHMMSS.json
-        （Asia/Tokyo）
+                    HHMMSS_ffffff.json
+        （Asia/Tokyo。並行して呼んでも上書きしないようにマイクロ秒まで付ける）
         """
 
         now = datetime.now(ZoneInfo("Asia/Tokyo"))
         date_str = now.strftime("%Y%m%d")
-        time_str = now.strftime("%H%M%S")
+        time_str = now.strftime("%H%M%S_%f")
 
         # 日付フォルダを作成
         date_dir = os.path.join(self.log_dir, date_str)
@@ -119,51 +191,32 @@ class Agent(object):
         # 既に dict ならそのまま
         return args or {}
     
-    def call_tool_to_show_detail_market(self, prompt):
-        """
-        マーケットの詳細を取得する
-        """
+    # --- リクエストの組み立て: (呼び出しの種類, 結果の取り出し方, responses.create の引数) ---
+    def _show_detail_market_request(self, prompt):
         conversation = [
             {
                 "role": "user",
                 "content": [{"type": "input_text", "text": prompt}],
             }
         ]
-        response = self.openai_client.responses.create(
+
+        def extract(response):
+            calls = self._extract_function_calls(response)
+            if not calls:
+                return None
+            arguments = self._get_call_arguments(calls[0])
+            return arguments.get("market_id")
+
+        request = dict(
             model=self.model,
             input=conversation,
             tools=self.tools,
             tool_choice={"type": "function", "name": "show_market_detail"},
             reasoning={"effort": "low"},
         )
+        return "show_market_detail", extract, request
 
-        calls = self._extract_function_calls(response)
-
-        if calls:
-            call = calls[0]
-            func = self._get_call_name(call)
-            arguments = self._get_call_arguments(call)
-
-            market_id = arguments.get("market_id")
-
-        # ログ保存
-        self._save_openai_response_json(response)
-        return market_id
-    
-    def get_LLM_opiniton(self, prompt, image_base64: str | None = None):
-        """
-        LLMの意見を聞く。
-        """
-        contents = [
-            {"type": "input_text", "text": prompt},
-        ]
-
-        if image_base64:
-            contents.append({
-                "type": "input_image",
-                "image_url": f"data:image/png;base64,{image_base64}",  # png は実際の形式に合わせる
-            })
-
+    def _opinion_request(self, prompt, image_base64: str | None = None):
         conversation = [
             {
                 "role": "system",
@@ -171,66 +224,235 @@ class Agent(object):
             },
             {
                 "role": "user",
-                "content": contents,
+                "content": self._user_contents(prompt, image_base64),
             }
         ]
-
-        response = self.openai_client.responses.create(
+        request = dict(
             model=self.model,
             input=conversation,
             tools=[{"type": "web_search"}],
             reasoning={"effort": "medium"},
         )
-
-        # ログ保存
-        self._save_openai_response_json(response)
-
         # 出力テキストのみ返す
-        return response.output_text
+        return "opinion", lambda response: response.output_text, request
 
-    
-    def call_tool_to_make_order(self, prompt, image_base64: str | None = None):
-        """
-        購入するトークンの種類と個数を決定する。
-        """
-        contents = [
-            {"type": "input_text", "text": prompt},
+    def _make_order_request(self, prompt, image_base64: str | None = None):
+        conversation = [
+            {
+                "role": "user",
+                "content": self._user_contents(prompt, image_base64),
+            }
         ]
 
-        if image_base64:
-            contents.append({
-                "type": "input_image",
-                "image_url": f"data:image/png;base64,{image_base64}",  # png は実際の形式に合わせる
-            })
+        def extract(response):
+            calls = self._extract_function_calls(response)
+            if not calls:
+                return None
+            arguments = self._get_call_arguments(calls[0])
+            return [arguments.get("token"), arguments.get("size")]
+
+        request = dict(
+            model=self.model,
+            input=conversation,
+            tools=self.tools,
+            tool_choice={"type": "function", "name": "make_order"},
+            reasoning={"effort": "medium"},
+        )
+        return "make_order", extract, request
 
+    def _review_positions_request(self, prompt, web_search: bool = True):
         conversation = [
+            {
+                "role": "system",
+                "content": "Web検索は必要なポジションについてのみ、合計で最大数回にしてください。"
+            },
             {
                 "role": "user",
-                "content": contents,
+                "content": [{"type": "input_text", "text": prompt}],
             }
         ]
-        response = self.openai_client.responses.create(
+        request = dict(
             model=self.model,
             input=conversation,
-            tools=self.tools,
-            tool_choice={"type": "function", "name": "make_order"},
+            text={"format": POSITION_REVIEW_FORMAT},
             reasoning={"effort": "medium"},
         )
+        if web_search:
+            request["tools"] = [{"type": "web_search"}]
+        return "review_positions", lambda response: self._parse_position_review(response.output_text), request
+
+    @staticmethod
+    def _parse_position_review(text):
+        """構造化出力から {position_review_key: {"verdict": "維持" or "売却", "reason": ...}} を作る"""
+        try:
+            data = json.loads(text)
+        except (json.JSONDecodeError, TypeError):
+            return None
+        return {
+            position_review_key(item["condition_id"], item["outcome"]): {
+                "verdict": item["verdict"],
+                "reason": item.get("reason", ""),
+            }
+            for item in data.get("verdicts", [])
+        }
+
+    @staticmethod
+    def _user_contents(prompt, image_base64: str | None = None):
+        contents = [
+            {"type": "input_text", "text": prompt},
+        ]
+
+        if image_base64:
+            contents.append({
+                "type": "input_image",
+                "image_url": f"data:image/png;base64,{image_base64}",  # png は実際の形式に合わせる
+            })
+        return contents
 
-        calls = self._extract_function_calls(response)
+    def call_tool_to_show_detail_market(self, prompt):
+        """
+        マーケットの詳細を取得する
+        """
+        kind, extract, request = self._show_detail_market_request(prompt)
+        return self._create(kind, extract, **request)
+    
+    def get_LLM_opiniton(self, prompt, image_base64: str | None = None):
+        """
+        LLMの意見を聞く。
+        """
+        kind, extract, request = self._opinion_request(prompt, image_base64)
+        return self._create(kind, extract, **request)
 
-        if calls:
-            call = calls[0]
-            func = self._get_call_name(call)
-            arguments = self._get_call_arguments(call)
+    def call_tool_to_make_order(self, prompt, image_base64: str | None = None):
+        """
+        購入するトークンの種類と個数を決定する。
+        """
+        kind, extract, request = self._make_order_request(prompt, image_base64)
+        result = self._create(kind, extract, **request)
+        token, size = result if result is not None else (None, None)
+        return token, size
 
-            token = arguments.get("token")
-            size = arguments.get("size")
+    def review_positions(self, prompt):
+        """
+        複数のポジションの維持・売却をまとめて判断させる（1リクエスト・構造化出力）
+        戻り値: {position_review_key(condition_id, outcome): {"verdict": "維持" or "売却", "reason": 理由}}
+        """
+        kind, extract, request = self._review_positions_request(prompt)
+        return self._create(kind, extract, **request) or {}
 
+    # --- Batch API: まとめて投げておき、後で結果を取りに行く（料金が安い代わりに最大24時間かかる） ---
+    def submit_position_reviews(self, prompts):
+        """
+        prompts: {custom_id: プロンプト}。Batch API に投げてバッチIDを返す
+        Batch API では Web検索が使えないので、構造化出力だけで判断させる
+        """
+        lines = []
+        for custom_id, prompt in prompts.items():
+            _, _, request = self._review_positions_request(prompt, web_search=False)
+            lines.append(json.dumps(
+                {"custom_id": custom_id, "method": "POST", "url": "/v1/responses", "body": request},
+                ensure_ascii=False,
+            ))
+        batch_input = self.openai_client.files.create(
+            file=("position_reviews.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch",
+        )
+        batch = self.openai_client.batches.create(
+            input_file_id=batch_input.id,
+            endpoint="/v1/responses",
+            completion_window="24h",
+        )
+        return batch.id
 
-        # ログ保存
-        self._save_openai_response_json(response)
+    def collect_position_reviews(self, batch_id):
+        """
+        バッチが終わっていれば判断をまとめて返す（review_positions と同じ形）。まだなら None
+        失敗・期限切れ・キャンセルされたバッチは RuntimeError
+        """
+        from openai import NotFoundError
+        try:
+            batch = self.openai_client.batches.retrieve(batch_id)
+        except NotFoundError as exc:
+            raise RuntimeError(f"batch {batch_id} not found") from exc
+        if batch.status in ("failed", "expired", "cancelled"):
+            raise RuntimeError(f"batch {batch_id} {batch.status}: {batch.errors}")
+        if batch.status != "completed":
+            return None
+        verdicts = {}
+        if batch.output_file_id is None:
+            return verdicts
+        content = self.openai_client.files.content(batch.output_file_id).text
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            body = (item.get("response") or {}).get("body")
+            if not body:
+                continue
+            # ログ保存（バッチの結果は dict のまま保存する）
+            self._save_openai_response_json(body)
+            text = "".join(
+                part.get("text", "")
+                for output in body.get("output", [])
+                if output.get("type") == "message"
+                for part in output.get("content", [])
+                if part.get("type") == "output_text"
+            )
+            verdicts.update(self._parse_position_review(text) or {})
+        return verdicts
+
+
+class AsyncAgent(Agent):
+    """
+    Agent の非同期版（AsyncOpenAI を使う）。プロンプト・ツール定義・キャッシュは Agent と共通
+    max_concurrency: 同時に投げるリクエスト数の上限
+    """
+    def __init__(self, max_concurrency: int = LLM_CONCURRENCY):
+        super().__init__()
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+
+    @property
+    def openai_client(self):
+        if self._openai_client is None:
+            from openai import AsyncOpenAI
+            self._openai_client = AsyncOpenAI(api_key=config.OPENAI_API_KEY)
+        return self._openai_client
+
+    async def _create(self, kind: str, extract, **request):
+        key, cached = self._lookup(kind, request)
+        if cached is not None:
+            return cached
+        if self._semaphore is None:
+            # イベントループの中で作る
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            started = time.perf_counter()
+            response = await self.openai_client.responses.create(**request)
+            elapsed = time.perf_counter() - started
+        return self._finish(kind, key, extract, response, elapsed)
+
+    async def call_tool_to_show_detail_market(self, prompt):
+        kind, extract, request = self._show_detail_market_request(prompt)
+        return await self._create(kind, extract, **request)
+
+    async def get_LLM_opiniton(self, prompt, image_base64: str | None = None):
+        kind, extract, request = self._opinion_request(prompt, image_base64)
+        return await self._create(kind, extract, **request)
+
+    async def call_tool_to_make_order(self, prompt, image_base64: str | None = None):
+        kind, extract, request = self._make_order_request(prompt, image_base64)
+        result = await self._create(kind, extract, **request)
+        token, size = result if result is not None else (None, None)
         return token, size
 
-        
+    async def review_positions(self, prompt):
+        kind, extract, request = self._review_positions_request(prompt)
+        return await self._create(kind, extract, **request) or {}
+
+    # Batch API は同期クライアント前提なので非同期版では扱わない
+    def submit_position_reviews(self, prompts):
+        raise NotImplementedError("Batch API のジョブは Agent を使ってください")
 
+    def collect_position_reviews(self, batch_id):
+        raise NotImplementedError("Batch API のジョブは Agent を使ってください")
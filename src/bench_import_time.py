@@ -0,0 +1,82 @@
+"""
+各エントリポイントの import 時間を python -X importtime で測り、起動時間の予算を超えていないか確認する
+予算を超えたものがあれば終了コード1で終わる（cron に載せる前の確認用）
+    python bench_import_time.py [繰り返し回数]
+"""
+from __future__ import annotations
+
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent
+
+# エントリポイントごとの import 時間の予算 [ms]
+STARTUP_BUDGET_MS = {
+    "buy_new_tokens": 300,
+    "sell_own_tokens": 300,
+    "track_top_liquidity_prices": 500,
+    "track_own_token_prices": 500,
+}
+
+# import した時点で読み込まれていてはいけない重い依存
+LAZY_MODULES = ("matplotlib", "openai", "py_clob_client_v2", "eth_account", "dateutil")
+
+
+def import_profile(module: str) -> tuple[float, list[tuple[float, str]]]:
+    """(module の累積 import 時間[ms], 直下の import の [(累積ms, 名前)]) を返す"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0.0
+    children = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        ms = int(cumulative) / 1000
+        if depth == 0:
+            # 子の行は親より先に出るので、module 以外のトップレベルが来たら捨てる
+            if name.strip() == module:
+                total = ms
+                break
+            children = []
+        elif depth == 1:
+            children.append((ms, name.strip()))
+    return total, children
+
+
+def loaded_lazy_modules(module: str) -> list[str]:
+    code = f"import sys, {module}; print(' '.join(sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=SRC_DIR, capture_output=True, text=True, check=True
+    )
+    loaded = set(result.stdout.split())
+    return [name for name in LAZY_MODULES if name in loaded]
+
+
+def main(repeat: int) -> int:
+    over_budget = 0
+    for module, budget in STARTUP_BUDGET_MS.items():
+        runs = [import_profile(module) for _ in range(repeat)]
+        total = statistics.median(run[0] for run in runs)
+        heaviest = sorted(runs[-1][1], reverse=True)[:5]
+        eager = loaded_lazy_modules(module)
+        ok = total <= budget and not eager
+        over_budget += not ok
+        print(f"{'OK  ' if ok else 'OVER'} {module:<28} {total:7.1f} ms (budget {budget} ms)")
+        print("       heaviest: " + ", ".join(f"{name} {ms:.0f}ms" for ms, name in heaviest))
+        if eager:
+            print(f"       loaded eagerly: {', '.join(eager)}")
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    sys.exit(main(repeat))
@@ -0,0 +1,135 @@
+"""
+/events の大きな応答を使って、結果の受け渡しにかかる時間を比較する
+    従来: 辞書を組み立て → json.dumps(indent=2) で文字列化 → 呼び出し側で json.loads
+    改善: Event / Market をそのまま返す（outcomes 等のパースは orjson があればそちらを使う）
+記録した応答ファイルを渡せばそれを使い、無ければ同じ形の応答を生成する
+    python bench_models.py [記録したJSONファイル] [繰り返し回数]
+"""
+from __future__ import annotations
+
+import json
+import random
+import sys
+import time
+
+import models
+from models import Event, Market
+
+
+def synthetic_events(n_events: int = 200, n_markets: int = 20, seed: int = 0) -> bytes:
+    """Gamma /events と同じ形の応答（outcomes 等は文字列化されたJSON）"""
+    rng = random.Random(seed)
+    events = []
+    for i in range(n_events):
+        markets = []
+        for j in range(n_markets):
+            yes = round(rng.uniform(0.01, 0.99), 3)
+            markets.append({
+                "id": str(500000 + i * n_markets + j),
+                "conditionId": "0x" + "%064x" % rng.getrandbits(256),
+                "question": f"Will outcome {j} of event {i} happen?",
+                "description": "This market will resolve to Yes if ... " * 20,
+                "outcomes": json.dumps(["Yes", "No"]),
+                "outcomePrices": json.dumps([str(yes), str(round(1 - yes, 3))]),
+                "clobTokenIds": json.dumps([str(rng.getrandbits(255)), str(rng.getrandbits(255))]),
+                "endDate": "2026-12-31T00:00:00Z",
+                "volume": str(rng.uniform(1e4, 1e7)),
+            })
+        events.append({
+            "id": str(10000 + i),
+            "title": f"Event {i}",
+            "description": "Event description ... " * 30,
+            "liquidity": rng.uniform(1e3, 1e6),
+            "volume": rng.uniform(1e4, 1e7),
+            "markets": markets,
+        })
+    return json.dumps(events).encode("utf-8")
+
+
+def legacy_results(events: list[dict], max_higher_price: float = 0.90) -> str:
+    """以前の get_recent_events_and_markets: 辞書を組み立てて JSON 文字列で返す"""
+    eventdata = []
+    for event in events:
+        marketdata = []
+        for market in event.get("markets", []):
+            token_name = market.get("outcomes")
+            token_price = market.get("outcomePrices")
+            token_ids = market.get("clobTokenIds")
+            if token_name is None or token_price is None or token_ids is None:
+                continue
+            token_name = json.loads(token_name)
+            token_price = [float(p) for p in json.loads(token_price)]
+            if "Yes" not in token_name[0] or max(token_price) > max_higher_price:
+                continue
+            marketdata.append({
+                "market_id": int(market.get("id")),
+                "condition_id": f"{market.get('conditionId')}",
+                "question": f"{market.get('question')}",
+                "token_name": token_name,
+                "token_price": token_price,
+                "token_ids": json.loads(token_ids),
+                "end_date": f"{market.get('endDate')}",
+            })
+        if marketdata:
+            eventdata.append({
+                "event_id": int(event.get("id")),
+                "title": f"{event.get('title')}",
+                "description": f" {event.get('description')}".strip(),
+                "markets": marketdata,
+            })
+    return json.dumps(eventdata, ensure_ascii=False, indent=2)
+
+
+def typed_results(events: list[dict], max_higher_price: float = 0.90) -> list[Event]:
+    """Event / Market をそのまま返す（TRADE.filter_events の変換部分と同じ）"""
+    eventdata = []
+    for event in events:
+        marketdata = []
+        for market in event.get("markets", []):
+            parsed = Market.from_gamma(market)
+            if parsed is None or "Yes" not in parsed.token_name[0]:
+                continue
+            if max(parsed.token_price) > max_higher_price:
+                continue
+            parsed.description = None
+            marketdata.append(parsed)
+        if marketdata:
+            eventdata.append(Event.from_gamma(event, marketdata))
+    return eventdata
+
+
+def best_of(repeat: int, fn) -> float:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main(payload: bytes, repeat: int) -> None:
+    print(f"payload {len(payload) / 1e6:.1f} MB, json backend: {'orjson' if models.orjson else 'json'}")
+
+    t_stdlib = best_of(repeat, lambda: json.loads(payload))
+    t_fast = best_of(repeat, lambda: models.loads(payload))
+    print(f"parse response   json.loads {t_stdlib * 1000:7.1f} ms  models.loads {t_fast * 1000:7.1f} ms")
+
+    events = models.loads(payload)
+    # 従来は呼び出し側（buy_new_tokens の STEP2）でもう一度パースしていた
+    t_legacy = best_of(repeat, lambda: json.loads(legacy_results(json.loads(payload))))
+    t_typed = best_of(repeat, lambda: typed_results(models.loads(payload)))
+    t_build = best_of(repeat, lambda: typed_results(events))
+    n_markets = sum(len(event.markets) for event in typed_results(events))
+    print(f"end to end       legacy {t_legacy * 1000:7.1f} ms  typed {t_typed * 1000:7.1f} ms "
+          f"({t_legacy / t_typed:.1f}x) markets={n_markets}")
+    print(f"build objects only (no parse) {t_build * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as f:
+            payload = f.read()
+    else:
+        payload = synthetic_events()
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    main(payload, repeat)
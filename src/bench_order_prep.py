@@ -0,0 +1,66 @@
+"""
+アラート → 発注完了 のレイテンシを、注文テンプレート + 署名プロセスプールの有無で比較する
+ローカルの CLOB 代替サーバーに対して、別々のトークンへのアラートをまとめて発生させる
+    なし: 発注スレッドで tick size を問い合わせ、その場で署名する
+    あり: 監視中トークンのテンプレートを先に作り、署名はプロセスプールで行う
+    python bench_order_prep.py [アラート数] [発注スレッド数] [応答遅延秒]
+"""
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_orders import make_trade
+from local_clob_server import LocalClobServer
+from metrics import LatencyHistogram
+
+
+def alert_burst(tr, token_ids: list[str], workers: int) -> LatencyHistogram:
+    latency = LatencyHistogram(buckets=(0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0))
+
+    def execute(token_id: str, detected_at: float) -> None:
+        tr.make_book_order(token_id, 0.5, 5, "B")
+        latency.observe(time.perf_counter() - detected_at)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for token_id in token_ids:
+            pool.submit(execute, token_id, time.perf_counter())
+    return latency
+
+
+def main(count: int, workers: int, server_latency: float) -> None:
+    server = LocalClobServer(0, server_latency)
+    server.start()
+    os.chdir(tempfile.mkdtemp(prefix="bench_order_prep_"))
+
+    tr = make_trade(server.url)
+    tr._get_clob_client()
+    without = alert_burst(tr, [f"{10**20 + i}" for i in range(count)], workers)
+
+    tr = make_trade(server.url)
+    tr._get_clob_client()
+    started = time.perf_counter()
+    prep = tr.enable_order_prep()
+    print(f"signing pool warm-up: {time.perf_counter() - started:.2f}s")
+    token_ids = [f"{2 * 10**20 + i}" for i in range(count)]
+    prep.watch(token_ids)
+    while prep.stats()["pending"]:
+        time.sleep(0.01)
+    with_prep = alert_burst(tr, token_ids, workers)
+    prep.close()
+
+    print(f"alerts={count} workers={workers} server latency={server_latency * 1e3:.0f}ms")
+    print(f"without order prep: {without.summary()}")
+    print(f"with order prep   : {with_prep.summary()}")
+    print(f"mean speedup      : {without.mean / with_prep.mean:.1f}x")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    server_latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.02
+    main(count, workers, server_latency)
@@ -0,0 +1,115 @@
+"""
+発注のスループットをローカルの CLOB 代替サーバーで比較する
+    従来: 発注毎に ClobClient を作り、api_creds.json を読み直す
+    改善: TRADE が持つ使い回しのクライアント（初回は古いAPIキーで 401 → 再取得を通る）
+    一括: TRADE.make_book_orders で /orders にまとめて送る
+一時ディレクトリで実行するので、実際の api_creds.json や transaction_logs には触れない
+    python bench_orders.py [発注数] [スレッド数] [応答遅延秒]
+"""
+from __future__ import annotations
+
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from eth_account import Account
+from py_clob_client_v2 import ClobClient, OrderArgs, PartialCreateOrderOptions
+from py_clob_client_v2.clob_types import ApiCreds
+from py_clob_client_v2.order_builder.constants import BUY
+
+import trade
+from local_clob_server import LocalClobServer
+
+TOKEN_ID = "71321045679252212594626385532706912750332728571942532289631379312455583992563"
+
+
+def legacy_order(tr: trade.TRADE) -> None:
+    with open(trade.CREDS_FILE) as f:
+        d = json.load(f)
+    client = ClobClient(
+        host=tr.clob_api_base,
+        chain_id=tr.chain_id,
+        key=tr.private_key,
+        creds=ApiCreds(
+            api_key=d["api_key"],
+            api_secret=d["api_secret"],
+            api_passphrase=d["api_passphrase"],
+        ),
+        signature_type=trade.signature_type(),
+        funder=tr.funder,
+    )
+    client.create_and_post_order(
+        OrderArgs(token_id=TOKEN_ID, price=0.5, size=5, side=BUY),
+        options=PartialCreateOrderOptions(tick_size="0.01", neg_risk=False),
+    )
+
+
+def run(label: str, order, count: int, workers: int) -> float:
+    started = time.perf_counter()
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(lambda _: order(), range(count)))
+    else:
+        for _ in range(count):
+            order()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28}: {count / elapsed:8.1f} orders/s  ({elapsed:.2f}s for {count})")
+    return count / elapsed
+
+
+def make_trade(url: str) -> trade.TRADE:
+    account = Account.create()
+    tr = trade.TRADE()
+    tr.clob_api_base = url
+    tr.private_key = account.key.hex()
+    tr.funder = account.address
+    return tr
+
+
+def main(count: int, workers: int, latency: float) -> None:
+    server = LocalClobServer(0, latency)
+    server.start()
+    os.chdir(tempfile.mkdtemp(prefix="bench_orders_"))
+
+    tr = make_trade(server.url)
+    tr._get_api_creds()  # api_creds.json を作っておく
+    legacy = run("legacy (client per order)", lambda: legacy_order(tr), count, 1)
+
+    tr = make_trade(server.url)
+    # 古いAPIキーを置いておき、拒否 → 再取得の経路も通す
+    with open(trade.CREDS_FILE, "w") as f:
+        json.dump({"api_key": "stale", "api_secret": "c3RhbGU=", "api_passphrase": "stale"}, f)
+    persistent = run(
+        "persistent client", lambda: tr.make_book_order(TOKEN_ID, 0.5, 5, "B"), count, 1
+    )
+    threaded = run(
+        f"persistent client x{workers}",
+        lambda: tr.make_book_order(TOKEN_ID, 0.5, 5, "B"),
+        count,
+        workers,
+    )
+
+    orders = [{"token_id": TOKEN_ID, "price": 0.5, "size": 5, "side": "B"} for _ in range(count)]
+    started = time.perf_counter()
+    results, _ = tr.make_book_orders(orders)
+    elapsed = time.perf_counter() - started
+    batch = count / elapsed
+    succeeded = sum(1 for result in results if result["success"])
+    print(f"{'batch (make_book_orders)':<28}: {batch:8.1f} orders/s  ({elapsed:.2f}s for {count}, ok={succeeded})")
+
+    print(
+        f"speedup (sequential): {persistent / legacy:.1f}x  "
+        f"(threads: {threaded / legacy:.1f}x, batch: {batch / legacy:.1f}x)"
+    )
+    print(f"server: orders={server.orders} rejected={server.rejected}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    main(count, workers, latency)
@@ -0,0 +1,76 @@
+"""
+RollingPriceStore(ベクトル化) と 従来の dict[list] + トークン毎ループ の1tickあたりの処理時間を比較する
+    python bench_price_store.py [トークン数] [tick数]
+"""
+from __future__ import annotations
+
+import sys
+import time
+
+import numpy as np
+
+from price_store import RollingPriceStore
+
+THRESHOLD = 0.1
+STEPS = 2
+
+
+def legacy_tick(history_by_token: dict[str, list[float]], token_ids: list[str], prices: list[float]) -> int:
+    alerts = 0
+    for token_id, current_price in zip(token_ids, prices):
+        if current_price is None or current_price <= 0:
+            history_by_token.pop(token_id, None)
+            continue
+        history = history_by_token.setdefault(token_id, [])
+        history.append(current_price)
+        if len(history) > 3:
+            history.pop(0)
+        if len(history) < 3:
+            continue
+        first, second, third = history
+        first_change = (second - first) / first
+        second_change = (third - second) / second
+        if first_change >= THRESHOLD and second_change >= THRESHOLD:
+            alerts += 1
+    return alerts
+
+
+def store_tick(store: RollingPriceStore, token_ids: list[str], prices: np.ndarray) -> int:
+    rows = store.append(token_ids, prices)
+    _, rates = store.consecutive_changes(rows, STEPS)
+    return int(np.count_nonzero(np.all(rates >= THRESHOLD, axis=1)))
+
+
+def main(token_count: int, tick_count: int) -> None:
+    rng = np.random.default_rng(0)
+    token_ids = [f"token-{i}" for i in range(token_count)]
+    walk = np.clip(
+        0.5 + np.cumsum(rng.normal(0, 0.05, size=(tick_count, token_count)), axis=0),
+        0.01,
+        0.99,
+    )
+
+    history: dict[str, list[float]] = {}
+    legacy_alerts = 0
+    started = time.perf_counter()
+    for tick in walk:
+        legacy_alerts += legacy_tick(history, token_ids, tick.tolist())
+    legacy_seconds = (time.perf_counter() - started) / tick_count
+
+    store = RollingPriceStore(capacity=token_count)
+    store_alerts = 0
+    started = time.perf_counter()
+    for tick in walk:
+        store_alerts += store_tick(store, token_ids, tick)
+    store_seconds = (time.perf_counter() - started) / tick_count
+
+    print(f"tokens={token_count} ticks={tick_count}")
+    print(f"legacy dict/list : {legacy_seconds * 1e3:8.2f} ms/tick  alerts={legacy_alerts}")
+    print(f"RollingPriceStore: {store_seconds * 1e3:8.2f} ms/tick  alerts={store_alerts}")
+    print(f"speedup          : {legacy_seconds / store_seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    tokens = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    main(tokens, ticks)
@@ -1,5 +1,6 @@
 from trade import TRADE
 from agent import Agent
+from ranking import shortlist
 import config
 from pathlib import Path
 import os
@@ -10,60 +11,53 @@ from zoneinfo import ZoneInfo
 
 def summarize_event_and_market(eventdata, target_market_id):
     for event in eventdata:
-        for market in event.get("markets", []):
-            if market.get("market_id") == target_market_id:
-                event_and_market_detail = {
-                    "event": {
-                        "event_id": event.get("event_id"),
-                        "title": event.get("title"),
-                        "description": event.get("description"),
-                        "liquidity": event.get("liquidity"),
-                        "volume": event.get("volume"),
-                    },
-                    "market": market
-                }
-    try:
-        lines = []
-        token_info = []
-        lines.append(f"予測テーマ: {event_and_market_detail['market']['question']}")
-        lines.append(f"詳細：{event_and_market_detail['event']['description']}")
-        lines.append(f"終了日: {event_and_market_detail['market']['end_date']}")
-        for i in range(len(event_and_market_detail['market']['token_name'])):
-            lines.append(f" トークン「{event_and_market_detail['market']['token_name'][i]}」の価格：{event_and_market_detail['market']['token_price'][i]}")
-            token_info.append({
-                'token_name': event_and_market_detail['market']['token_name'][i],
-                'token_id': event_and_market_detail['market']['token_ids'][i],
-                'token_price': event_and_market_detail['market']['token_price'][i]
-            })
-        event_and_market_detail_text = "\n".join(lines)
-        return event_and_market_detail_text, token_info
-    except:
-        return None, None  # 見つからなかった場合
-
-def main(tag):
-    tr = TRADE()
-    ag = Agent()
-    full_log = {}
-    now_date = datetime.now().strftime("%Y/%m/%d")
-    ## STEP 1: イベント・マーケットのリストを収集する。
+        for market in event.markets:
+            if market.market_id == target_market_id:
+                try:
+                    lines = []
+                    token_info = []
+                    lines.append(f"予測テーマ: {market.question}")
+                    lines.append(f"詳細：{event.description}")
+                    lines.append(f"終了日: {market.end_date}")
+                    for i in range(len(market.token_name)):
+                        lines.append(f" トークン「{market.token_name[i]}」の価格：{market.token_price[i]}")
+                        token_info.append({
+                            'token_name': market.token_name[i],
+                            'token_id': market.token_ids[i],
+                            'token_price': market.token_price[i]
+                        })
+                    event_and_market_detail_text = "\n".join(lines)
+                    return event_and_market_detail_text, token_info
+                except:
+                    return None, None
+    return None, None  # 見つからなかった場合
+
+def collect_events(tr, tag):
+    """STEP 1: イベント・マーケットのリストを収集する（タグで見つからなければタグ無しで）"""
     events_data = tr.get_recent_events_and_markets(tag_slug=tag, max_higher_price=config.MAX_HIGHER_PRICE)
     if events_data == []:
         events_data = tr.get_recent_events_and_markets(tag_slug=None, max_higher_price=config.MAX_HIGHER_PRICE)
-    full_log["STEP1"] = f"{tag}"
+    return events_data
 
-    ## STEP 2: 詳細検討するマーケットを一つ選ぶ
+def market_lines(market):
     lines = []
-    events_data = json.loads(events_data)
-    for event in events_data:
-        markets = event.get("markets", [])
-        for market in markets:
-            lines.append(f"■ market_id: {market.get('market_id')}")
-            lines.append(f" question: {market.get('question')}")
-            lines.append(f" 終了日: {market.get('end_date')}")
-            for i in range(len(market["token_name"])):
-                lines.append(f" トークン「{market['token_name'][i]}」の価格：{market['token_price'][i]}")
-            lines.append('---------')
-    event_and_market_list_text = "\n".join(lines)
+    lines.append(f"■ market_id: {market.market_id}")
+    lines.append(f" question: {market.question}")
+    lines.append(f" 終了日: {market.end_date}")
+    for i in range(len(market.token_name)):
+        lines.append(f" トークン「{market.token_name[i]}」の価格：{market.token_price[i]}")
+    lines.append('---------')
+    return "\n".join(lines)
+
+def market_list_prompt(events_data, now_date):
+    """
+    STEP 2: 詳細検討するマーケットを一つ選ばせるプロンプト
+    候補は点数の高い順に STEP2_TOP_K 件・STEP2_LIST_TOKEN_BUDGET トークンまでに絞る
+    """
+    candidates = shortlist(events_data, market_lines)
+    event_and_market_list_text = "\n".join(
+        market_lines(market) for event in candidates for market in event.markets
+    )
     prompt = f"""
         # 背景
         あなたは予測市場「Polymarket」に参加するトレーダーAIである。
@@ -88,18 +82,10 @@ def main(tag):
         # テーマ（イベント）の詳細
         {event_and_market_list_text}
     """
+    return prompt
 
-    market_id = ag.call_tool_to_show_detail_market(prompt=prompt)
-    full_log["STEP2"] = {}
-    full_log["STEP2"]["prompt"] = prompt
-    full_log["STEP2"]["response"] = market_id
-
-    ## STEP 3:マーケットの詳細情報を取得する。
-    event_and_market_detail_text, token_info = summarize_event_and_market(events_data, market_id)
-    img_path, img_base64 = tr.get_market_history_img(market_id=market_id)
-    full_log["STEP3"] = str(img_path)
-
-    ## STEP 4: LLMの意見を聞く
+def opinion_prompt(event_and_market_detail_text, now_date):
+    """STEP 4: LLMの意見を聞くプロンプト"""
     prompt = f"""
         # 背景
         あなたは予測市場「Polymarket」に参加するトレーダーAIである。
@@ -126,13 +112,10 @@ def main(tag):
         # あなたが参加するマーケットの詳細
         {event_and_market_detail_text}
     """
+    return prompt
 
-    llm_opinion = ag.get_LLM_opiniton(prompt=prompt, image_base64=img_base64)
-    full_log["STEP4"] = {}
-    full_log["STEP4"]["prompt"] = prompt
-    full_log["STEP4"]["response"] = llm_opinion
-
-    ## STEP 5: 購入するトークンの種類の名前を取得 
+def order_prompt(event_and_market_detail_text, llm_opinion, now_date):
+    """STEP 5: 購入するトークンの種類と個数を決めさせるプロンプト"""
     prompt = f"""
         # 背景
         あなたは予測市場「Polymarket」に参加するトレーダーAIである。
@@ -163,9 +146,15 @@ def main(tag):
         # 本マーケットに関する専門家の意見
         {llm_opinion}
     """
-    token, size = ag.call_tool_to_make_order(prompt=prompt, image_base64=img_base64)
+    return prompt
+
+def resolve_order(token_info, token, size):
+    """
+    LLMが選んだトークン名と個数から (token_id, 買値, 個数) を決める。該当するトークンが無ければ token_price は None
+    """
+    token_id = None
     token_price = None
-    for t in token_info:
+    for t in token_info or []:
         if t['token_name'] == token:
             token_id = t['token_id']
             token_price = min(t['token_price'] * config.BUY_BUFFER_RATE, config.MAX_HIGHER_PRICE)
@@ -174,14 +163,9 @@ def main(tag):
             if size*token_price < 1.0:
                 size = int(1.0/token_price) + 1
             break
-    full_log["STEP5"] = {}
-    full_log["STEP5"]["prompt"] = prompt
-    full_log["STEP5"]["token"] = token
-    full_log["STEP5"]["token_id"] = token_id
-    full_log["STEP5"]["size"] = size
-    full_log["STEP5"]["token_price"] = token_price
+    return token_id, token_price, size
 
-    # full_logを保存
+def full_log_path(market_id, tag=None):
     now = datetime.now(ZoneInfo("Asia/Tokyo"))
     date_str = now.strftime("%Y%m%d")
     time_str = now.strftime("%H%M%S")
@@ -191,7 +175,55 @@ def main(tag):
     log_dir.mkdir(parents=True, exist_ok=True)
 
     # ファイルパス生成
-    log_path = log_dir / f"{time_str}_{market_id}.json"
+    # 複数タグを並行して回す時は、同じマーケットを選んでも上書きしないようにタグも付ける
+    suffix = f"_{tag}" if tag else ""
+    return log_dir / f"{time_str}_{market_id}{suffix}.json"
+
+def write_full_log(log_path, full_log):
+    with open(log_path, "w", encoding="utf-8") as f:
+        json.dump(full_log, f, ensure_ascii=False, indent=2)
+
+def main(tag):
+    tr = TRADE()
+    ag = Agent()
+    full_log = {}
+    now_date = datetime.now().strftime("%Y/%m/%d")
+    ## STEP 1: イベント・マーケットのリストを収集する。
+    events_data = collect_events(tr, tag)
+    full_log["STEP1"] = f"{tag}"
+
+    ## STEP 2: 詳細検討するマーケットを一つ選ぶ
+    prompt = market_list_prompt(events_data, now_date)
+    market_id = ag.call_tool_to_show_detail_market(prompt=prompt)
+    full_log["STEP2"] = {}
+    full_log["STEP2"]["prompt"] = prompt
+    full_log["STEP2"]["response"] = market_id
+
+    ## STEP 3:マーケットの詳細情報を取得する。
+    event_and_market_detail_text, token_info = summarize_event_and_market(events_data, market_id)
+    img_path, img_base64 = tr.get_market_history_img(market_id=market_id)
+    full_log["STEP3"] = str(img_path)
+
+    ## STEP 4: LLMの意見を聞く
+    prompt = opinion_prompt(event_and_market_detail_text, now_date)
+    llm_opinion = ag.get_LLM_opiniton(prompt=prompt, image_base64=img_base64)
+    full_log["STEP4"] = {}
+    full_log["STEP4"]["prompt"] = prompt
+    full_log["STEP4"]["response"] = llm_opinion
+
+    ## STEP 5: 購入するトークンの種類の名前を取得 
+    prompt = order_prompt(event_and_market_detail_text, llm_opinion, now_date)
+    token, size = ag.call_tool_to_make_order(prompt=prompt, image_base64=img_base64)
+    token_id, token_price, size = resolve_order(token_info, token, size)
+    full_log["STEP5"] = {}
+    full_log["STEP5"]["prompt"] = prompt
+    full_log["STEP5"]["token"] = token
+    full_log["STEP5"]["token_id"] = token_id
+    full_log["STEP5"]["size"] = size
+    full_log["STEP5"]["token_price"] = token_price
+
+    # full_logを保存
+    log_path = full_log_path(market_id)
     
     if token_price is not None:
         try:
@@ -207,9 +239,10 @@ def main(tag):
         full_log["STEP5"]["result"] = "失敗"
     
     # full_logを保存
-    with open(log_path, "w", encoding="utf-8") as f:
-        json.dump(full_log, f, ensure_ascii=False, indent=2)
+    write_full_log(log_path, full_log)
+    if ag.cache is not None:
+        print(f"llm cache: {ag.cache.stats()}")
 
 if __name__=='__main__':
     tag = random.choice(config.TREAT_EVENT_TAG_LIST)
-    main(tag)
\ No newline at end of file
+    main(tag)
@@ -0,0 +1,191 @@
+"""
+全タグの購入判断（buy_new_tokens の STEP 1〜5）を並行して進める
+- タグごとの判断を asyncio で同時に回す（LLMへの同時リクエスト数は AsyncAgent が LLM_CONCURRENCY で抑える）
+- Gamma の取得・チャート描画などのブロッキング処理はスレッドで行う
+- 発注は全タグの判断が揃ってから、予算（件数・金額）の範囲でタグの順に選び、まとめて /orders に送る
+- 複数のタグが同じマーケットを選んだら、先に選んだタグだけ進める
+    python buy_pipeline.py [タグ ...]（省略時は TREAT_EVENT_TAG_LIST のすべて）
+"""
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import config
+from agent import AsyncAgent
+from buy_new_tokens import (
+    collect_events,
+    full_log_path,
+    market_list_prompt,
+    opinion_prompt,
+    order_prompt,
+    resolve_order,
+    summarize_event_and_market,
+    write_full_log,
+)
+from trade import TRADE
+
+BUY_PIPELINE_MAX_ORDERS = config.BUY_PIPELINE_MAX_ORDERS
+BUY_PIPELINE_MAX_USD = config.BUY_PIPELINE_MAX_USD
+
+
+@dataclass
+class BuyBudget:
+    max_orders: int = BUY_PIPELINE_MAX_ORDERS
+    max_usd: float = BUY_PIPELINE_MAX_USD
+    orders: int = 0
+    spent: float = 0.0
+
+    def reserve(self, cost: float) -> bool:
+        """件数・金額の上限に収まれば確保して True"""
+        if self.orders + 1 > self.max_orders or self.spent + cost > self.max_usd:
+            return False
+        self.orders += 1
+        self.spent += cost
+        return True
+
+
+@dataclass
+class BuyDecision:
+    tag: str
+    market_id: Any = None
+    token: str | None = None
+    token_id: str | None = None
+    token_price: float | None = None
+    size: int | None = None
+    full_log: dict[str, Any] = field(default_factory=dict)
+    elapsed: float = 0.0
+    skipped: str | None = None  # 発注まで進まなかった理由
+
+    @property
+    def cost(self) -> float:
+        return (self.token_price or 0.0) * (self.size or 0)
+
+
+async def decide(tr: TRADE, ag: AsyncAgent, tag: str, now_date: str, claimed: set) -> BuyDecision:
+    """1タグ分の STEP 1〜5（発注はしない）"""
+    started = time.perf_counter()
+    decision = BuyDecision(tag=tag)
+    full_log = decision.full_log
+
+    ## STEP 1: イベント・マーケットのリストを収集する。
+    events_data = await asyncio.to_thread(collect_events, tr, tag)
+    full_log["STEP1"] = f"{tag}"
+
+    ## STEP 2: 詳細検討するマーケットを一つ選ぶ
+    prompt = market_list_prompt(events_data, now_date)
+    market_id = await ag.call_tool_to_show_detail_market(prompt=prompt)
+    decision.market_id = market_id
+    full_log["STEP2"] = {"prompt": prompt, "response": market_id}
+    if market_id is None:
+        decision.skipped = "マーケットが選ばれなかった"
+        return decision
+    if market_id in claimed:
+        decision.skipped = f"market_id {market_id} は他のタグで選択済み"
+        return decision
+    claimed.add(market_id)
+
+    ## STEP 3:マーケットの詳細情報を取得する。
+    event_and_market_detail_text, token_info = summarize_event_and_market(events_data, market_id)
+    if event_and_market_detail_text is None:
+        decision.skipped = f"market_id {market_id} が候補にない"
+        return decision
+    img_path, img_base64 = await asyncio.to_thread(tr.get_market_history_img, market_id=market_id)
+    full_log["STEP3"] = str(img_path)
+
+    ## STEP 4: LLMの意見を聞く
+    prompt = opinion_prompt(event_and_market_detail_text, now_date)
+    llm_opinion = await ag.get_LLM_opiniton(prompt=prompt, image_base64=img_base64)
+    full_log["STEP4"] = {"prompt": prompt, "response": llm_opinion}
+
+    ## STEP 5: 購入するトークンの種類と個数を決める
+    prompt = order_prompt(event_and_market_detail_text, llm_opinion, now_date)
+    token, size = await ag.call_tool_to_make_order(prompt=prompt, image_base64=img_base64)
+    token_id, token_price, size = resolve_order(token_info, token, size)
+    decision.token, decision.token_id, decision.token_price, decision.size = token, token_id, token_price, size
+    full_log["STEP5"] = {
+        "prompt": prompt,
+        "token": token,
+        "token_id": token_id,
+        "size": size,
+        "token_price": token_price,
+    }
+    if token_price is None:
+        decision.skipped = f"トークン {token} が見つからない"
+    decision.elapsed = time.perf_counter() - started
+    return decision
+
+
+async def run(tags: list[str], tr: TRADE | None = None, ag: AsyncAgent | None = None,
+              budget: BuyBudget | None = None) -> list[BuyDecision]:
+    tr = tr or TRADE()
+    ag = ag or AsyncAgent()
+    budget = budget or BuyBudget()
+    # 遅延生成のプロパティをスレッドから同時に作らないよう先に作っておく（チャートは複数タグから並行に描く）
+    tr.history_store
+    tr.charts
+    now_date = datetime.now().strftime("%Y/%m/%d")
+    claimed: set = set()
+    results = await asyncio.gather(
+        *(decide(tr, ag, tag, now_date, claimed) for tag in tags), return_exceptions=True
+    )
+    decisions = []
+    for tag, result in zip(tags, results):
+        if isinstance(result, BaseException):
+            print(f"[{tag}] 判断に失敗しました。{result!r}")
+            result = BuyDecision(tag=tag, skipped=repr(result))
+        decisions.append(result)
+
+    # 予算の範囲でタグの順に発注対象を選ぶ
+    to_order = []
+    for decision in decisions:
+        if decision.skipped is None and not budget.reserve(decision.cost):
+            decision.skipped = f"予算超過（{budget.orders}件 / ${budget.spent:.2f} 使用済み）"
+        if decision.skipped is None:
+            to_order.append(decision)
+
+    if to_order:
+        orders = [
+            {"token_id": d.token_id, "price": d.token_price, "size": d.size, "side": "B"} for d in to_order
+        ]
+        try:
+            order_results, tlog_path = await asyncio.to_thread(tr.make_book_orders, orders)
+            print(f"Order response saved to: {tlog_path}")
+        except Exception as exc:
+            order_results = [{"success": False, "error": str(exc)} for _ in to_order]
+        for decision, result in zip(to_order, order_results):
+            if result["success"]:
+                print(f"[{decision.tag}] {decision.token}トークンを価格{decision.token_price}で、{decision.size}個購入しました。")
+                decision.full_log["STEP5"]["result"] = "成功"
+            else:
+                decision.skipped = f"発注に失敗: {result.get('error')}"
+
+    for decision in decisions:
+        log_path: Path = full_log_path(decision.market_id, decision.tag)
+        if decision.skipped is not None:
+            print(f"[{decision.tag}] トークンを購入できませんでした。{decision.skipped} {log_path}を確認してください。")
+            decision.full_log.setdefault("STEP5", {})["result"] = "失敗"
+            decision.full_log["STEP5"]["reason"] = decision.skipped
+        write_full_log(log_path, decision.full_log)
+    return decisions
+
+
+def main(tags: list[str]) -> None:
+    ag = AsyncAgent()
+    started = time.perf_counter()
+    decisions = asyncio.run(run(tags, ag=ag))
+    elapsed = time.perf_counter() - started
+    slowest = max((d.elapsed for d in decisions), default=0.0)
+    bought = sum(1 for d in decisions if d.skipped is None)
+    print(f"{len(tags)} tags in {elapsed:.1f}s (slowest tag {slowest:.1f}s), bought {bought}")
+    if ag.cache is not None:
+        print(f"llm cache: {ag.cache.stats()}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or list(config.TREAT_EVENT_TAG_LIST))
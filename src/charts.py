@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable
+from zoneinfo import ZoneInfo
+
+import matplotlib
+
+matplotlib.use("Agg")  # 画面なしで描画する（pyplot の状態も使わない）
+import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+
+import config
+
+CHART_HISTORY_INTERVAL = config.CHART_HISTORY_INTERVAL
+CHART_BUCKET_SECONDS = config.CHART_BUCKET_SECONDS
+CHART_FETCH_WORKERS = config.CHART_FETCH_WORKERS
+CHART_RENDER_WORKERS = config.CHART_RENDER_WORKERS
+CHART_CACHE_SIZE = config.CHART_CACHE_SIZE
+CHART_CACHE_DIR = config.CHART_CACHE_DIR
+CHART_DISK_CACHE_SIZE = config.CHART_DISK_CACHE_SIZE
+
+# fetch(token_id, interval) -> (UNIX秒のリスト, 価格のリスト)
+HistoryFetcher = Callable[[str, str], tuple[list[float], list[float]]]
+
+
+def render_history_png(title: str, series: list[tuple[str, list[float], list[float]]]) -> bytes:
+    """
+    トークンごとの価格履歴 [(トークン名, UNIX秒, 価格)] を1枚の図にしてPNGのバイト列を返す
+    引数も戻り値もpickleできるので、プロセスプールからも呼べる
+    """
+    fig = Figure()
+    ax = fig.add_subplot()
+    for name, timestamps, prices in series:
+        times = [datetime.fromtimestamp(t, timezone.utc) for t in timestamps]
+        ax.plot(times, prices, label=name)
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%m-%d %H:%M"))
+    ax.xaxis.set_major_locator(mdates.AutoDateLocator())
+    ax.tick_params(axis="x", labelrotation=45)
+    ax.set_title(title)
+    ax.set_xlabel("time")
+    ax.set_ylabel("price of tokens")
+    ax.legend()
+    fig.tight_layout()
+    buf = BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    return buf.getvalue()
+
+
+def coarsen_history(
+    timestamps: list[float], prices: list[float], bucket_seconds: float, now: float | None = None
+) -> tuple[list[float], list[float]]:
+    """
+    価格履歴を bucket_seconds 毎の終値（区間の終わりの時刻）にまとめる。まだ終わっていない区間は捨てる
+    1分毎に取り直した履歴でも同じ区間の中なら同じ図になり、画像を含むLLMキャッシュのキーも変わらない
+    """
+    if bucket_seconds <= 0:
+        return timestamps, prices
+    current = (time.time() if now is None else now) // bucket_seconds
+    out_timestamps: list[float] = []
+    out_prices: list[float] = []
+    for timestamp, price in zip(timestamps, prices):
+        bucket = timestamp // bucket_seconds
+        if bucket >= current:
+            break
+        end = (bucket + 1) * bucket_seconds
+        if out_timestamps and out_timestamps[-1] == end:
+            out_prices[-1] = price
+        else:
+            out_timestamps.append(end)
+            out_prices.append(price)
+    return out_timestamps, out_prices
+
+
+class ChartService:
+    """
+    マーケットの価格履歴チャートを作る
+    - アウトカムごとの履歴はスレッドで並列に取得する
+    - 描画は render_workers 個のプロセスで行う（matplotlib はスレッドセーフではないので、
+      複数スレッドから呼ばれても描画はプロセスに分ける。0ならその場で描く）
+    - 履歴は bucket_seconds 毎の終値にまとめてから描く（1分毎の更新では図が変わらない）
+    - (トークンID, interval, 各トークンの最終データ時刻) が同じなら描画し直さず、キャッシュしたPNGを使う
+      （メモリ上のLRUと cache/charts/ のファイル）
+    - PNGは1回だけエンコードし、img_logs/ への保存と base64 の両方に使う
+    """
+    def __init__(
+        self,
+        fetch: HistoryFetcher,
+        *,
+        interval: str = CHART_HISTORY_INTERVAL,
+        bucket_seconds: float = CHART_BUCKET_SECONDS,
+        workers: int = CHART_FETCH_WORKERS,
+        render_workers: int = CHART_RENDER_WORKERS,
+        max_entries: int = CHART_CACHE_SIZE,
+        cache_dir: str | Path | None = CHART_CACHE_DIR,
+        max_files: int = CHART_DISK_CACHE_SIZE,
+    ) -> None:
+        self.fetch = fetch
+        self.interval = interval
+        self.bucket_seconds = bucket_seconds
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_files = max_files
+        self.render_workers = render_workers
+        self.renders = 0
+        self.hits = 0
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chart-fetch")
+        self._render_pool: ProcessPoolExecutor | None = None
+        self._cache: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def market_chart(self, market: dict[str, Any], name: str = "") -> tuple[Path, str]:
+        """
+        Gamma の生データ1件分のチャートを img_logs/<日付>/<時刻>_<name>.png に保存し、(パス, base64) を返す
+        """
+        token_names = json.loads(market.get("outcomes"))
+        token_ids = [str(token_id) for token_id in json.loads(market.get("clobTokenIds"))]
+        histories = list(
+            self._pool.map(lambda token_id: self.fetch(token_id, self.interval), token_ids)
+        )
+        fetched_at = time.time()
+        series = [
+            (token_name, *coarsen_history(timestamps, prices, self.bucket_seconds, fetched_at))
+            for token_name, (timestamps, prices) in zip(token_names, histories)
+        ]
+        title = f"{market.get('question')}"
+        key = self.cache_key(token_ids, self.interval, [timestamps for _, timestamps, _ in series], title)
+        png = self._cached(key)
+        if png is None:
+            png = self._render(title, series)
+            self._store(key, png)
+
+        now = datetime.now(ZoneInfo("Asia/Tokyo"))
+        img_dir = Path("img_logs") / now.strftime("%Y%m%d")
+        img_dir.mkdir(parents=True, exist_ok=True)
+        img_path = img_dir / f"{now.strftime('%H%M%S')}_{name}.png"
+        img_path.write_bytes(png)
+        return img_path, base64.b64encode(png).decode("utf-8")
+
+    @staticmethod
+    def cache_key(
+        token_ids: list[str], interval: str, timestamps: list[list[float]], title: str = ""
+    ) -> str:
+        last = [ts[-1] if ts else None for ts in timestamps]
+        raw = json.dumps([token_ids, interval, last, title], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def stats(self) -> dict[str, int]:
+        return {"renders": self.renders, "hits": self.hits, "entries": len(self._cache)}
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+        if self._render_pool is not None:
+            self._render_pool.shutdown(wait=True, cancel_futures=True)
+
+    def _render(self, title: str, series: list[tuple[str, list[float], list[float]]]) -> bytes:
+        if self.render_workers <= 0:
+            return render_history_png(title, series)
+        with self._lock:
+            if self._render_pool is None:
+                # HTTPクライアントや取得スレッドを抱えたまま fork しないよう spawn で起動する
+                self._render_pool = ProcessPoolExecutor(
+                    max_workers=self.render_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            pool = self._render_pool
+        return pool.submit(render_history_png, title, series).result()
+
+    def _cached(self, key: str) -> bytes | None:
+        with self._lock:
+            png = self._cache.get(key)
+            if png is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return png
+        path = self._cache_path(key)
+        if path is not None and path.exists():
+            png = path.read_bytes()
+            with self._lock:
+                self.hits += 1
+                self._remember(key, png)
+            return png
+        return None
+
+    def _store(self, key: str, png: bytes) -> None:
+        with self._lock:
+            self.renders += 1
+            self._remember(key, png)
+        path = self._cache_path(key)
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(png)
+        with self._lock:
+            self._prune_files()
+
+    def _remember(self, key: str, png: bytes) -> None:
+        self._cache[key] = png
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def _cache_path(self, key: str) -> Path | None:
+        return self.cache_dir / f"{key}.png" if self.cache_dir else None
+
+    def _prune_files(self) -> None:
+        files = list(self.cache_dir.glob("*.png"))
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=lambda path: path.stat().st_mtime)
+        for path in files[: len(files) - self.max_files]:
+            path.unlink(missing_ok=True)
@@ -11,17 +11,128 @@ MIN_BUY_TOKENS = 5
 MAX_BUY_TOKENS = 10
 BUY_BUFFER_RATE = 1.01
 SELL_BUFFER_RATE = 0.99
+BATCH_ORDER_LIMIT = 15  # /orders に1回で送れる注文数の上限
 MAX_HIGHER_PRICE = 0.90
+# buy_new_tokens の候補探し（TRADE.iter_events で /events をページ送りする）
+EVENT_PAGE_SIZE = 50
+EVENT_MAX_PAGES = 40
+MAX_CANDIDATE_MARKETS = 300  # これだけ集まったら残りのページは取らない
+# STEP2 のプロンプトに載せる候補（ranking.shortlist で点数の高い順に絞る）
+STEP2_TOP_K = 40
+STEP2_LIST_TOKEN_BUDGET = 3000  # 候補一覧部分のトークン数の上限（見積もり）
+RANKING_WEIGHTS = {"volume": 1.0, "time_to_end": 0.5, "uncertainty": 1.0, "momentum": 0.5, "spread": 0.5}
+RANKING_HORIZON_DAYS = 180
+RANKING_MAX_SPREAD = 0.1  # これ以上スプレッドが広いものは spread の点が0
+# HTTPクライアント（http_client.HttpClient）
+HTTP_POOL_SIZE = 16  # 1ホストあたりの同時接続数
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_READ_TIMEOUT = 30
+HTTP_MAX_RETRIES = 4  # 429・5xx・接続エラーの再試行回数
+HTTP_BACKOFF_BASE = 0.5
+HTTP_BACKOFF_MAX = 20
+HTTP_REPORT_EVERY = 60  # トラッカーが何tick毎にエンドポイント別の統計を出すか
+# ホストごとのレート制限 (回/秒, バースト)。各APIの公開上限より余裕を持たせる
+HTTP_RATE_LIMITS = {
+    "gamma-api.polymarket.com": (25, 25),
+    "clob.polymarket.com": (50, 50),
+    "data-api.polymarket.com": (10, 10),
+}
+# マーケット情報キャッシュ（market_cache.MarketCache）
+MARKET_CACHE_SIZE = 2048
+MARKET_CACHE_STATIC_TTL = 6 * 60 * 60
+MARKET_CACHE_PRICE_TTL = 30
+MARKET_CACHE_PATH = "cache/market_cache.json"  # Noneならディスクに保存しない
+# 価格履歴チャート（charts.ChartService）
+CHART_HISTORY_INTERVAL = "6h"
+CHART_BUCKET_SECONDS = 15 * 60  # この間隔の終値にまとめて描く（区間内なら同じ図になる）。0ならまとめない
+CHART_FETCH_WORKERS = 4
+CHART_RENDER_WORKERS = 2  # 描画プロセス数（0ならその場で描く）
+CHART_CACHE_SIZE = 64
+CHART_CACHE_DIR = "cache/charts"  # Noneならディスクに保存しない
+CHART_DISK_CACHE_SIZE = 500
+# 価格履歴のローカル保存（history_store.PriceHistoryStore）
+HISTORY_STORE_DIR = "history_store"
+HISTORY_REFRESH_SECONDS = 60  # これより短い間隔では取りに行かない
+HISTORY_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+HISTORY_FIDELITY_MINUTES = 1
 
 # track_top_liquidity
 POLL_INTERVAL_SECONDS = 30
 TOP_MARKET_COUNT = 200
 MARKET_REFRESH_EVERY = 90
 GAMMA_PAGE_SIZE = 200
+GAMMA_MAX_PAGES = 100
+GAMMA_PAGE_CONCURRENCY = 8
 MIDPOINT_BATCH_SIZE = 200
+MIDPOINT_CONCURRENCY = 4
+MIDPOINT_BATCH_TIMEOUT_SECONDS = 10
+MIDPOINT_BATCH_RETRIES = 0  # 再試行するとバッチのタイムアウトを超えるので、失敗したバッチはそのtickでは捨てる
+PRICE_HISTORY_WINDOW = 3
+# 毎tickの中値を保存する（tick_store.TickStore）
+TICK_STORE_ENABLED = os.getenv("POLYMARKET_TICK_STORE", "0") == "1"
+TICK_STORE_DIR = "tick_logs"
+TICK_STORE_RETENTION_HOURS = 7 * 24  # これより古いパーティションは消す（0なら消さない）
+# アラート発注（execution.AlertExecutor）
+ALERT_WORKERS = 4
+ALERT_TIMEOUT_SECONDS = 20
+ALERT_QUEUE_SIZE = 100
+# アラート発注の署名（order_prep.OrderPreparer）
+# 監視中のトークンの注文テンプレートを先に作る（価格を見るだけなら不要なので既定では使わない）
+ORDER_PREP_ENABLED = os.getenv("POLYMARKET_ORDER_PREP", "0") == "1"
+ORDER_SIGN_WORKERS = 2
+ORDER_TEMPLATE_WORKERS = 4
+# WebSocketで価格更新を受け取る（切断中はポーリングで補う）
+MARKET_STREAM_ENABLED = os.getenv("POLYMARKET_MARKET_STREAM", "0") == "1"
+MARKET_WS_URL = os.getenv("POLYMARKET_MARKET_WS_URL", "wss://ws-subscriptions-clob.polymarket.com/ws/market")
+STREAM_STALE_SECONDS = 60
 CONSECUTIVE_INCREASE_THRESHOLD = 0.1
 CONSECUTIVE_DECREASE_THRESHOLD = 0.07
+# シグナルルール（type: consecutive / momentum / ewma_cross / return_zscore / drawdown）
+BUY_SIGNAL_RULES = [
+    {"type": "consecutive", "steps": 2, "threshold": CONSECUTIVE_INCREASE_THRESHOLD, "direction": 1},
+]
+SELL_SIGNAL_RULES = [
+    {"type": "consecutive", "steps": 2, "threshold": CONSECUTIVE_DECREASE_THRESHOLD, "direction": -1},
+]
+# track_own_token_prices / sell_own_tokens: 保有状況（positions.PositionService）は価格より遅い周期で取り直す
+POSITION_PAGE_SIZE = 500
+POSITION_REFRESH_SECONDS = 300
 
 ## OpenAI
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 MODEL = "gpt-5-mini"
+# LLMの応答キャッシュ（llm_cache.LLMCache）。同じ入力なら TTL の間は API を呼ばない
+LLM_CACHE_ENABLED = True
+LLM_CACHE_DIR = "cache/llm"
+LLM_CACHE_SIZE = 2000  # ファイル数の上限（古いものから消す）
+LLM_CACHE_TTL_SECONDS = {
+    "show_market_detail": 60 * 60,
+    "opinion": 6 * 60 * 60,  # Web検索つきの意見（遅くて高い）
+    "make_order": 60 * 60,
+    "review_positions": 6 * 60 * 60,
+}
+# プロンプトに載せる価格の桁数（細かな値動きで入力が変わり、キャッシュが効かなくならないように丸める）
+LLM_PROMPT_PRICE_DIGITS = 2
+# 節約額の見積もり用の料金 [USD / 100万トークン] (入力, キャッシュ済み入力, 出力)
+LLM_PRICE_PER_MTOK = {
+    "gpt-5-mini": (0.25, 0.025, 2.00),
+}
+LLM_WEB_SEARCH_COST = 0.01  # Web検索1回あたり [USD]
+# 全タグを並行して回す購入パイプライン（buy_pipeline.py）
+LLM_CONCURRENCY = 4  # 同時に投げるLLMリクエスト数の上限（AsyncAgent）
+BUY_PIPELINE_MAX_ORDERS = 3  # 1回の実行で発注する件数の上限
+BUY_PIPELINE_MAX_USD = 30.0  # 1回の実行で使う金額の上限
+# sell_own_tokens のLLM判断の仕方
+#   per_position: ポジション毎にチャート付きで意見を聞く
+#   batch:        SELL_REVIEW_BATCH_SIZE 件ずつ1リクエストにまとめ、構造化出力で condition_id 毎の判断を受け取る
+#   bulk_job:     Batch API に投げておき、結果は次回以降の実行で受け取る（Web検索なし・料金は半額）
+SELL_REVIEW_MODE = os.getenv("POLYMARKET_SELL_REVIEW_MODE", "per_position")
+SELL_REVIEW_BATCH_SIZE = 25
+SELL_REVIEW_JOB_FILE = "review_jobs.json"  # 結果待ちのバッチ
+SELL_REVIEW_JOB_WAIT_SECONDS = 0  # 投げた後この秒数までは結果を待つ（0なら次回の実行で受け取る）
+SELL_REVIEW_POLL_SECONDS = 10
+# sell_own_tokens のポジション毎の処理（fetch → screen → chart → decide）を並行して進める
+SELL_PIPELINE_WORKERS = 8  # 同時に処理するポジション数
+SELL_FETCH_CONCURRENCY = 8  # Gamma からのマーケット取得
+SELL_CHART_CONCURRENCY = 4  # 価格履歴の取得とチャート作成（描画は CHART_RENDER_WORKERS 個のプロセス）
+SELL_DECIDE_CONCURRENCY = LLM_CONCURRENCY  # LLMへの同時リクエスト数
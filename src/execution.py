@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+from zoneinfo import ZoneInfo
+
+import config
+from metrics import LatencyHistogram
+
+ALERT_WORKERS = config.ALERT_WORKERS
+ALERT_TIMEOUT_SECONDS = config.ALERT_TIMEOUT_SECONDS
+ALERT_QUEUE_SIZE = config.ALERT_QUEUE_SIZE
+
+# handler(alert, record): record に結果を書き込む。例外を投げたら失敗扱い
+AlertHandler = Callable[[dict[str, Any], dict[str, Any]], None]
+
+
+class AlertExecutor:
+    """
+    アラートをキューで受け取り、ワーカースレッドで並列に発注処理する
+    ポーリングのループはキューに積むだけなので、発注の往復を待たない
+    1アラートにつき1つの結果ファイルを full_logs/ に書く
+    timeout 秒以内に終わらない発注は止められない（後から約定しうる）ので、失敗ではなく「不明」として記録し、
+    ハンドラーが終わった時に本当の結果で結果ファイルを書き直す
+    """
+    def __init__(
+        self,
+        handler: AlertHandler,
+        *,
+        workers: int = ALERT_WORKERS,
+        timeout: float = ALERT_TIMEOUT_SECONDS,
+        max_pending: int = ALERT_QUEUE_SIZE,
+        report_every: int = 10,
+    ) -> None:
+        self.handler = handler
+        self.timeout = timeout
+        self.report_every = report_every
+        self.latency = LatencyHistogram()
+        self.completed = 0
+        self.timed_out = 0  # timeout 秒以内に終わらなかった数（後で結果が出たものも含む）
+        self.unresolved = 0  # 結果がまだ出ていない数
+        self.failed = 0
+        self._queue: queue.Queue[dict[str, Any] | None] = queue.Queue(maxsize=max_pending)
+        # タイムアウトしたジョブがスロットを握ったままでも回るように多めに取る
+        self._pool = ThreadPoolExecutor(max_workers=workers * 2, thread_name_prefix="alert-job")
+        # 空きスレッドがある時だけ投げる（キューで待っている間にタイムアウトを数えないように）
+        self._slots = threading.BoundedSemaphore(workers * 2)
+        self._lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"alert-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, alert: dict[str, Any]) -> bool:
+        alert.setdefault("detected_at", time.time())
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            print(f"alert queue full, dropped alert for {alert.get('token_id')}")
+            return False
+        return True
+
+    def close(self, wait: bool = True) -> None:
+        for _ in self._workers:
+            self._queue.put(None)
+        if wait:
+            for worker in self._workers:
+                worker.join()
+        self._pool.shutdown(wait=wait)
+
+    def _work(self) -> None:
+        while True:
+            alert = self._queue.get()
+            if alert is None:
+                return
+            record: dict[str, Any] = {"signals": alert.get("signals")}
+            self._slots.acquire()
+            future = self._pool.submit(self.handler, alert, record)
+            future.add_done_callback(lambda _: self._slots.release())
+            try:
+                future.result(timeout=self.timeout)
+                record["result"] = "成功"
+            except FutureTimeoutError:
+                record["result"] = "不明"
+                record["error"] = f"no response within {self.timeout}s"
+            except Exception as exc:
+                record["result"] = "失敗"
+                record["error"] = str(exc)
+
+            latency = time.time() - alert["detected_at"]
+            record["alert_to_order_seconds"] = latency
+            self.latency.observe(latency)
+            log_path = self._write_record(alert, dict(record))
+            if record["result"] == "成功":
+                print(f"トークンを価格{record.get('token_price')}で、{record.get('size')}個購入しました。({latency:.2f}s)")
+            elif record["result"] == "不明":
+                print(f"発注の結果が{self.timeout}秒以内に返りませんでした。結果が出たら{log_path}を書き直します。")
+            else:
+                print(f"トークンを購入できませんでした。{log_path}を確認してください。")
+            self._count(record["result"])
+            if record["result"] == "不明":
+                future.add_done_callback(
+                    lambda done, alert=alert, record=record, log_path=log_path: self._reconcile(
+                        done, alert, record, log_path
+                    )
+                )
+
+    def _reconcile(
+        self, future: Any, alert: dict[str, Any], record: dict[str, Any], log_path: Path
+    ) -> None:
+        """「不明」で記録したアラートの発注が終わったら、本当の結果で結果ファイルを書き直す"""
+        exc = future.exception()
+        if exc is None:
+            record["result"] = "成功"
+            record.pop("error", None)
+        else:
+            record["result"] = "失敗"
+            record["error"] = str(exc)
+        record["resolved_after_seconds"] = time.time() - alert["detected_at"]
+        new_path = self._write_record(alert, dict(record))
+        log_path.unlink(missing_ok=True)
+        if record["result"] == "成功":
+            print(f"（遅れて約定）トークンを価格{record.get('token_price')}で、{record.get('size')}個購入しました。{new_path}")
+        else:
+            print(f"トークンを購入できませんでした。{new_path}を確認してください。")
+        with self._lock:
+            self.unresolved -= 1
+            if record["result"] != "成功":
+                self.failed += 1
+
+    def _count(self, result: str) -> None:
+        with self._lock:
+            self.completed += 1
+            if result == "不明":
+                self.timed_out += 1
+                self.unresolved += 1
+            elif result != "成功":
+                self.failed += 1
+            report = self.report_every and self.completed % self.report_every == 0
+        if report:
+            print(
+                f"alert executions={self.completed} failed={self.failed} "
+                f"timed_out={self.timed_out} unresolved={self.unresolved} latency {self.latency.summary()}"
+            )
+
+    @staticmethod
+    def _write_record(alert: dict[str, Any], record: dict[str, Any]) -> Path:
+        now = datetime.now(ZoneInfo("Asia/Tokyo"))
+        log_dir = Path("full_logs") / now.strftime("%Y%m%d")
+        log_dir.mkdir(parents=True, exist_ok=True)
+        mark = "★" if record["result"] == "成功" else "☆"
+        log_path = log_dir / f"{now.strftime('%H%M%S_%f')}_{alert.get('market_id')}_{mark}.json"
+        with open(log_path, "w", encoding="utf-8") as f:
+            json.dump({alert.get("condition_id"): record}, f, ensure_ascii=False, indent=2)
+        return log_path
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+
+import config
+
+HISTORY_STORE_DIR = config.HISTORY_STORE_DIR
+HISTORY_REFRESH_SECONDS = config.HISTORY_REFRESH_SECONDS
+HISTORY_MAX_AGE_SECONDS = config.HISTORY_MAX_AGE_SECONDS
+HISTORY_FIDELITY_MINUTES = config.HISTORY_FIDELITY_MINUTES
+
+# /prices-history の interval 指定を秒に直したもの
+INTERVAL_SECONDS = {
+    "1h": 60 * 60,
+    "6h": 6 * 60 * 60,
+    "1d": 24 * 60 * 60,
+    "1w": 7 * 24 * 60 * 60,
+}
+
+# 1点 = UNIX秒(int64) + 価格(float32) の12バイト
+POINT_DTYPE = np.dtype([("t", "<i8"), ("p", "<f4")])
+
+# get(url, params=...) -> JSON
+JsonGetter = Callable[..., Any]
+
+
+class _Series:
+    __slots__ = ("timestamps", "prices", "covered_from", "fetched_at", "lock")
+
+    def __init__(self, points: np.ndarray) -> None:
+        self.timestamps = np.ascontiguousarray(points["t"])
+        self.prices = np.ascontiguousarray(points["p"])
+        # ここより後は取得済み（ファイルから読んだ場合は最初の点）
+        self.covered_from = float(points["t"][0]) if len(points) else None
+        self.fetched_at = 0.0
+        self.lock = threading.Lock()
+
+
+class PriceHistoryStore:
+    """
+    トークンごとの /prices-history をローカルに溜めて、前回の最終時刻より新しい点だけ取りに行く
+        history_store/<token_id>.bin   POINT_DTYPE の追記専用ファイル
+    メモリ上はトークンごとに時刻・価格の配列を持ち、範囲指定で切り出して返す
+    """
+    def __init__(
+        self,
+        get: JsonGetter,
+        clob_api_base: str,
+        *,
+        root: str | Path = HISTORY_STORE_DIR,
+        refresh_seconds: float = HISTORY_REFRESH_SECONDS,
+        max_age: float = HISTORY_MAX_AGE_SECONDS,
+        fidelity: int = HISTORY_FIDELITY_MINUTES,
+    ) -> None:
+        self.get = get
+        self.url = f"{clob_api_base}/prices-history"
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.refresh_seconds = refresh_seconds
+        self.max_age = max_age
+        self.fidelity = fidelity
+        self.requests = 0
+        self.points_fetched = 0
+        self._series: dict[str, _Series] = {}
+        self._lock = threading.Lock()
+
+    def history(self, token_id: str, window: float) -> tuple[np.ndarray, np.ndarray]:
+        """直近 window 秒の (時刻, 価格)。必要なら先に差分を取りに行く"""
+        now = time.time()
+        self.update(token_id, since=now - window)
+        return self.range(token_id, now - window)
+
+    def update(self, token_id: str, since: float | None = None) -> int:
+        """
+        前回の最終時刻より後の点を取得して追記し、追加した件数を返す
+        since: どこからのデータが要るか（UNIX秒）。持っている範囲より前なら足りない分も取る
+        """
+        series = self._load(token_id)
+        with series.lock:
+            now = time.time()
+            since = now - self.max_age if since is None else max(since, now - self.max_age)
+            added = 0
+            if series.covered_from is not None and since < series.covered_from - self.fidelity * 60:
+                # 持っている範囲より前を求められたら、足りない分だけ取って前に足す
+                added += self._fetch(token_id, series, int(since), int(series.covered_from))
+            if now - series.fetched_at < self.refresh_seconds:
+                return added
+            if len(series.timestamps):
+                start = int(series.timestamps[-1]) + 1
+            else:
+                start = int(since)
+            added += self._fetch(token_id, series, start)
+            series.fetched_at = now
+            return added
+
+    def _fetch(self, token_id: str, series: _Series, start: int, end: int | None = None) -> int:
+        params = {"market": token_id, "startTs": start, "fidelity": self.fidelity}
+        if end is not None:
+            params["endTs"] = end
+        data = self.get(self.url, params=params)
+        points = np.array(
+            [
+                (item["t"], item["p"])
+                for item in data.get("history", [])
+                if item["t"] >= start and (end is None or item["t"] < end)
+            ],
+            dtype=POINT_DTYPE,
+        )
+        points.sort(order="t")
+        with self._lock:
+            self.requests += 1
+            self.points_fetched += len(points)
+        series.covered_from = start if series.covered_from is None else min(series.covered_from, start)
+        if len(points) == 0:
+            return 0
+
+        path = self._path(token_id)
+        if end is None:
+            with open(path, "ab") as f:
+                points.tofile(f)
+            series.timestamps = np.concatenate([series.timestamps, points["t"]])
+            series.prices = np.concatenate([series.prices, points["p"]])
+        else:
+            series.timestamps = np.concatenate([points["t"], series.timestamps])
+            series.prices = np.concatenate([points["p"], series.prices])
+            merged = np.empty(len(series.timestamps), dtype=POINT_DTYPE)
+            merged["t"], merged["p"] = series.timestamps, series.prices
+            tmp_path = path.with_suffix(".tmp")
+            merged.tofile(tmp_path)
+            tmp_path.replace(path)
+        return len(points)
+
+    def range(
+        self, token_id: str, start: float | None = None, end: float | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """[start, end) の (時刻, 価格)。取得はしない"""
+        series = self._load(token_id)
+        with series.lock:
+            timestamps, prices = series.timestamps, series.prices
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, side="left"))
+        hi = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side="left"))
+        return timestamps[lo:hi], prices[lo:hi]
+
+    def last_timestamp(self, token_id: str) -> int | None:
+        timestamps, _ = self.range(token_id)
+        return int(timestamps[-1]) if len(timestamps) else None
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "tokens": len(self._series),
+            "requests": self.requests,
+            "points_fetched": self.points_fetched,
+        }
+
+    def _load(self, token_id: str) -> _Series:
+        with self._lock:
+            series = self._series.get(token_id)
+            if series is not None:
+                return series
+            path = self._path(token_id)
+            points = np.fromfile(path, dtype=POINT_DTYPE) if path.exists() else np.zeros(0, POINT_DTYPE)
+            # 古い点は読み込み時に捨ててファイルも詰め直す
+            cutoff = time.time() - self.max_age
+            if len(points) and points["t"][0] < cutoff:
+                points = points[points["t"] >= cutoff]
+                tmp_path = path.with_suffix(".tmp")
+                points.tofile(tmp_path)
+                tmp_path.replace(path)
+            series = _Series(points)
+            self._series[token_id] = series
+            return series
+
+    def _path(self, token_id: str) -> Path:
+        return self.root / f"{token_id}.bin"
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import random
+import re
+import threading
+import time
+from typing import Any
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+from metrics import LatencyHistogram
+from models import loads
+
+HTTP_POOL_SIZE = config.HTTP_POOL_SIZE
+HTTP_CONNECT_TIMEOUT = config.HTTP_CONNECT_TIMEOUT
+HTTP_READ_TIMEOUT = config.HTTP_READ_TIMEOUT
+HTTP_MAX_RETRIES = config.HTTP_MAX_RETRIES
+HTTP_BACKOFF_BASE = config.HTTP_BACKOFF_BASE
+HTTP_BACKOFF_MAX = config.HTTP_BACKOFF_MAX
+HTTP_RATE_LIMITS = config.HTTP_RATE_LIMITS
+
+# 再試行するステータス（それ以外の4xxはすぐに例外にする）
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# メトリクスのキーにする時、ID部分をまとめる（/markets/123 → /markets/:id）
+_ID_SEGMENT = re.compile(r"/(?:\d+|0x[0-9a-fA-F]+)(?=/|$)")
+
+
+class TokenBucket:
+    """rate [回/秒] で補充され、burst 回まで貯まるトークンバケット（スレッドセーフ）"""
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """1トークン取れるまで待ち、待った秒数を返す"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            # 足りない分は先に借りて、その分だけ待つ（ロックの外で寝る）
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited += delay
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+class EndpointStats:
+    def __init__(self) -> None:
+        self.latency = LatencyHistogram()
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.statuses: dict[int, int] = {}
+
+
+class HttpClient:
+    """
+    Gamma / CLOB / Data API 共通のHTTPクライアント
+    - 1つの Session とコネクションプールを全スレッドで共有する
+    - 429・5xx・接続エラーはジッター付き指数バックオフで再試行（Retry-After があれば従う）
+    - ホストごとのトークンバケットで、各APIのレート制限を超えないように送る
+    - 接続と読み込みのタイムアウトを分けて指定する
+    - エンドポイントごとのレイテンシとエラー数を数える
+    """
+    def __init__(
+        self,
+        *,
+        pool_size: int = HTTP_POOL_SIZE,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+        read_timeout: float = HTTP_READ_TIMEOUT,
+        max_retries: int = HTTP_MAX_RETRIES,
+        backoff_base: float = HTTP_BACKOFF_BASE,
+        backoff_max: float = HTTP_BACKOFF_MAX,
+        rate_limits: dict[str, tuple[float, float]] | None = None,
+    ) -> None:
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        limits = HTTP_RATE_LIMITS if rate_limits is None else rate_limits
+        self.limiters = {host: TokenBucket(rate, burst) for host, (rate, burst) in limits.items()}
+        self.endpoints: dict[str, EndpointStats] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        url: str,
+        *,
+        params: dict[str, Any] | None = None,
+        timeout: Any = None,
+        retries: int | None = None,
+    ) -> Any:
+        return self._decode(self.request("GET", url, params=params, timeout=timeout, retries=retries))
+
+    def post(
+        self, url: str, *, payload: Any = None, timeout: Any = None, retries: int | None = None
+    ) -> Any:
+        return self._decode(self.request("POST", url, json=payload, timeout=timeout, retries=retries))
+
+    def request(
+        self, method: str, url: str, *, timeout: Any = None, retries: int | None = None, **kwargs: Any
+    ) -> requests.Response:
+        """
+        成功するか再試行を使い切るまで送る。最後に失敗したら requests の例外を投げる
+        timeout: 秒数 または (接続, 読み込み)。省略時は設定値
+        retries: 再試行の回数。省略時は max_retries（呼び出し側で全体の時間に上限がある時は小さくする）
+        """
+        max_retries = self.max_retries if retries is None else retries
+        parts = urlsplit(url)
+        stats = self._stats(f"{method} {parts.netloc}{_ID_SEGMENT.sub('/:id', parts.path)}")
+        limiter = self.limiters.get(parts.netloc)
+        attempt = 0
+        while True:
+            if limiter is not None:
+                limiter.acquire()
+            started = time.perf_counter()
+            retry_after = None
+            try:
+                response = self.session.request(
+                    method, url, timeout=timeout or self.timeout, **kwargs
+                )
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                error: Exception = exc
+                status = None
+            else:
+                status = response.status_code
+                error = None
+                if status in RETRY_STATUSES:
+                    retry_after = response.headers.get("Retry-After")
+                    error = requests.HTTPError(f"{status} for url: {url}", response=response)
+                elif status >= 400:
+                    self._record(stats, started, status, failed=True)
+                    response.raise_for_status()
+            self._record(stats, started, status, failed=error is not None)
+            if error is None:
+                return response
+            if attempt >= max_retries:
+                raise error
+            attempt += 1
+            with self._lock:
+                stats.retries += 1
+            time.sleep(self._backoff(attempt, retry_after))
+
+    def report(self) -> str:
+        lines = []
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+        for name, stats in endpoints:
+            lines.append(
+                f"{name}: requests={stats.requests} retries={stats.retries} "
+                f"errors={stats.errors} statuses={stats.statuses} latency {stats.latency.summary()}"
+            )
+        throttled = {
+            host: round(limiter.waited, 2) for host, limiter in self.limiters.items() if limiter.waited
+        }
+        if throttled:
+            lines.append(f"rate limit waits [s]: {throttled}")
+        return "\n".join(lines)
+
+    def close(self) -> None:
+        self.session.close()
+
+    @staticmethod
+    def _decode(response: requests.Response) -> Any:
+        """
+        本文をJSONとしてパースする。JSONでなければ（HTMLのエラーページ等）、response.json() と同じく
+        requests.exceptions.JSONDecodeError（RequestException）にして、呼び出し側の except で拾えるようにする
+        """
+        try:
+            return loads(response.content)
+        except ValueError as exc:
+            raise requests.exceptions.JSONDecodeError(
+                f"response body is not JSON ({response.status_code})", response.text[:200], 0, response=response
+            ) from exc
+
+    def _backoff(self, attempt: int, retry_after: str | None) -> float:
+        # フルジッター: [0, min(上限, base * 2^attempt)] から一様に選ぶ
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass  # HTTP日付形式は使われていないので無視する
+        return delay
+
+    def _stats(self, endpoint: str) -> EndpointStats:
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            return stats
+
+    def _record(self, stats: EndpointStats, started: float, status: int | None, *, failed: bool) -> None:
+        stats.latency.observe(time.perf_counter() - started)
+        with self._lock:
+            stats.requests += 1
+            if failed:
+                stats.errors += 1
+            if status is not None:
+                stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+
+_shared_client: HttpClient | None = None
+_shared_lock = threading.Lock()
+
+
+def shared_client() -> HttpClient:
+    """プロセス内で共有するクライアント（TRADE・トラッカー・MidpointFetcher で共有）"""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = HttpClient()
+        return _shared_client
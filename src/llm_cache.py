@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+import config
+
+LLM_CACHE_DIR = config.LLM_CACHE_DIR
+LLM_CACHE_SIZE = config.LLM_CACHE_SIZE
+LLM_CACHE_TTL_SECONDS = config.LLM_CACHE_TTL_SECONDS
+LLM_PRICE_PER_MTOK = config.LLM_PRICE_PER_MTOK
+LLM_WEB_SEARCH_COST = config.LLM_WEB_SEARCH_COST
+
+
+def request_key(kind: str, request: dict[str, Any]) -> str:
+    """
+    呼び出しの種類と responses.create に渡す引数（model / reasoning / tools / input）のハッシュ
+    画像は input に data URL で入っているので、画像が変われば別のキーになる
+    """
+    raw = json.dumps([kind, request], ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def response_cost(model: str, response: Any) -> float:
+    """レスポンスの usage と Web検索の回数から料金 [USD] を見積もる（料金表に無いモデルは0）"""
+    prices = LLM_PRICE_PER_MTOK.get(model)
+    usage = getattr(response, "usage", None)
+    cost = 0.0
+    if prices is not None and usage is not None:
+        input_price, cached_price, output_price = prices
+        details = getattr(usage, "input_tokens_details", None)
+        cached = getattr(details, "cached_tokens", 0) or 0
+        cost += (usage.input_tokens - cached) * input_price / 1e6
+        cost += cached * cached_price / 1e6
+        cost += usage.output_tokens * output_price / 1e6
+    searches = sum(1 for item in getattr(response, "output", []) if getattr(item, "type", None) == "web_search_call")
+    return cost + searches * LLM_WEB_SEARCH_COST
+
+
+class LLMCache:
+    """
+    LLMの呼び出し結果を、入力のハッシュをキーにしてファイルに保存する
+        cache/llm/<sha256>.json   {"kind", "created_at", "cost", "elapsed", "result"}
+    呼び出しの種類ごとに TTL を持ち、期限切れ・ファイル数の上限を超えた古いものは使わない/消す
+    """
+    def __init__(
+        self,
+        root: str | Path = LLM_CACHE_DIR,
+        *,
+        ttl: dict[str, float] | None = None,
+        max_files: int = LLM_CACHE_SIZE,
+    ) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.ttl = LLM_CACHE_TTL_SECONDS if ttl is None else ttl
+        self.max_files = max_files
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.saved_usd = 0.0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, key: str) -> Any | None:
+        """キャッシュした結果。無い・期限切れなら None"""
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+            created_at = float(entry["created_at"])
+            result = entry["result"]
+        except FileNotFoundError:
+            entry = None
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+            # 壊れた・書きかけのエントリは外れとして消す
+            path.unlink(missing_ok=True)
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.time() - created_at > self.ttl.get(kind, 0):
+                self.misses += 1
+                self.expired += 1
+                return None
+            self.hits += 1
+            self.saved_usd += entry.get("cost", 0.0)
+            self.saved_seconds += entry.get("elapsed", 0.0)
+        return result
+
+    def put(self, kind: str, key: str, result: Any, *, cost: float = 0.0, elapsed: float = 0.0) -> None:
+        if self.ttl.get(kind, 0) <= 0:
+            return
+        entry = {"kind": kind, "created_at": time.time(), "cost": cost, "elapsed": elapsed, "result": result}
+        path = self._path(key)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(path)
+        with self._lock:
+            self._prune_files()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "saved_usd": round(self.saved_usd, 4),
+            "saved_seconds": round(self.saved_seconds, 1),
+        }
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def _prune_files(self) -> None:
+        files = list(self.root.glob("*.json"))
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=lambda path: path.stat().st_mtime)
+        for path in files[: len(files) - self.max_files]:
+            path.unlink(missing_ok=True)
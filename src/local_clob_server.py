@@ -0,0 +1,126 @@
+"""
+オフライン確認用の CLOB 代替サーバー（発注系のみ）
+APIキーの発行・導出、発注に必要なマーケット情報、/order・/orders への発注を受け付ける
+発行していない POLY_API_KEY での発注は 401 を返す（APIキー再取得の確認用）
+    python local_clob_server.py [port] [応答遅延秒]
+    CLOB_API_BASE を http://127.0.0.1:<port> に向けて使う
+"""
+from __future__ import annotations
+
+import base64
+import json
+import secrets
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import urlparse
+
+
+class LocalClobServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 8767, latency: float = 0.0) -> None:
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.api_keys: dict[str, dict[str, str]] = {}  # address -> creds
+        self.orders = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def issue_key(self, address: str) -> dict[str, str]:
+        with self._lock:
+            if address not in self.api_keys:
+                self.api_keys[address] = {
+                    "apiKey": secrets.token_hex(16),
+                    "secret": base64.urlsafe_b64encode(secrets.token_bytes(32)).decode(),
+                    "passphrase": secrets.token_hex(16),
+                }
+            return self.api_keys[address]
+
+    def authorized(self, api_key: str | None) -> bool:
+        with self._lock:
+            ok = any(creds["apiKey"] == api_key for creds in self.api_keys.values())
+            if not ok:
+                self.rejected += 1
+            return ok
+
+    def accept_orders(self, count: int) -> list[dict[str, Any]]:
+        with self._lock:
+            first = self.orders
+            self.orders += count
+        return [
+            {"success": True, "errorMsg": "", "orderID": f"0x{first + i:064x}", "status": "live"}
+            for i in range(count)
+        ]
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, name="local-clob", daemon=True)
+        thread.start()
+        return thread
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: LocalClobServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+    def do_DELETE(self) -> None:
+        self._handle("DELETE")
+
+    def _handle(self, method: str) -> None:
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        path = urlparse(self.path).path
+
+        if path in ("/auth/api-key", "/auth/derive-api-key"):
+            self._send(200, self.server.issue_key(self.headers.get("POLY_ADDRESS", "")))
+        elif path == "/version":
+            self._send(200, {"version": 2})
+        elif path == "/time":
+            self._send(200, int(time.time()))
+        elif path == "/tick-size":
+            self._send(200, {"minimum_tick_size": 0.01})
+        elif path == "/neg-risk":
+            self._send(200, {"neg_risk": False})
+        elif path == "/fee-rate":
+            self._send(200, {"base_fee": 0})
+        elif path in ("/order", "/orders") and method == "POST":
+            if not self.server.authorized(self.headers.get("POLY_API_KEY")):
+                self._send(401, {"error": "Unauthorized/Invalid api key"})
+                return
+            count = len(body) if isinstance(body, list) else 1
+            results = self.server.accept_orders(count)
+            self._send(200, results if path == "/orders" else results[0])
+        else:
+            self._send(404, {"error": f"not found: {method} {path}"})
+
+    def _send(self, status: int, payload: Any) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8767
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    server = LocalClobServer(port, latency)
+    print(f"local CLOB on {server.url}")
+    server.serve_forever()
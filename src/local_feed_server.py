@@ -0,0 +1,88 @@
+"""
+オフライン確認用の market チャンネル代替サーバー
+購読された asset_id について book を1回送り、その後ランダムウォークの price_change を流し続ける
+    python local_feed_server.py [port] [送信間隔秒] [切断までの秒数(0なら切断しない)]
+    POLYMARKET_MARKET_STREAM=1 POLYMARKET_MARKET_WS_URL=ws://127.0.0.1:8765 python track_own_token_prices.py
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import sys
+import time
+from typing import Any
+
+import websockets
+
+
+async def handle(ws: Any, interval: float, drop_after: float) -> None:
+    started = time.monotonic()
+    prices: dict[str, float] = {}
+    asset_ids: list[str] = []
+
+    async def receive() -> None:
+        async for message in ws:
+            if message == "PING":
+                await ws.send("PONG")
+                continue
+            request = json.loads(message)
+            for asset_id in request.get("assets_ids", []):
+                if asset_id in prices:
+                    continue
+                asset_ids.append(asset_id)
+                prices[asset_id] = round(random.uniform(0.2, 0.8), 2)
+                book = {
+                    "event_type": "book",
+                    "asset_id": asset_id,
+                    "bids": [{"price": f"{prices[asset_id] - 0.01:.2f}", "size": "100"}],
+                    "asks": [{"price": f"{prices[asset_id] + 0.01:.2f}", "size": "100"}],
+                    "timestamp": str(int(time.time() * 1000)),
+                }
+                await ws.send(json.dumps([book]))
+
+    receiver = asyncio.create_task(receive())
+    try:
+        while not receiver.done():
+            await asyncio.sleep(interval)
+            if drop_after and time.monotonic() - started >= drop_after:
+                print("dropping connection")
+                await ws.close()
+                break
+            if not asset_ids:
+                continue
+            asset_id = random.choice(asset_ids)
+            prices[asset_id] = min(max(prices[asset_id] * random.uniform(0.85, 1.15), 0.02), 0.98)
+            mid = prices[asset_id]
+            event = {
+                "event_type": "price_change",
+                "price_changes": [
+                    {
+                        "asset_id": asset_id,
+                        "price": f"{mid:.3f}",
+                        "size": "10",
+                        "side": "BUY",
+                        "best_bid": f"{mid - 0.01:.3f}",
+                        "best_ask": f"{mid + 0.01:.3f}",
+                    }
+                ],
+                "timestamp": str(int(time.time() * 1000)),
+            }
+            await ws.send(json.dumps(event))
+    except websockets.ConnectionClosed:
+        pass
+    finally:
+        receiver.cancel()
+
+
+async def main(port: int, interval: float, drop_after: float) -> None:
+    async with websockets.serve(lambda ws: handle(ws, interval, drop_after), "127.0.0.1", port):
+        print(f"local market feed on ws://127.0.0.1:{port}")
+        await asyncio.Future()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    interval = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    drop_after = float(sys.argv[3]) if len(sys.argv) > 3 else 0
+    asyncio.run(main(port, interval, drop_after))
@@ -0,0 +1,301 @@
+"""
+オフライン確認用の OpenAI Responses API 代替サーバー
+POST /v1/responses に、Agent が使う3種類の呼び出しだけそれらしく答える
+    show_market_detail: プロンプト中の最初の market_id を選ぶ
+    make_order: Yes を最小個数だけ買う
+    web_search 付き: Web検索1回 + 意見のテキスト（latency + search_latency 秒かかる）
+    position_review（構造化出力）: 損失が出ているポジションは売却、それ以外は維持
+Batch API（/v1/files・/v1/batches）も受け付け、投げてから batch_latency 秒後に完了にする
+    python local_openai_server.py [port] [応答遅延秒] [Web検索の追加遅延秒] [バッチの所要秒]
+    OPENAI_BASE_URL を http://127.0.0.1:<port>/v1 に向けて使う（OPENAI_API_KEY は何でもよい）
+"""
+from __future__ import annotations
+
+import json
+import re
+import secrets
+import sys
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import urlparse
+
+import config
+
+_MARKET_ID = re.compile(r"market_id: (\d+)")
+_CONDITION_SECTION = re.compile(
+    r"■ condition_id: (\S+) / outcome: ([^\n]+)\n(.*?)(?=■ condition_id: |\Z)", re.S
+)
+
+
+class LocalOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self, port: int = 8768, latency: float = 0.0, search_latency: float = 0.0, batch_latency: float = 0.0
+    ) -> None:
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.search_latency = search_latency
+        self.batch_latency = batch_latency
+        self.files: dict[str, bytes] = {}
+        self.batches: dict[str, dict[str, Any]] = {}
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0  # 同時に処理していたリクエスト数の最大値
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def enter(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def leave(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def respond(self, request: dict[str, Any]) -> dict[str, Any]:
+        text = _input_text(request.get("input"))
+        tool_choice = request.get("tool_choice") or "auto"
+        tools = request.get("tools") or []
+        output: list[dict[str, Any]] = []
+        if isinstance(tool_choice, dict) and tool_choice.get("type") == "function":
+            name = tool_choice["name"]
+            if name == "show_market_detail":
+                match = _MARKET_ID.search(text)
+                arguments = {"market_id": int(match.group(1)) if match else 0}
+            elif name == "make_order":
+                arguments = {"token": "Yes", "size": config.MIN_BUY_TOKENS}
+            else:
+                arguments = {}
+            output.append({
+                "type": "function_call",
+                "id": f"fc_{secrets.token_hex(8)}",
+                "call_id": f"call_{secrets.token_hex(8)}",
+                "name": name,
+                "arguments": json.dumps(arguments),
+                "status": "completed",
+            })
+        else:
+            if any(tool.get("type") == "web_search" for tool in tools):
+                time.sleep(self.search_latency)
+                output.append({
+                    "type": "web_search_call",
+                    "id": f"ws_{secrets.token_hex(8)}",
+                    "status": "completed",
+                    "action": {"type": "search", "query": text[:50]},
+                })
+            text_format = (request.get("text") or {}).get("format") or {}
+            if text_format.get("name") == "position_review":
+                verdicts = [
+                    {
+                        "condition_id": condition_id,
+                        "outcome": outcome,
+                        "verdict": "売却" if "損失" in section else "維持",
+                        "reason": "（ローカル代替サーバー）損失が出ているものは売却する",
+                    }
+                    for condition_id, outcome, section in _CONDITION_SECTION.findall(text)
+                ]
+                output.append(_message(json.dumps({"verdicts": verdicts}, ensure_ascii=False)))
+            else:
+                output.append(_message("（ローカル代替サーバーの意見）市場価格はおおむね妥当と考える。"))
+        return _response(request, output, text)
+
+    # --- Batch API ---
+    def add_file(self, filename: str, data: bytes, purpose: str) -> dict[str, Any]:
+        file_id = f"file-{secrets.token_hex(12)}"
+        with self._lock:
+            self.files[file_id] = data
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(data),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+
+    def create_batch(self, body: dict[str, Any]) -> dict[str, Any]:
+        batch = {
+            "id": f"batch_{secrets.token_hex(12)}",
+            "object": "batch",
+            "endpoint": body["endpoint"],
+            "input_file_id": body["input_file_id"],
+            "completion_window": body.get("completion_window", "24h"),
+            "created_at": int(time.time()),
+            "status": "in_progress",
+            "output_file_id": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        with self._lock:
+            self.batches[batch["id"]] = batch
+        return batch
+
+    def batch_status(self, batch_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            batch = self.batches.get(batch_id)
+        if batch is None:
+            return None
+        if batch["status"] == "in_progress" and time.time() - batch["created_at"] >= self.batch_latency:
+            # 期限が来たら入力を処理して完了にする
+            lines = []
+            for line in self.files[batch["input_file_id"]].decode("utf-8").splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                lines.append(json.dumps({
+                    "id": f"batch_req_{secrets.token_hex(8)}",
+                    "custom_id": item["custom_id"],
+                    "response": {"status_code": 200, "body": self.respond(item["body"])},
+                    "error": None,
+                }, ensure_ascii=False))
+            output = self.add_file("batch_output.jsonl", "\n".join(lines).encode("utf-8"), "batch_output")
+            batch.update(
+                status="completed",
+                output_file_id=output["id"],
+                completed_at=int(time.time()),
+                request_counts={"total": len(lines), "completed": len(lines), "failed": 0},
+            )
+        return batch
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, name="local-openai", daemon=True)
+        thread.start()
+        return thread
+
+
+def _input_text(conversation: Any) -> str:
+    if isinstance(conversation, str):
+        return conversation
+    texts = []
+    for message in conversation or []:
+        content = message.get("content")
+        if isinstance(content, str):
+            texts.append(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "input_text":
+                texts.append(part.get("text", ""))
+    return "\n".join(texts)
+
+
+def _message(text: str) -> dict[str, Any]:
+    return {
+        "type": "message",
+        "id": f"msg_{secrets.token_hex(8)}",
+        "role": "assistant",
+        "status": "completed",
+        "content": [{"type": "output_text", "text": text, "annotations": []}],
+    }
+
+
+def _response(request: dict[str, Any], output: list[dict[str, Any]], text: str) -> dict[str, Any]:
+    input_tokens = len(text) // 2 + 1  # 日本語が多いので1トークン≒2文字で数える
+    output_tokens = sum(len(json.dumps(item, ensure_ascii=False)) for item in output) // 2 + 1
+    return {
+        "id": f"resp_{secrets.token_hex(12)}",
+        "object": "response",
+        "created_at": time.time(),
+        "status": "completed",
+        "model": request.get("model", ""),
+        "output": output,
+        "parallel_tool_calls": True,
+        "tool_choice": request.get("tool_choice") or "auto",
+        "tools": request.get("tools") or [],
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: LocalOpenAIServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        path = urlparse(self.path).path
+        parts = path.strip("/").split("/")
+        if len(parts) == 3 and parts[:2] == ["v1", "batches"]:
+            batch = self.server.batch_status(parts[2])
+            if batch is not None:
+                self._send(200, batch)
+                return
+        elif len(parts) == 4 and parts[:2] == ["v1", "files"] and parts[3] == "content":
+            data = self.server.files.get(parts[2])
+            if data is not None:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+        self._send(404, {"error": {"message": f"not found: GET {path}"}})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        path = urlparse(self.path).path
+        if path == "/v1/files":
+            self._send(200, self._upload(raw))
+            return
+        body = json.loads(raw) if raw else {}
+        if path == "/v1/batches":
+            self._send(200, self.server.create_batch(body))
+            return
+        if path != "/v1/responses":
+            self._send(404, {"error": {"message": f"not found: POST {path}"}})
+            return
+        self.server.enter()
+        try:
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            self._send(200, self.server.respond(body))
+        finally:
+            self.server.leave()
+
+    def _upload(self, raw: bytes) -> dict[str, Any]:
+        # multipart/form-data の file と purpose を取り出す
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode()
+        message = BytesParser(policy=default_policy).parsebytes(header + raw)
+        filename, data, purpose = "upload.jsonl", b"", "batch"
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name == "file":
+                filename = part.get_filename() or filename
+                data = part.get_payload(decode=True)
+            elif name == "purpose":
+                purpose = part.get_payload(decode=True).decode()
+        return self.server.add_file(filename, data, purpose)
+
+    def _send(self, status: int, payload: Any) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8768
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    search_latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    batch_latency = float(sys.argv[4]) if len(sys.argv) > 4 else 0.0
+    server = LocalOpenAIServer(port, latency, search_latency, batch_latency)
+    print(f"local OpenAI on {server.url}")
+    server.serve_forever()
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import atexit
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+import config
+
+MARKET_CACHE_SIZE = config.MARKET_CACHE_SIZE
+MARKET_CACHE_STATIC_TTL = config.MARKET_CACHE_STATIC_TTL
+MARKET_CACHE_PRICE_TTL = config.MARKET_CACHE_PRICE_TTL
+MARKET_CACHE_PATH = config.MARKET_CACHE_PATH
+
+# ほぼ変わらないフィールド（文言・トークンID等）。これ以外は価格扱いで短いTTLにする
+STATIC_FIELDS = frozenset({
+    "id",
+    "conditionId",
+    "question",
+    "description",
+    "slug",
+    "outcomes",
+    "clobTokenIds",
+    "endDate",
+    "startDate",
+    "negRisk",
+    "orderPriceMinTickSize",
+})
+
+
+class MarketCache:
+    """
+    Gamma /markets の生データを market_id / condition_id で引けるLRUキャッシュ
+    静的フィールドと価格系フィールドで別々のTTLを持つ
+    path を指定するとプロセス終了時に保存し、次回起動時に読み込む
+    """
+    def __init__(
+        self,
+        max_entries: int = MARKET_CACHE_SIZE,
+        *,
+        static_ttl: float = MARKET_CACHE_STATIC_TTL,
+        price_ttl: float = MARKET_CACHE_PRICE_TTL,
+        path: str | Path | None = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttls = {"static": static_ttl, "price": price_ttl}
+        self.path = Path(path) if path else None
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._aliases: dict[str, str] = {}  # condition_id -> market_id
+        self._lock = threading.Lock()
+        if self.path is not None:
+            self.load()
+            atexit.register(self.save)
+
+    def get(self, key: str, *, need_prices: bool = True) -> dict[str, Any] | None:
+        """
+        key は market_id か condition_id。need_prices=False なら価格系が古くても静的部分が新しければヒット
+        """
+        now = time.time()
+        with self._lock:
+            market_id = self._aliases.get(key, key)
+            entry = self._entries.get(market_id)
+            if entry is None or not self._fresh(entry, "static", now) or (
+                need_prices and not self._fresh(entry, "price", now)
+            ):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(market_id)
+            self.hits += 1
+            return {**entry["static"], **entry["price"]}
+
+    def put(self, market: dict[str, Any]) -> None:
+        now = time.time()
+        market_id = str(market.get("id"))
+        static = {k: v for k, v in market.items() if k in STATIC_FIELDS}
+        price = {k: v for k, v in market.items() if k not in STATIC_FIELDS}
+        with self._lock:
+            self._entries[market_id] = {
+                "static": static,
+                "static_at": now,
+                "price": price,
+                "price_at": now,
+            }
+            self._entries.move_to_end(market_id)
+            if market.get("conditionId"):
+                self._aliases[str(market["conditionId"])] = market_id
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._aliases.pop(str(evicted["static"].get("conditionId")), None)
+
+    def stats(self) -> dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def load(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, json.JSONDecodeError) as exc:
+            print(f"market cache could not be loaded: {exc}")
+            return
+        now = time.time()
+        with self._lock:
+            for market_id, entry in saved.items():
+                if not self._fresh(entry, "static", now):
+                    continue
+                self._entries[market_id] = entry
+                condition_id = entry["static"].get("conditionId")
+                if condition_id:
+                    self._aliases[str(condition_id)] = market_id
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            data = dict(self._entries)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        tmp_path.replace(self.path)
+
+    def _fresh(self, entry: dict[str, Any], group: str, now: float) -> bool:
+        return now - entry[f"{group}_at"] < self.ttls[group]
+
+
+_shared_cache: MarketCache | None = None
+_shared_lock = threading.Lock()
+
+
+def shared_cache() -> MarketCache:
+    """プロセス内で共有するキャッシュ（TRADE インスタンス間で共有）"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = MarketCache(path=MARKET_CACHE_PATH)
+        return _shared_cache
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+import websockets
+
+import config
+
+MARKET_WS_URL = config.MARKET_WS_URL
+STREAM_STALE_SECONDS = config.STREAM_STALE_SECONDS
+STREAM_PING_SECONDS = 10
+
+
+@dataclass
+class PriceUpdate:
+    token_id: str
+    price: float
+    received_at: float
+
+
+class MarketStream:
+    """
+    CLOB の market チャンネルを WebSocket で購読し、中値が変わったトークンだけ updates キューに流す
+    受信は専用スレッドの asyncio ループで行い、切断時は自動で再接続する
+    """
+    def __init__(
+        self,
+        url: str = MARKET_WS_URL,
+        *,
+        stale_seconds: float = STREAM_STALE_SECONDS,
+        max_backoff: float = 30.0,
+    ) -> None:
+        self.url = url
+        self.stale_seconds = stale_seconds
+        self.max_backoff = max_backoff
+        self.updates: queue.Queue[PriceUpdate] = queue.Queue()
+        self.connected = threading.Event()
+        self._token_ids: list[str] = []
+        self._last_mid: dict[str, float] = {}
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._ws: Any = None
+
+    def start(self, token_ids: list[str]) -> None:
+        self._token_ids = list(token_ids)
+        self._thread = threading.Thread(
+            target=lambda: asyncio.run(self._run()), name="market-stream", daemon=True
+        )
+        self._thread.start()
+
+    def subscribe(self, token_ids: list[str]) -> None:
+        """購読対象を差し替える（接続し直して新しい一覧で購読する）。未開始なら開始する"""
+        if self._thread is None:
+            self.start(token_ids)
+            return
+        if set(token_ids) == set(self._token_ids):
+            return
+        self._token_ids = list(token_ids)
+        keep = set(token_ids)
+        self._last_mid = {k: v for k, v in self._last_mid.items() if k in keep}
+        self._reconnect()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._reconnect()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def next_update(self, timeout: float) -> PriceUpdate | None:
+        try:
+            return self.updates.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _reconnect(self) -> None:
+        if self._loop is not None and self._ws is not None:
+            asyncio.run_coroutine_threadsafe(self._ws.close(), self._loop)
+
+    async def _run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        backoff = 1.0
+        while not self._stopped.is_set():
+            try:
+                async with websockets.connect(self.url, ping_interval=None) as ws:
+                    self._ws = ws
+                    await ws.send(json.dumps({"assets_ids": self._token_ids, "type": "market"}))
+                    self.connected.set()
+                    backoff = 1.0
+                    print(f"market stream connected: {len(self._token_ids)} tokens")
+                    await self._consume(ws)
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as exc:
+                if not self._stopped.is_set():
+                    print(f"market stream dropped: {exc!r}")
+            finally:
+                self._ws = None
+                self.connected.clear()
+            if self._stopped.is_set():
+                break
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def _consume(self, ws: Any) -> None:
+        last_message = last_ping = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now - last_ping >= STREAM_PING_SECONDS:
+                await ws.send("PING")
+                last_ping = now
+            # 一定時間何も来なければ接続が死んでいるとみなして張り直す
+            if now - last_message >= self.stale_seconds:
+                raise asyncio.TimeoutError(f"no market data for {self.stale_seconds}s")
+            try:
+                message = await asyncio.wait_for(ws.recv(), timeout=STREAM_PING_SECONDS)
+            except asyncio.TimeoutError:
+                continue
+            last_message = time.monotonic()
+            if message == "PONG":
+                continue
+            try:
+                events = json.loads(message)
+            except json.JSONDecodeError:
+                continue
+            for event in events if isinstance(events, list) else [events]:
+                for token_id, mid in self._extract_midpoints(event):
+                    self._publish(token_id, round(mid, 6))
+
+    def _publish(self, token_id: str, mid: float) -> None:
+        if mid <= 0 or self._last_mid.get(token_id) == mid:
+            return
+        self._last_mid[token_id] = mid
+        self.updates.put(PriceUpdate(token_id=token_id, price=mid, received_at=time.time()))
+
+    @staticmethod
+    def _extract_midpoints(event: dict[str, Any]) -> list[tuple[str, float]]:
+        event_type = event.get("event_type")
+        if event_type == "book":
+            bids = [float(level["price"]) for level in event.get("bids", [])]
+            asks = [float(level["price"]) for level in event.get("asks", [])]
+            if bids and asks:
+                return [(str(event["asset_id"]), (max(bids) + min(asks)) / 2)]
+        elif event_type == "price_change":
+            results = []
+            for change in event.get("price_changes", []):
+                if change.get("best_bid") and change.get("best_ask"):
+                    mid = (float(change["best_bid"]) + float(change["best_ask"])) / 2
+                    results.append((str(change["asset_id"]), mid))
+            return results
+        elif event_type == "best_bid_ask":
+            if event.get("best_bid") and event.get("best_ask"):
+                mid = (float(event["best_bid"]) + float(event["best_ask"])) / 2
+                return [(str(event["asset_id"]), mid)]
+        return []
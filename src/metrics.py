@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class LatencyHistogram:
+    """
+    秒単位のレイテンシを固定バケットで数えるヒストグラム（スレッドセーフ）
+    """
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # 最後は上限超え
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """バケット上限で近似した分位点"""
+        with self._lock:
+            if self.count == 0:
+                return 0.0
+            target = q * self.count
+            seen = 0
+            for bound, count in zip(self.buckets, self.counts):
+                seen += count
+                if seen >= target:
+                    return bound
+            return self.max
+
+    def summary(self) -> str:
+        with self._lock:
+            buckets = " ".join(
+                f"<={bound:g}s:{count}" for bound, count in zip(self.buckets, self.counts) if count
+            )
+            overflow = self.counts[-1]
+        if overflow:
+            buckets += f" >{self.buckets[-1]:g}s:{overflow}"
+        return (
+            f"n={self.count} mean={self.mean:.3f}s p50<={self.quantile(0.5):g}s "
+            f"p95<={self.quantile(0.95):g}s max={self.max:.3f}s [{buckets}]"
+        )
+
+
+class StageTimer:
+    """
+    パイプラインのステージごとの所要時間（スレッドセーフ）
+    1件ずつの処理時間を LatencyHistogram に入れ、ステージの最初の開始から最後の終了までを経過時間とする
+    並行に処理していれば、経過時間は1件ずつの合計より短くなる
+    """
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.stages: dict[str, LatencyHistogram] = {}
+        self._spans: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                histogram = self.stages.get(name)
+                if histogram is None:
+                    histogram = self.stages[name] = LatencyHistogram(self.buckets)
+                    self._spans[name] = [started, finished]
+                span = self._spans[name]
+                span[0] = min(span[0], started)
+                span[1] = max(span[1], finished)
+            histogram.observe(finished - started)
+
+    def wall(self, name: str) -> float:
+        with self._lock:
+            started, finished = self._spans.get(name, (0.0, 0.0))
+        return finished - started
+
+    def report(self) -> str:
+        lines = []
+        for name, histogram in list(self.stages.items()):
+            lines.append(
+                f"{name:<8} wall={self.wall(name):.2f}s busy={histogram.total:.2f}s "
+                f"n={histogram.count} mean={histogram.mean:.3f}s p95<={histogram.quantile(0.95):g}s "
+                f"max={histogram.max:.3f}s"
+            )
+        return "\n".join(lines)
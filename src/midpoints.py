@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any
+
+import requests
+
+import config
+from http_client import HttpClient, shared_client
+
+MIDPOINT_BATCH_SIZE = config.MIDPOINT_BATCH_SIZE
+MIDPOINT_CONCURRENCY = config.MIDPOINT_CONCURRENCY
+MIDPOINT_BATCH_TIMEOUT_SECONDS = config.MIDPOINT_BATCH_TIMEOUT_SECONDS
+MIDPOINT_BATCH_RETRIES = config.MIDPOINT_BATCH_RETRIES
+
+
+class MidpointFetcher:
+    """
+    /midpoints をバッチ単位で並列に取得する（両トラッカー共通）
+    遅い・失敗したバッチは捨てて、取れた分だけ返す
+    """
+    def __init__(
+        self,
+        clob_api_base: str | None = None,
+        *,
+        batch_size: int = MIDPOINT_BATCH_SIZE,
+        concurrency: int = MIDPOINT_CONCURRENCY,
+        batch_timeout: float = MIDPOINT_BATCH_TIMEOUT_SECONDS,
+        retries: int = MIDPOINT_BATCH_RETRIES,
+        http: HttpClient | None = None,
+    ) -> None:
+        self.url = f"{clob_api_base or config.CLOB_API_BASE}/midpoints"
+        self.batch_size = batch_size
+        self.concurrency = max(1, concurrency)
+        self.batch_timeout = batch_timeout
+        self.retries = retries
+
+        self.http = http or shared_client()
+        self.pool = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="midpoints"
+        )
+        self.last_failed_batches = 0
+
+    def fetch(self, token_ids: list[str]) -> dict[str, str]:
+        batches = [
+            token_ids[start : start + self.batch_size]
+            for start in range(0, len(token_ids), self.batch_size)
+        ]
+        if not batches:
+            return {}
+
+        futures = [self.pool.submit(self._post_batch, batch) for batch in batches]
+        # 全体の待ち時間も上限を切る（1バッチの遅延でtick全体が止まらないように）
+        rounds = -(-len(batches) // self.concurrency)
+        done, not_done = wait(futures, timeout=self.batch_timeout * rounds)
+
+        results: dict[str, str] = {}
+        failed = len(not_done)
+        for future in not_done:
+            future.cancel()
+        for future in done:
+            try:
+                batch_result = future.result()
+            except requests.RequestException as exc:
+                print(f"midpoint batch failed: {exc}")
+                failed += 1
+                continue
+            if isinstance(batch_result, dict):
+                results.update(batch_result)
+
+        self.last_failed_batches = failed
+        if failed:
+            print(
+                f"midpoints: {failed}/{len(batches)} batches dropped, "
+                f"{len(results)}/{len(token_ids)} prices returned"
+            )
+        return results
+
+    def _post_batch(self, batch: list[str]) -> Any:
+        payload = [{"token_id": token_id} for token_id in batch]
+        return self.http.post(
+            self.url,
+            payload=payload,
+            timeout=(self.http.timeout[0], self.batch_timeout),
+            retries=self.retries,
+        )
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import json
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # 無ければ標準の json を使う
+    orjson = None
+
+
+def loads(data: str | bytes) -> Any:
+    """orjson があればそちらでパースする（API応答・outcomes 等の文字列化されたJSON用）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+@dataclass(slots=True)
+class Market:
+    market_id: int
+    condition_id: str
+    question: str
+    token_name: list[str]
+    token_price: list[float]
+    token_ids: list[str]
+    end_date: str
+    volume: float = 0.0
+    description: str | None = None
+    # 候補の事前順位付け（ranking.py）に使う
+    volume_24hr: float = 0.0
+    liquidity: float = 0.0
+    spread: float | None = None
+    price_change_1d: float = 0.0
+
+    @classmethod
+    def from_gamma(cls, market: dict[str, Any]) -> Market | None:
+        """Gamma の生データから作る。outcomes / outcomePrices / clobTokenIds が無ければ None"""
+        token_name = market.get("outcomes")
+        token_price = market.get("outcomePrices")
+        token_ids = market.get("clobTokenIds")
+        if token_name is None or token_price is None or token_ids is None:
+            return None
+        return cls(
+            market_id=int(market.get("id")),
+            condition_id=f"{market.get('conditionId')}",
+            question=f"{market.get('question')}",
+            token_name=loads(token_name),
+            token_price=[float(p) for p in loads(token_price)],
+            token_ids=loads(token_ids),
+            end_date=f"{market.get('endDate')}",
+            volume=float(market.get("volume", 0)),
+            description=market.get("description"),
+            volume_24hr=float(market.get("volume24hr") or 0),
+            liquidity=float(market.get("liquidity") or 0),
+            spread=float(market["spread"]) if market.get("spread") is not None else None,
+            price_change_1d=float(market.get("oneDayPriceChange") or 0),
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass(slots=True)
+class Event:
+    event_id: int
+    title: str
+    description: str
+    liquidity: float
+    volume: float
+    markets: list[Market] = field(default_factory=list)
+
+    @classmethod
+    def from_gamma(cls, event: dict[str, Any], markets: list[Market]) -> Event:
+        return cls(
+            event_id=int(event.get("id")),
+            title=f"{event.get('title')}",
+            description=f" {event.get('description')}".strip(),
+            liquidity=float(event.get("liquidity", 0)),
+            volume=float(event.get("volume", 0)),
+            markets=markets,
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+from py_clob_client_v2 import OrderArgs, SignatureTypeV2
+from py_clob_client_v2.clob_types import CreateOrderOptions
+from py_clob_client_v2.exceptions import PolyException
+from py_clob_client_v2.order_builder.builder import ROUNDING_CONFIG, OrderBuilder
+from py_clob_client_v2.order_builder.constants import BUY, SELL
+from py_clob_client_v2.order_builder.helpers import round_normal
+from py_clob_client_v2.signer import Signer
+from py_clob_client_v2.utilities import is_tick_size_smaller, price_valid
+
+import config
+
+ORDER_SIGN_WORKERS = config.ORDER_SIGN_WORKERS
+ORDER_TEMPLATE_WORKERS = config.ORDER_TEMPLATE_WORKERS
+
+# 発注時に指定していた tick size（マーケットの最小値より細かければ ClobClient.create_order と同じく例外）
+DEFAULT_TICK_SIZE = "0.01"
+
+
+@dataclass(frozen=True)
+class OrderTemplate:
+    """トークンごとに発注前に決まっている値。アラート時は価格とサイズだけ埋めればよい"""
+    token_id: str
+    tick_size: str
+    neg_risk: bool
+    version: int
+    fee_rate_bps: int | None = None  # v1 注文のときだけ使う
+
+
+# ===== 署名用ワーカープロセス側 =====
+_builder: OrderBuilder | None = None
+
+
+def _init_signer(private_key: str, chain_id: int, signature_type: int, funder: str | None) -> None:
+    global _builder
+    _builder = OrderBuilder(
+        signer=Signer(private_key, chain_id),
+        signature_type=SignatureTypeV2(signature_type),
+        funder=funder,
+    )
+
+
+def _ready() -> bool:
+    return _builder is not None
+
+
+def _sign_order(template: OrderTemplate, price: float, size: float, side: str):
+    """ClobClient.create_order と同じ検証・丸めをして EIP-712 署名する（通信はしない）"""
+    tick_size = template.tick_size
+    if not price_valid(price, tick_size):
+        raise ValueError(f"invalid price ({price}), min: {tick_size} - max: {1 - float(tick_size)}")
+    order_args = OrderArgs(
+        token_id=template.token_id,
+        price=round_normal(price, ROUNDING_CONFIG[tick_size].price),
+        size=size,
+        side=BUY if side == "B" else SELL,
+    )
+    return _builder.build_order(
+        order_args,
+        CreateOrderOptions(tick_size=tick_size, neg_risk=template.neg_risk),
+        version=template.version,
+        fee_rate_bps=template.fee_rate_bps,
+    )
+
+
+class OrderPreparer:
+    """
+    監視中のトークン（上位流動性マーケット・保有ポジション）の注文テンプレートを先に作っておき、
+    署名はプロセスプールで行う。アラート時の発注スレッドはテンプレートに価格とサイズを入れて待つだけ
+    テンプレートに必要な tick size / neg risk / version は TRADE の ClobClient から取る（結果はクライアント側でもキャッシュされる）
+    """
+    def __init__(
+        self, tr: Any, signature_type: SignatureTypeV2, *, workers: int = ORDER_SIGN_WORKERS
+    ) -> None:
+        self.tr = tr
+        self._version: int | None = None
+        self._templates: dict[str, OrderTemplate] = {}
+        self._pending: set[str] = set()
+        self._lock = threading.Lock()
+        self._resolver = ThreadPoolExecutor(
+            max_workers=ORDER_TEMPLATE_WORKERS, thread_name_prefix="order-template"
+        )
+        # 発注スレッドやHTTPクライアントを抱えたまま fork しないよう spawn で起動する
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_signer,
+            initargs=(tr.private_key, tr.chain_id, int(signature_type), tr.funder),
+        )
+        self.workers = workers
+
+    def warm_up(self) -> None:
+        """ワーカープロセスを起動しきっておく（初回アラートで起動待ちをしない）"""
+        futures = [self._pool.submit(_ready) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def watch(self, token_ids: Iterable[str]) -> None:
+        """テンプレートが無いトークンをバックグラウンドで解決する"""
+        with self._lock:
+            new_ids = [
+                t for t in dict.fromkeys(token_ids) if t not in self._templates and t not in self._pending
+            ]
+            self._pending.update(new_ids)
+        for token_id in new_ids:
+            self._resolver.submit(self._resolve_quietly, token_id)
+
+    def retain(self, token_ids: Iterable[str]) -> None:
+        """監視対象から外れたトークンのテンプレートを捨てる"""
+        keep = set(token_ids)
+        with self._lock:
+            for token_id in [t for t in self._templates if t not in keep]:
+                del self._templates[token_id]
+
+    def template(self, token_id: str) -> OrderTemplate:
+        with self._lock:
+            template = self._templates.get(token_id)
+        if template is None:
+            # 監視外のトークン：その場で解決する（次回からはテンプレートを使う）
+            template = self._resolve(token_id)
+        return template
+
+    def sign(self, token_id: str, price: float, size: float, side: str):
+        return self._pool.submit(_sign_order, self.template(token_id), price, size, side).result()
+
+    def sign_many(self, orders: list[dict[str, Any]]) -> list[Any]:
+        """orders と同じ順に、署名済み注文か例外を返す"""
+        futures = []
+        for order in orders:
+            try:
+                template = self.template(order["token_id"])
+                futures.append(
+                    self._pool.submit(_sign_order, template, order["price"], order["size"], order["side"])
+                )
+            except Exception as exc:
+                futures.append(exc)
+        signed = []
+        for future in futures:
+            if isinstance(future, Exception):
+                signed.append(future)
+                continue
+            try:
+                signed.append(future.result())
+            except Exception as exc:
+                signed.append(exc)
+        return signed
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"templates": len(self._templates), "pending": len(self._pending)}
+
+    def close(self) -> None:
+        self._resolver.shutdown(wait=False, cancel_futures=True)
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def _resolve_quietly(self, token_id: str) -> None:
+        try:
+            self._resolve(token_id)
+        except Exception as exc:
+            print(f"order template for {token_id} could not be resolved: {exc}")
+        finally:
+            with self._lock:
+                self._pending.discard(token_id)
+
+    def _resolve(self, token_id: str) -> OrderTemplate:
+        """
+        ClobClient.create_order と同じ値を決める（v3 は neg_risk を使わず、手数料は v1 だけ）
+        問い合わせは TRADE.get（共有 HttpClient）で送り、ホストごとのレート制限に従う。APIキーは要らない
+        """
+        base = self.tr.clob_api_base
+        params = {"token_id": token_id}
+        if self._version is None:
+            self._version = self._get_version()
+        version = self._version
+        min_tick_size = str(self.tr.get(f"{base}/tick-size", params=params)["minimum_tick_size"])
+        if is_tick_size_smaller(DEFAULT_TICK_SIZE, min_tick_size):
+            raise PolyException(
+                f"invalid tick size ({DEFAULT_TICK_SIZE}), minimum for the market is {min_tick_size}"
+            )
+        neg_risk = False if version == 3 else bool(self.tr.get(f"{base}/neg-risk", params=params)["neg_risk"])
+        fee_rate_bps = None
+        if version == 1:
+            fee_rate_bps = self.tr.get(f"{base}/fee-rate", params=params).get("base_fee") or 0
+        template = OrderTemplate(
+            token_id=token_id,
+            tick_size=DEFAULT_TICK_SIZE,
+            neg_risk=neg_risk,
+            version=version,
+            fee_rate_bps=fee_rate_bps,
+        )
+        with self._lock:
+            self._templates[token_id] = template
+        return template
+
+    def _get_version(self) -> int:
+        # ClobClient.get_version と同じく、取れなければ2
+        try:
+            result = self.tr.get(f"{self.tr.clob_api_base}/version")
+        except Exception:
+            return 2
+        return result.get("version", 2) if isinstance(result, dict) else 2
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+import config
+
+POSITION_PAGE_SIZE = config.POSITION_PAGE_SIZE
+POSITION_REFRESH_SECONDS = config.POSITION_REFRESH_SECONDS
+LLM_PROMPT_PRICE_DIGITS = config.LLM_PROMPT_PRICE_DIGITS
+
+# get(url, params=...) -> JSON
+JsonGetter = Callable[..., Any]
+
+
+@dataclass(slots=True)
+class Position:
+    condition_id: str
+    title: str
+    token_name: str
+    token_id: str
+    size: float
+    price: float
+    avr_price: float
+    current_value: float
+
+    @property
+    def delta(self) -> float:
+        """含み損益 [USD]"""
+        return self.current_value - self.size * self.avr_price
+
+    @property
+    def quoted_price(self) -> float:
+        """プロンプトに載せる現在価格（LLM_PROMPT_PRICE_DIGITS 桁に丸める）"""
+        return round(self.price, LLM_PROMPT_PRICE_DIGITS)
+
+    @property
+    def quoted_delta(self) -> float:
+        """丸めた現在価格で計算した含み損益 [USD]（セント単位）"""
+        return round(self.size * (self.quoted_price - self.avr_price), 2)
+
+    @property
+    def text(self) -> str:
+        """
+        LLMのプロンプトに入れる保有状況の説明（使う時だけ作る）
+        価格と金額は丸めて載せ、細かな値動きだけではプロンプト（＝LLMキャッシュのキー）が変わらないようにする
+        """
+        price = self.quoted_price
+        lines = []
+        lines.append(f"タイトル: {self.title}")
+        lines.append(f"あなたの所持トークン: {self.token_name}")
+        lines.append(f"あなたのトークン保有数: {self.size}")
+        lines.append(f"あなたのトークン購入時の平均買値(単価): ${round(self.avr_price, 4)}")
+        lines.append(f"現在のトークン価値(単価): ${price}")
+        lines.append(f"あなたがトークン購入に費やした総額: ${round(self.size * self.avr_price, 2)}")
+        lines.append(f"今このトークンをすべて売却すると得られるお金: ${round(self.size * price, 2)}")
+        lines.append(f"予想が当たった時、このトークンと交換できるお金: ${self.size * 1.0}")
+        return "\n".join(lines)
+
+    @classmethod
+    def from_data_api(cls, dat: dict[str, Any]) -> Position | None:
+        """Data API /positions の1件から作る。保有数が0のもの（償還済み等）は None"""
+        size = float(dat["size"])
+        if size <= 0:
+            return None
+        current_value = float(dat["currentValue"])
+        return cls(
+            condition_id=dat["conditionId"],
+            title=f"{dat.get('title')}",
+            token_name=dat["outcome"],
+            token_id=dat["asset"],
+            size=size,
+            price=current_value / size,
+            avr_price=float(dat["avgPrice"]),
+            current_value=current_value,
+        )
+
+
+@dataclass
+class PositionDelta:
+    added: list[Position] = field(default_factory=list)
+    removed: list[Position] = field(default_factory=list)
+    resized: list[Position] = field(default_factory=list)
+    fetched: bool = False  # 今回 /positions を取りに行ったか
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.resized)
+
+
+class PositionService:
+    """
+    Data API /positions をページ送りで全件取り、前回のスナップショットとの差分（追加・解消・保有数の変化）を返す
+    refresh_seconds 以内なら取り直さずに前回のスナップショットを使う（価格のtickより遅い周期で十分）
+    """
+    def __init__(
+        self,
+        get: JsonGetter,
+        data_api_base: str,
+        user: str,
+        *,
+        page_size: int = POSITION_PAGE_SIZE,
+        refresh_seconds: float = POSITION_REFRESH_SECONDS,
+    ) -> None:
+        self.get = get
+        self.url = f"{data_api_base}/positions"
+        self.user = user
+        self.page_size = page_size
+        self.refresh_seconds = refresh_seconds
+        self.positions: list[Position] = []
+        self.fetched_at: float | None = None
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False) -> PositionDelta:
+        with self._lock:
+            now = time.monotonic()
+            if not force and self.fetched_at is not None and now - self.fetched_at < self.refresh_seconds:
+                return PositionDelta()
+            current = self._fetch_all()
+            delta = PositionDelta(fetched=True)
+            previous = {position.token_id: position for position in self.positions}
+            latest = {position.token_id: position for position in current}
+            for token_id, position in latest.items():
+                old = previous.get(token_id)
+                if old is None:
+                    delta.added.append(position)
+                elif old.size != position.size:
+                    delta.resized.append(position)
+            delta.removed = [position for token_id, position in previous.items() if token_id not in latest]
+            self.positions = current
+            self.fetched_at = now
+            return delta
+
+    def invalidate(self) -> None:
+        """発注した後など、次の refresh() で必ず取り直す"""
+        with self._lock:
+            self.fetched_at = None
+
+    def _fetch_all(self) -> list[Position]:
+        positions = []
+        offset = 0
+        while True:
+            params = {"user": self.user, "limit": self.page_size, "offset": offset}
+            page = self.get(self.url, params=params)
+            self.requests += 1
+            for dat in page:
+                position = Position.from_data_api(dat)
+                if position is not None:
+                    positions.append(position)
+            if len(page) < self.page_size:
+                return positions
+            offset += self.page_size
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+from typing import Iterable
+
+import numpy as np
+
+import config
+
+PRICE_HISTORY_WINDOW = config.PRICE_HISTORY_WINDOW
+
+
+class RollingPriceStore:
+    """
+    トークンごとの直近W件の価格を保持するリングバッファ
+    1トークン = 1行 (capacity x W の行列) で、token_id -> 行番号 の索引を持つ
+    """
+    def __init__(self, window: int = PRICE_HISTORY_WINDOW, capacity: int = 1024) -> None:
+        if window < 2:
+            raise ValueError("window must be at least 2")
+        self.window = window
+        self.prices = np.full((capacity, window), np.nan, dtype=np.float64)
+        self.heads = np.zeros(capacity, dtype=np.int64)   # 次に書き込む列
+        self.counts = np.zeros(capacity, dtype=np.int64)  # 保持している件数
+        self.index: dict[str, int] = {}
+        self._free_rows: list[int] = []
+        self._next_row = 0
+        # 毎tick同じトークン列が来るので、直前の行番号配列を使い回す
+        self._cached_ids: list[str] = []
+        self._cached_rows = np.zeros(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, token_id: str) -> bool:
+        return token_id in self.index
+
+    def rows_for(self, token_ids: list[str]) -> np.ndarray:
+        if token_ids == self._cached_ids:
+            return self._cached_rows
+        rows = np.asarray([self._row(token_id) for token_id in token_ids], dtype=np.int64)
+        self._cached_ids = list(token_ids)
+        self._cached_rows = rows
+        return rows
+
+    def append(self, token_ids: list[str], prices: np.ndarray) -> np.ndarray:
+        """
+        1tick分の価格をまとめて追加する。価格が無い(NaN)・0以下のトークンは履歴をリセット
+        戻り値は token_ids に対応する行番号
+        """
+        rows = self.rows_for(token_ids)
+        prices = np.asarray(prices, dtype=np.float64)
+        valid = np.isfinite(prices) & (prices > 0)
+
+        self.reset_rows(rows[~valid])
+
+        rows_ok = rows[valid]
+        heads = self.heads[rows_ok]
+        self.prices[rows_ok, heads] = prices[valid]
+        self.heads[rows_ok] = (heads + 1) % self.window
+        self.counts[rows_ok] = np.minimum(self.counts[rows_ok] + 1, self.window)
+        return rows
+
+    def last(self, rows: np.ndarray, n: int) -> np.ndarray:
+        """
+        各行の直近n件を古い順に並べた (len(rows), n) 行列。足りない部分はNaN
+        """
+        if n > self.window:
+            raise ValueError(f"only {self.window} prices are kept per token")
+        offsets = np.arange(n - 1, -1, -1)
+        cols = (self.heads[rows][:, None] - 1 - offsets[None, :]) % self.window
+        window = self.prices[rows[:, None], cols]
+        missing = offsets[None, :] >= self.counts[rows][:, None]
+        window[missing] = np.nan
+        return window
+
+    def consecutive_changes(self, rows: np.ndarray, steps: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        直近 steps+1 件の価格と、steps 回分の変化率を返す
+        履歴が足りない行の変化率はNaN（閾値比較は常にFalseになる）
+        """
+        window = self.last(rows, steps + 1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rates = np.diff(window, axis=1) / window[:, :-1]
+        return window, rates
+
+    def reset_rows(self, rows: np.ndarray) -> None:
+        self.counts[rows] = 0
+        self.heads[rows] = 0
+        self.prices[rows] = np.nan
+
+    def reset(self, token_ids: Iterable[str]) -> None:
+        rows = [self.index[token_id] for token_id in token_ids if token_id in self.index]
+        self.reset_rows(np.asarray(rows, dtype=np.int64))
+
+    def evict(self, token_ids: Iterable[str]) -> None:
+        for token_id in token_ids:
+            row = self.index.pop(token_id, None)
+            if row is None:
+                continue
+            self.reset_rows(np.asarray([row], dtype=np.int64))
+            self._free_rows.append(row)
+            self._cached_ids = []
+
+    def retain(self, token_ids: set[str]) -> None:
+        self.evict([token_id for token_id in self.index if token_id not in token_ids])
+
+    def _row(self, token_id: str) -> int:
+        row = self.index.get(token_id)
+        if row is not None:
+            return row
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            if self._next_row >= len(self.counts):
+                self._grow()
+            row = self._next_row
+            self._next_row += 1
+        self.index[token_id] = row
+        return row
+
+    def _grow(self) -> None:
+        capacity = len(self.counts) * 2
+        prices = np.full((capacity, self.window), np.nan, dtype=np.float64)
+        prices[: len(self.prices)] = self.prices
+        self.prices = prices
+        self.heads = np.concatenate([self.heads, np.zeros_like(self.heads)])
+        self.counts = np.concatenate([self.counts, np.zeros_like(self.counts)])
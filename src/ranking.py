@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import math
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+import config
+from models import Event, Market
+
+STEP2_TOP_K = config.STEP2_TOP_K
+STEP2_LIST_TOKEN_BUDGET = config.STEP2_LIST_TOKEN_BUDGET
+RANKING_WEIGHTS = config.RANKING_WEIGHTS
+RANKING_HORIZON_DAYS = config.RANKING_HORIZON_DAYS
+RANKING_MAX_SPREAD = config.RANKING_MAX_SPREAD
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    プロンプトのトークン数のざっくりした見積もり（tokenizer を読み込まずに数える）
+    英数字・記号は4文字で1トークン、日本語などの全角文字は1文字1トークンとして数え、少し多めに見積もる
+    """
+    ascii_chars = 0
+    wide_chars = 0
+    for ch in text:
+        if ord(ch) < 128:
+            ascii_chars += 1
+        elif unicodedata.east_asian_width(ch) in ("W", "F"):
+            wide_chars += 1
+        else:
+            ascii_chars += 2
+    return math.ceil(ascii_chars / 4 + wide_chars)
+
+
+@dataclass(slots=True)
+class ScoredMarket:
+    score: float
+    event: Event
+    market: Market
+
+
+def score_markets(events: list[Event], now: datetime | None = None) -> list[ScoredMarket]:
+    """
+    候補マーケットに点数を付けて高い順に並べる（同点は market_id の小さい順で、同じ入力なら同じ順位）
+        volume      直近24時間の出来高（候補の中の最大値で割った対数）
+        time_to_end 終了が近いほど高い（RANKING_HORIZON_DAYS 以降は0）
+        uncertainty Yes の価格が 0.5 に近いほど高い
+        momentum    直近1日の価格変化の大きさ
+        spread      板のスプレッドが狭いほど高い（不明なら0.5）
+    """
+    now = now or datetime.now(timezone.utc)
+    pairs = [(event, market) for event in events for market in event.markets]
+    max_volume = max((math.log1p(market.volume_24hr) for _, market in pairs), default=0.0) or 1.0
+    max_move = max((abs(market.price_change_1d) for _, market in pairs), default=0.0) or 1.0
+    weights = RANKING_WEIGHTS
+
+    scored = []
+    for event, market in pairs:
+        features = {
+            "volume": math.log1p(market.volume_24hr) / max_volume,
+            "time_to_end": _time_to_end(market.end_date, now),
+            "uncertainty": 1.0 - 2.0 * abs(market.token_price[0] - 0.5),
+            "momentum": abs(market.price_change_1d) / max_move,
+            "spread": 0.5 if market.spread is None else 1.0 - min(market.spread / RANKING_MAX_SPREAD, 1.0),
+        }
+        score = sum(weights.get(name, 0.0) * value for name, value in features.items())
+        scored.append(ScoredMarket(score, event, market))
+    scored.sort(key=lambda item: (-item.score, item.market.market_id))
+    return scored
+
+
+def shortlist(
+    events: list[Event],
+    render: Callable[[Market], str],
+    *,
+    top_k: int = STEP2_TOP_K,
+    token_budget: int = STEP2_LIST_TOKEN_BUDGET,
+) -> list[Event]:
+    """
+    点数の高い順に、top_k 件かつ render(market) のトークン数の合計が token_budget に収まるところまで残す
+    戻り値はイベントごとにまとめ直したもの（一番良いマーケットの順位の順）
+    """
+    kept: dict[int, Event] = {}
+    used = 0
+    count = 0
+    for item in score_markets(events):
+        if count >= top_k:
+            break
+        cost = estimate_tokens(render(item.market))
+        if used + cost > token_budget:
+            continue  # 長いものは飛ばして、短いものが入るなら入れる
+        used += cost
+        count += 1
+        event = kept.get(item.event.event_id)
+        if event is None:
+            event = kept[item.event.event_id] = Event(
+                event_id=item.event.event_id,
+                title=item.event.title,
+                description=item.event.description,
+                liquidity=item.event.liquidity,
+                volume=item.event.volume,
+                markets=[],
+            )
+        event.markets.append(item.market)
+    return list(kept.values())
+
+
+def _time_to_end(end_date: str, now: datetime) -> float:
+    try:
+        end = datetime.fromisoformat(end_date)
+    except ValueError:
+        return 0.0
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    days = (end - now).total_seconds() / 86400
+    return max(0.0, 1.0 - days / RANKING_HORIZON_DAYS)
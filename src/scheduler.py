@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import math
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator
+
+
+@dataclass
+class PhaseStats:
+    count: int = 0
+    last: float = 0.0
+    total: float = 0.0
+    max: float = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.last = seconds
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class TickScheduler:
+    """
+    壁時計の interval 秒境界に揃えて tick を実行するスケジューラ
+    sleep(interval) と違い処理時間ぶんずれていかない。処理が次の締切を越えた場合は
+    overruns を数え、間に合わなかった tick は詰めて実行せずに skipped_ticks として数える
+    """
+    def __init__(self, interval: float, *, align: bool = True, report_every: int = 10) -> None:
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.interval = interval
+        self.align = align
+        self.report_every = report_every
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped_ticks = 0
+        self.max_lateness = 0.0
+        self.phases: dict[str, PhaseStats] = {}
+
+    def run(self, work: Callable[[int], None], *, max_ticks: int | None = None) -> None:
+        deadline = self._first_deadline(time.time())
+        while max_ticks is None or self.ticks < max_ticks:
+            delay = deadline - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self.max_lateness = max(self.max_lateness, time.time() - deadline)
+
+            self.ticks += 1
+            with self.phase("tick"):
+                work(self.ticks)
+            deadline = self._next_deadline(deadline, time.time())
+
+            if self.report_every and self.ticks % self.report_every == 0:
+                print(self.report())
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.setdefault(name, PhaseStats()).add(time.perf_counter() - started)
+
+    def report(self) -> str:
+        phases = " ".join(
+            f"{name}={stats.last:.2f}s(avg {stats.mean:.2f}s, max {stats.max:.2f}s)"
+            for name, stats in self.phases.items()
+        )
+        return (
+            f"ticks={self.ticks} overruns={self.overruns} skipped={self.skipped_ticks} "
+            f"max_lateness={self.max_lateness:.3f}s {phases}"
+        )
+
+    def _first_deadline(self, now: float) -> float:
+        if not self.align:
+            return now
+        return math.ceil(now / self.interval) * self.interval
+
+    def _next_deadline(self, deadline: float, now: float) -> float:
+        next_deadline = deadline + self.interval
+        if now > next_deadline:
+            missed = math.floor((now - next_deadline) / self.interval) + 1
+            self.overruns += 1
+            self.skipped_ticks += missed
+            next_deadline += missed * self.interval
+        return next_deadline
@@ -1,27 +1,32 @@
 from trade import TRADE
-from agent import Agent
+from agent import Agent, position_review_key
 import config
 from pathlib import Path
-import os
 import json
-from datetime import datetime, timezone
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from zoneinfo import ZoneInfo
+from metrics import StageTimer
 
 def summarize_event_and_market(marketdata):
+    if marketdata is None:
+        return None, None  # 見つからなかった場合
     try:
-        marketdata = json.loads(marketdata)[0]
-        print(marketdata)
         lines = []
         token_info = []
-        lines.append(f"予測テーマ: {marketdata['question']}")
-        lines.append(f"詳細：{marketdata['description']}")
-        lines.append(f"終了日: {marketdata['end_date']}")
-        for i in range(len(marketdata['token_name'])):
-            lines.append(f" トークン「{marketdata['token_name'][i]}」の価格：{marketdata['token_price'][i]}")
+        lines.append(f"予測テーマ: {marketdata.question}")
+        lines.append(f"詳細：{marketdata.description}")
+        lines.append(f"終了日: {marketdata.end_date}")
+        for i in range(len(marketdata.token_name)):
+            # 価格は丸めて載せる（細かな値動きでLLMキャッシュのキーが変わらないように）
+            price = round(marketdata.token_price[i], config.LLM_PROMPT_PRICE_DIGITS)
+            lines.append(f" トークン「{marketdata.token_name[i]}」の価格：{price}")
             token_info.append({
-                'token_name': marketdata['token_name'][i],
-                'token_id': marketdata['token_ids'][i],
-                'token_price': marketdata['token_price'][i]
+                'token_name': marketdata.token_name[i],
+                'token_id': marketdata.token_ids[i],
+                'token_price': marketdata.token_price[i]
             })
         market_detail_text = "\n".join(lines)
         return market_detail_text, token_info
@@ -29,9 +34,9 @@ def summarize_event_and_market(marketdata):
         return None, None  # 見つからなかった場合
 
 def judge_rulebase(stat):
-    delta_rate = stat["delta"]/stat["size"]/stat["avr_price"]
+    delta_rate = stat.delta/stat.size/stat.avr_price
     # ほぼ当たりなら、さっさと売る
-    if stat["price"] > 0.95:
+    if stat.price > 0.95:
         return "機械判断：売却 価格0.95以上"
     if delta_rate > 3.0:
         return "機械判断：売却 価格3倍以上"
@@ -40,47 +45,37 @@ def judge_rulebase(stat):
     return "LLMに任せる"
 
 
-def main():
-    tr = TRADE()
-    ag = Agent()
-    now_date = datetime.now().strftime("%Y/%m/%d")
-    self_status = tr.get_self_status()
-
-    for stat in self_status:
-        full_log = {}
-        ## STEP 1: 現在の購入済トークンの状態を確認
-        market_data = tr.get_market_by_conditionid(stat["condition_id"])
-        market_detail, _ = summarize_event_and_market(market_data)
-        full_log["STEP1"] = {}
-        full_log["STEP1"]["stat"] = f"{stat}"
-        full_log["STEP1"]["market_data"] = f"{market_data}"
+SELL_REVIEW_MODE = config.SELL_REVIEW_MODE
+SELL_REVIEW_BATCH_SIZE = config.SELL_REVIEW_BATCH_SIZE
+SELL_REVIEW_JOB_FILE = Path(config.SELL_REVIEW_JOB_FILE)
+SELL_PIPELINE_WORKERS = config.SELL_PIPELINE_WORKERS
+SELL_FETCH_CONCURRENCY = config.SELL_FETCH_CONCURRENCY
+SELL_CHART_CONCURRENCY = config.SELL_CHART_CONCURRENCY
+SELL_DECIDE_CONCURRENCY = config.SELL_DECIDE_CONCURRENCY
 
-        ## STEP 2: トークンの売却維持判断を機械で
-        judge_rulebase_result = judge_rulebase(stat)
-        full_log["STEP2"] = judge_rulebase_result
-        if "LLM" in judge_rulebase_result:
-            ## STEP 3: トークンのHistoryを取得
-            img_path, img_base64 = tr.get_market_history_img(market_id="", condition_id=stat['condition_id'])
-            full_log["STEP3"] = str(img_path)
-            if stat['delta'] < 0:
-                status_text = f"""現在このマーケットでは、あなたの購入したトークンに{float(stat['delta'])}ドルの損失が出ています。
+def status_text_for(stat):
+    if stat.delta < 0:
+        status_text = f"""現在このマーケットでは、あなたの購入したトークンに{stat.quoted_delta}ドルの損失が出ています。
                 現在日付とマーケット終了日、今後トークン価値が上がりそうか総合的に考えて、このトークンを維持または売却を判断してください。
                 <判断のポイント>
                 - 一般的知見から推測される確率（価格）対して、市場に歪みがあると感じる場合は維持する
                 - 価格が減少傾向にあり、逆転の可能性に乏しい場合は売却する
                 回答は「維持」または「売却」のどちらか一言を回答してください。
                 """
-            else:
-                status_text = f"""現在このマーケットでは、あなたの購入したトークンに{float(stat['delta'])}ドルの利益が出ています。
+    else:
+        status_text = f"""現在このマーケットでは、あなたの購入したトークンに{stat.quoted_delta}ドルの利益が出ています。
                 現在日付とマーケット終了日、最終的な予測が外れるリスクがあるかなど総合的に考えて、このトークンを維持または売却を判断してください。
                 <判断のポイント>
                 - 一般的知見から推測される確率（価格）対して、市場に歪みがあると感じる場合は売却する
                 - 今後、価格が大きく揺れ動きそうなケースでは売却する
                 - 価格が安定している場合は維持する
                 回答は「維持」または「売却」のどちらか一言を回答してください。"""
-        
-            ## STEP 4: トークンの売却維持判断
-            prompt = f"""
+    return status_text
+
+def position_prompt(stat, market_detail, now_date):
+    """STEP 4: 1ポジション分の売却維持判断のプロンプト"""
+    status_text = status_text_for(stat)
+    prompt = f"""
                 # 背景
                 あなたは予測市場「Polymarket」に参加するトレーダーAIである。
                 目的は 将来の事象の結果を確率的に予測し、期待値最大化となる取引判断を行うこと である。
@@ -104,56 +99,323 @@ def main():
                 {market_detail}
 
                 # あなたの購入済トークンについて
-                {stat["text"]}
+                {stat.text}
         """
+    return prompt
 
-            llm_opinion = ag.get_LLM_opiniton(prompt=prompt, image_base64=img_base64)
-            full_log["STEP4"] = {}
-            full_log["STEP4"]["prompt"] = f"{prompt}"
-            full_log["STEP4"]["response"] = f"{llm_opinion}"
-        else:
-            llm_opinion = judge_rulebase_result
+def review_prompt(items, now_date):
+    """
+    STEP 4（一括）: 複数ポジションの売却維持判断をまとめて聞くプロンプト
+    items: [(stat, market_detail)]
+    """
+    lines = []
+    for stat, market_detail in items:
+        pnl = "損失" if stat.delta < 0 else "利益"
+        lines.append(f"■ condition_id: {stat.condition_id} / outcome: {stat.token_name}")
+        lines.append(f"現在、このトークンには{abs(stat.quoted_delta)}ドルの{pnl}が出ています。")
+        lines.append(f"{market_detail}")
+        lines.append(f"{stat.text}")
+        lines.append("---------")
+    positions_text = "\n".join(lines)
+    prompt = f"""
+        # 背景
+        あなたは予測市場「Polymarket」に参加するトレーダーAIである。
+        目的は 将来の事象の結果を確率的に予測し、期待値最大化となる取引判断を行うこと である。
+        娯楽目的ではなく、合理的・確率論的・経済合理性に基づいて行動せよ。
+        <Polymarketの基本構造>
+        各マーケットは「はい（YES）」か「いいえ（NO）」で決着する二値事象である。
+        YESとNOはそれぞれトークンとして取引され、価格は 0.00〜1.00 USD の範囲で推移する。
+        価格は市場参加者の期待確率を反映している（例：YESが0.72 → 市場は72%の確率で起こると見ている）。
+        決着時：
+        事象が起きた場合、YESトークンは1.00 USD、NOは0.00 USDになる。
+        起きなかった場合は逆。
+
+        # 現在の日付
+        {now_date}
+
+        # 指示
+        以下は、あなたが過去に注文したマーケットの詳細と、あなたの購入したトークンに関する情報です。
+        現在日付とマーケット終了日、今後のトークン価値の見通しを総合的に考えて、すべてのポジションについて condition_id と outcome の組ごとに「維持」または「売却」を判断し、理由を一文で添えてください。
+        <判断のポイント>
+        - 損失が出ている場合: 一般的知見から推測される確率（価格）に対して、市場に歪みがあると感じる場合は維持する。価格が減少傾向にあり、逆転の可能性に乏しい場合は売却する
+        - 利益が出ている場合: 市場に歪みがあると感じる場合や、今後価格が大きく揺れ動きそうな場合は売却する。価格が安定している場合は維持する
+
+        # あなたの保有ポジション
+        {positions_text}
+    """
+    return prompt
+
+def log_path_for(stat):
+    now = datetime.now(ZoneInfo("Asia/Tokyo"))
+    date_str = now.strftime("%Y%m%d")
+    time_str = now.strftime("%H%M%S")
+
+    # 日付ディレクトリ作成
+    log_dir = Path("full_logs") / date_str
+    log_dir.mkdir(parents=True, exist_ok=True)
+
+    # ファイルパス生成
+    # 同じマーケットの両方のアウトカムを持っていても別のファイルにする
+    return log_dir / f"{time_str}_{stat.condition_id}_{stat.token_name}.json"
+
+def write_full_log(log_path, full_log):
+    with open(log_path, "w", encoding="utf-8") as f:
+        json.dump(full_log, f, ensure_ascii=False, indent=2)
+
+def stage_limits():
+    """ステージごとの同時実行数の上限"""
+    return {
+        "fetch": threading.BoundedSemaphore(SELL_FETCH_CONCURRENCY),
+        "chart": threading.BoundedSemaphore(SELL_CHART_CONCURRENCY),
+        "decide": threading.BoundedSemaphore(SELL_DECIDE_CONCURRENCY),
+    }
+
+def evaluate_position(tr, ag, stat, now_date, timer, limits, ask_llm=True):
+    """
+    1ポジション分の STEP 1〜4（fetch → screen → chart → decide）。発注はしない
+    ポジション毎にスレッドで呼ばれ、各ステージの同時実行数は limits で抑える（待ち時間は timer に入れない）
+    戻り値: (stat, full_log, market_detail, 判断)。ask_llm=False でLLMに任せるものは判断が None
+    """
+    full_log = {}
+    ## STEP 1: 現在の購入済トークンの状態を確認
+    with limits["fetch"], timer.stage("fetch"):
+        market_data = tr.get_market_by_conditionid(stat.condition_id)
+    market_detail, _ = summarize_event_and_market(market_data)
+    full_log["STEP1"] = {}
+    full_log["STEP1"]["stat"] = f"{stat}"
+    full_log["STEP1"]["market_data"] = market_data.to_dict() if market_data else None
+
+    ## STEP 2: トークンの売却維持判断を機械で
+    with timer.stage("screen"):
+        judge_rulebase_result = judge_rulebase(stat)
+    full_log["STEP2"] = judge_rulebase_result
+    if "LLM" not in judge_rulebase_result:
+        full_log["STEP3"] = None
+        full_log["STEP4"] = None
+        return stat, full_log, market_detail, judge_rulebase_result
+    if not ask_llm:
+        return stat, full_log, market_detail, None
+
+    ## STEP 3: トークンのHistoryを取得（描画は ChartService のプロセスプール）
+    with limits["chart"], timer.stage("chart"):
+        img_path, img_base64 = tr.get_market_history_img(market_id="", condition_id=stat.condition_id)
+    full_log["STEP3"] = str(img_path)
+
+    ## STEP 4: トークンの売却維持判断
+    prompt = position_prompt(stat, market_detail, now_date)
+    with limits["decide"], timer.stage("decide"):
+        llm_opinion = ag.get_LLM_opiniton(prompt=prompt, image_base64=img_base64)
+    if llm_opinion is None:
+        llm_opinion = "維持（判断なし）"  # 応答が無ければ売らない（一括判断には回さない）
+    full_log["STEP4"] = {}
+    full_log["STEP4"]["prompt"] = f"{prompt}"
+    full_log["STEP4"]["response"] = f"{llm_opinion}"
+    return stat, full_log, market_detail, llm_opinion
+
+def review_in_batches(ag, reviews, now_date):
+    """
+    STEP 4（一括）: SELL_REVIEW_BATCH_SIZE 件ずつまとめて判断させる（チャートは使わない）
+    呼び出しに失敗したまとまりは opinions に入れない（維持になり、機械判断の売却はそのまま発注する）
+    """
+    opinions = {}
+    for start in range(0, len(reviews), SELL_REVIEW_BATCH_SIZE):
+        chunk = reviews[start : start + SELL_REVIEW_BATCH_SIZE]
+        prompt = review_prompt([(stat, market_detail) for stat, _, market_detail in chunk], now_date)
+        try:
+            verdicts = ag.review_positions(prompt)
+        except Exception as exc:
+            print(f"position review failed for {len(chunk)} positions: {exc!r}")
+            for stat, full_log, _ in chunk:
+                full_log["STEP3"] = None
+                full_log["STEP4"] = {"mode": "batch", "prompt": prompt, "error": repr(exc)}
+            continue
+        for stat, full_log, _ in chunk:
+            verdict = verdicts.get(review_key(stat))
+            opinions[stat.token_id] = _verdict_text(verdict)
             full_log["STEP3"] = None
-            full_log["STEP4"] = None
+            full_log["STEP4"] = {"mode": "batch", "prompt": prompt, "response": verdict}
+    return opinions
 
-        # ===== full_log 保存（日付フォルダ分割） =====
-        now = datetime.now(ZoneInfo("Asia/Tokyo"))
-        date_str = now.strftime("%Y%m%d")
-        time_str = now.strftime("%H%M%S")
+def review_with_bulk_job(ag, reviews, now_date):
+    """
+    STEP 4（Batch API）: 前回投げたバッチが終わっていればその判断を受け取り、同じ実行で今回の分を投げる
+    前回のバッチがまだ終わっていなければ、重ねて投げずに次回の実行を待つ
+    SELL_REVIEW_JOB_WAIT_SECONDS が0より大きければ今回投げた分の結果も待ち、終わればそちらを使う
+    判断がまだ無いポジションは今回は維持する。API呼び出しの失敗も維持にして、エラーを full_log に残す
+    """
+    opinions = {}
+    verdicts = {}
+    error = None
+    job = json.loads(SELL_REVIEW_JOB_FILE.read_text(encoding="utf-8")) if SELL_REVIEW_JOB_FILE.exists() else None
+    if job is not None:
+        try:
+            collected = _collect_bulk_job(ag, job, 0)
+        except Exception as exc:
+            # 通信エラー等ではジョブファイルを残し、次回の実行でもう一度取りに行く
+            print(f"position review batch {job['batch_id']} could not be checked: {exc!r}")
+            error = repr(exc)
+            collected = None
+        if collected is not None:
+            verdicts.update(collected)
+            job = None
+    if job is None and reviews:
+        prompts = {}
+        for start in range(0, len(reviews), SELL_REVIEW_BATCH_SIZE):
+            chunk = reviews[start : start + SELL_REVIEW_BATCH_SIZE]
+            prompts[f"review-{start}"] = review_prompt(
+                [(stat, market_detail) for stat, _, market_detail in chunk], now_date
+            )
+        try:
+            job = {"batch_id": ag.submit_position_reviews(prompts), "submitted_at": time.time()}
+        except Exception as exc:
+            print(f"position review batch could not be submitted: {exc!r}")
+            error = repr(exc)
+        else:
+            SELL_REVIEW_JOB_FILE.write_text(json.dumps(job), encoding="utf-8")
+            print(f"position review batch submitted: {job['batch_id']}")
+            if config.SELL_REVIEW_JOB_WAIT_SECONDS > 0:
+                try:
+                    verdicts.update(_collect_bulk_job(ag, job, config.SELL_REVIEW_JOB_WAIT_SECONDS) or {})
+                except Exception as exc:
+                    print(f"position review batch {job['batch_id']} could not be checked: {exc!r}")
+                    error = repr(exc)
+
+    for stat, full_log, _ in reviews:
+        verdict = verdicts.get(review_key(stat))
+        full_log["STEP3"] = None
+        full_log["STEP4"] = {"mode": "bulk_job", "batch_id": job and job["batch_id"], "response": verdict}
+        if verdict is None and error is not None:
+            full_log["STEP4"]["error"] = error
+            continue  # opinions に入れない（維持）
+        opinions[stat.token_id] = _verdict_text(verdict)
+    return opinions
 
-        # 日付ディレクトリ作成
-        log_dir = Path("full_logs") / date_str
-        log_dir.mkdir(parents=True, exist_ok=True)
+def _collect_bulk_job(ag, job, wait_seconds):
+    """
+    バッチの結果を wait_seconds 秒まで待って受け取る。まだ終わっていなければ None
+    受け取った・失敗したバッチはジョブファイルから消す（失敗した時は空の判断）
+    問い合わせ自体の失敗（通信エラー等）はそのまま投げる
+    """
+    deadline = time.monotonic() + wait_seconds
+    while True:
+        try:
+            verdicts = ag.collect_position_reviews(job["batch_id"])
+        except RuntimeError as exc:
+            print(f"position review batch failed: {exc}")
+            SELL_REVIEW_JOB_FILE.unlink(missing_ok=True)
+            return {}
+        if verdicts is not None:
+            SELL_REVIEW_JOB_FILE.unlink(missing_ok=True)
+            return verdicts
+        if time.monotonic() >= deadline:
+            print(f"position review batch {job['batch_id']} is still running")
+            return None
+        time.sleep(config.SELL_REVIEW_POLL_SECONDS)
 
-        # ファイルパス生成
-        log_path = log_dir / f"{time_str}_{stat['condition_id']}.json"
+def review_key(stat):
+    return position_review_key(stat.condition_id, stat.token_name)
 
+def _verdict_text(verdict):
+    # 理由の文中の「売却」で売らないように、判断だけを返す（返ってこなかったポジションは維持）
+    if not verdict:
+        return "維持（判断なし）"
+    return verdict["verdict"]
+
+def main():
+    tr = TRADE()
+    ag = Agent()
+    timer = StageTimer()
+    started = time.perf_counter()
+    now_date = datetime.now().strftime("%Y/%m/%d")
+    self_status = tr.get_self_status()
+    sell_orders = []
+    pending_logs = []  # 発注結果を書き込んでから保存する (stat, full_log, log_path)
+    decided = []  # (stat, full_log, 判断)
+    reviews = []  # まとめてLLMに判断させるもの (stat, full_log, market_detail)
+
+    ## STEP 1〜4: ポジション毎に fetch → screen → chart → decide を並行して進める
+    ask_llm = SELL_REVIEW_MODE not in ("batch", "bulk_job")
+    if ask_llm:
+        # 遅延生成のプロパティをスレッドから同時に作らないよう先に作っておく
+        tr.history_store
+        tr.charts
+    limits = stage_limits()
+    with ThreadPoolExecutor(max_workers=SELL_PIPELINE_WORKERS, thread_name_prefix="sell-position") as pool:
+        futures = [
+            pool.submit(evaluate_position, tr, ag, stat, now_date, timer, limits, ask_llm)
+            for stat in self_status
+        ]
+        for stat, future in zip(self_status, futures):
+            try:
+                stat, full_log, market_detail, opinion = future.result()
+            except Exception as exc:
+                print(f"{stat.condition_id} の判断に失敗しました。{exc!r}")
+                continue
+            if opinion is None:  # ask_llm=False の時だけ
+                reviews.append((stat, full_log, market_detail))
+            else:
+                decided.append((stat, full_log, opinion))
+
+    ## STEP 3, 4（一括）: 残りをまとめてLLMに判断させる
+    if reviews:
+        with timer.stage("decide"):
+            if SELL_REVIEW_MODE == "batch":
+                opinions = review_in_batches(ag, reviews, now_date)
+            elif SELL_REVIEW_MODE == "bulk_job":
+                opinions = review_with_bulk_job(ag, reviews, now_date)
+            else:
+                opinions = {}
+        decided += [
+            (stat, full_log, opinions.get(stat.token_id, "維持（判断なし）")) for stat, full_log, _ in reviews
+        ]
+
+    for stat, full_log, llm_opinion in decided:
+        # ===== full_log 保存（日付フォルダ分割） =====
+        log_path = log_path_for(stat)
 
         if "売却" in llm_opinion:
-            size = stat["size"]
-            token = stat["token_name"]
-            token_id = stat['token_id']
-            price = float(stat["price"]) * config.SELL_BUFFER_RATE
+            size = stat.size
+            token = stat.token_name
+            token_id = stat.token_id
+            price = float(stat.price) * config.SELL_BUFFER_RATE
             full_log["STEP5"] = {}
             full_log["STEP5"]["token"] = token
             full_log["STEP5"]["token_id"] = token_id
             full_log["STEP5"]["size"] = size
             full_log["STEP5"]["token_price"] = price
-            try:
-                tlog_path = tr.make_book_order(token_id, price, size, side="S")
-                print(f"トークンを価格{stat['price']}で、{stat['size']}個売却しました。")
-                print(f"Order response saved to: {tlog_path}")
-                full_log["STEP5"]["result"] = "成功"
-            except:
-                print(f"トークンを売却できませんでした。{log_path}を確認してください。")
-                full_log["STEP5"]["result"] = "失敗"
+            # 売却はループの後でまとめて発注する
+            sell_orders.append({"token_id": token_id, "price": price, "size": size, "side": "S"})
+            pending_logs.append((stat, full_log, log_path))
+            continue
         else:
             full_log["STEP5"] = None
             print("トークンを維持しました")
         # full_logを保存
-        with open(log_path, "w", encoding="utf-8") as f:
-            json.dump(full_log, f, ensure_ascii=False, indent=2)
-        
+        write_full_log(log_path, full_log)
+
+    ## STEP 5: 売却判断したトークンを一括で発注
+    if sell_orders:
+        try:
+            with timer.stage("execute"):
+                results, tlog_path = tr.make_book_orders(sell_orders)
+            print(f"Order response saved to: {tlog_path}")
+        except Exception as exc:
+            results = [{"success": False, "error": str(exc)} for _ in sell_orders]
+        for (stat, full_log, log_path), result in zip(pending_logs, results):
+            if result["success"]:
+                print(f"トークンを価格{stat.price}で、{stat.size}個売却しました。")
+                full_log["STEP5"]["result"] = "成功"
+            else:
+                print(f"トークンを売却できませんでした。{log_path}を確認してください。")
+                full_log["STEP5"]["result"] = "失敗"
+                full_log["STEP5"]["error"] = result.get("error")
+            write_full_log(log_path, full_log)
+
+    print(f"{len(self_status)} positions in {time.perf_counter() - started:.1f}s")
+    print(timer.report())
+    print(f"market cache: {tr.market_cache.stats()}")
+    if ag.cache is not None:
+        print(f"llm cache: {ag.cache.stats()}")
 
 if __name__=='__main__':
     main()
\ No newline at end of file
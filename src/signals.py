@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Iterable
+
+import numpy as np
+
+from price_store import RollingPriceStore
+
+
+@dataclass
+class Signal:
+    index: int          # update() に渡した token_ids 内の位置
+    token_id: str
+    rule: str
+    values: dict[str, Any] = field(default_factory=dict)
+
+
+class SignalRule(ABC):
+    """
+    シグナルルールの基底クラス
+    トークン毎の状態を行番号で引ける配列として持ち、1tickにつき O(1)/トークン で更新する
+    """
+    name = "rule"
+    lookback = 1  # リングバッファに必要な価格数
+
+    def __init__(self) -> None:
+        self.capacity = 0
+
+    def resize(self, capacity: int) -> None:
+        for attr, fill in self._state().items():
+            old = getattr(self, attr, None)
+            new = np.full(capacity, fill, dtype=np.float64)
+            if old is not None:
+                new[: len(old)] = old
+            setattr(self, attr, new)
+        self.capacity = capacity
+
+    def reset(self, rows: np.ndarray) -> None:
+        for attr, fill in self._state().items():
+            getattr(self, attr)[rows] = fill
+
+    @abstractmethod
+    def update(self, store: RollingPriceStore, rows: np.ndarray, prices: np.ndarray, prev: np.ndarray) -> np.ndarray:
+        """
+        rows の価格 prices (直前の価格は prev, 無ければNaN) で状態を更新し、発火した行のマスクを返す
+        """
+
+    def describe(self, store: RollingPriceStore, row: int) -> dict[str, Any]:
+        return {}
+
+    def _state(self) -> dict[str, float]:
+        """状態配列名 -> 初期値"""
+        return {}
+
+
+class ConsecutiveMoveRule(SignalRule):
+    """
+    steps 回連続で threshold 以上の変化（direction=1: 上昇 / -1: 下落）
+    """
+    def __init__(self, steps: int = 2, threshold: float = 0.1, direction: int = 1, name: str | None = None) -> None:
+        super().__init__()
+        self.steps = steps
+        self.threshold = threshold
+        self.direction = 1 if direction >= 0 else -1
+        self.lookback = steps + 1
+        self.name = name or f"consecutive_{'up' if self.direction > 0 else 'down'}_{steps}"
+
+    def _state(self) -> dict[str, float]:
+        return {"run": 0.0}
+
+    def update(self, store, rows, prices, prev):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            change = (prices - prev) / prev
+        moved = self.direction * change >= self.threshold
+        run = np.where(moved, self.run[rows] + 1, 0)
+        self.run[rows] = run
+        return run >= self.steps
+
+    def describe(self, store, row):
+        window, rates = store.consecutive_changes(np.asarray([row]), self.steps)
+        return {"prices": window[0].tolist(), "change_rates": rates[0].tolist()}
+
+
+class MomentumRule(SignalRule):
+    """
+    N tick 前からの変化率が threshold 以上（direction=-1 なら下落側）
+    """
+    def __init__(self, steps: int = 5, threshold: float = 0.1, direction: int = 1, name: str | None = None) -> None:
+        super().__init__()
+        self.steps = steps
+        self.threshold = threshold
+        self.direction = 1 if direction >= 0 else -1
+        self.lookback = steps + 1
+        self.name = name or f"momentum_{steps}"
+
+    def _state(self) -> dict[str, float]:
+        return {"momentum": np.nan}
+
+    def update(self, store, rows, prices, prev):
+        base = store.last(rows, self.steps + 1)[:, 0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            momentum = (prices - base) / base
+        self.momentum[rows] = momentum
+        return self.direction * momentum >= self.threshold
+
+    def describe(self, store, row):
+        return {"momentum": float(self.momentum[row])}
+
+
+class EwmaCrossoverRule(SignalRule):
+    """
+    短期EWMAが長期EWMAを上抜け(direction=1)/下抜け(direction=-1)した tick で発火
+    """
+    def __init__(self, fast_span: int = 5, slow_span: int = 20, direction: int = 1, name: str | None = None) -> None:
+        super().__init__()
+        if fast_span >= slow_span:
+            raise ValueError("fast_span must be shorter than slow_span")
+        self.fast_alpha = 2.0 / (fast_span + 1)
+        self.slow_alpha = 2.0 / (slow_span + 1)
+        self.warmup = slow_span
+        self.direction = 1 if direction >= 0 else -1
+        self.name = name or f"ewma_cross_{fast_span}_{slow_span}"
+
+    def _state(self) -> dict[str, float]:
+        return {"fast": np.nan, "slow": np.nan, "seen": 0.0, "spread": np.nan}
+
+    def update(self, store, rows, prices, prev):
+        fast = self.fast[rows]
+        slow = self.slow[rows]
+        first = np.isnan(fast)
+        fast = np.where(first, prices, fast + self.fast_alpha * (prices - fast))
+        slow = np.where(first, prices, slow + self.slow_alpha * (prices - slow))
+        seen = self.seen[rows] + 1
+        spread = self.direction * (fast - slow)
+        crossed = (self.direction * self.spread[rows] <= 0) & (spread > 0) & (seen > self.warmup)
+
+        self.fast[rows] = fast
+        self.slow[rows] = slow
+        self.seen[rows] = seen
+        self.spread[rows] = fast - slow
+        return crossed
+
+    def describe(self, store, row):
+        return {"fast_ewma": float(self.fast[row]), "slow_ewma": float(self.slow[row])}
+
+
+class ReturnZScoreRule(SignalRule):
+    """
+    1tickリターンの指数加重平均・分散に対するzスコアが threshold 以上（direction=-1 なら -threshold 以下）
+    """
+    def __init__(self, span: int = 20, threshold: float = 3.0, direction: int = 1, min_periods: int = 10, name: str | None = None) -> None:
+        super().__init__()
+        self.alpha = 2.0 / (span + 1)
+        self.threshold = threshold
+        self.direction = 1 if direction >= 0 else -1
+        self.min_periods = min_periods
+        self.name = name or f"return_zscore_{span}"
+
+    def _state(self) -> dict[str, float]:
+        return {"mean": 0.0, "var": 0.0, "seen": 0.0, "zscore": np.nan}
+
+    def update(self, store, rows, prices, prev):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ret = (prices - prev) / prev
+            has_ret = np.isfinite(ret)
+            mean = self.mean[rows]
+            var = self.var[rows]
+            zscore = (ret - mean) / np.sqrt(var)
+
+        ret = np.where(has_ret, ret, 0.0)
+        diff = ret - mean
+        incr = self.alpha * diff
+        self.mean[rows] = np.where(has_ret, mean + incr, mean)
+        self.var[rows] = np.where(has_ret, (1 - self.alpha) * (var + diff * incr), var)
+        seen = self.seen[rows] + has_ret
+        self.seen[rows] = seen
+        self.zscore[rows] = zscore
+        return has_ret & (seen > self.min_periods) & (self.direction * zscore >= self.threshold)
+
+    def describe(self, store, row):
+        return {"zscore": float(self.zscore[row])}
+
+
+class DrawdownRule(SignalRule):
+    """
+    追跡開始以降の最高値からの下落率が threshold 以上になった tick で発火（下回っている間は鳴らし続けない）
+    """
+    def __init__(self, threshold: float = 0.2, name: str | None = None) -> None:
+        super().__init__()
+        self.threshold = threshold
+        self.name = name or "drawdown"
+
+    def _state(self) -> dict[str, float]:
+        return {"peak": np.nan, "drawdown": 0.0}
+
+    def update(self, store, rows, prices, prev):
+        peak = np.fmax(self.peak[rows], prices)
+        drawdown = (peak - prices) / peak
+        crossed = (self.drawdown[rows] < self.threshold) & (drawdown >= self.threshold)
+        self.peak[rows] = peak
+        self.drawdown[rows] = drawdown
+        return crossed
+
+    def describe(self, store, row):
+        return {"peak": float(self.peak[row]), "drawdown": float(self.drawdown[row])}
+
+
+RULE_TYPES: dict[str, type[SignalRule]] = {
+    "consecutive": ConsecutiveMoveRule,
+    "momentum": MomentumRule,
+    "ewma_cross": EwmaCrossoverRule,
+    "return_zscore": ReturnZScoreRule,
+    "drawdown": DrawdownRule,
+}
+
+
+def build_rules(specs: Iterable[dict[str, Any]]) -> list[SignalRule]:
+    """
+    config の宣言 ({"type": "consecutive", "steps": 2, ...}) からルールを組み立てる
+    """
+    rules = []
+    for spec in specs:
+        params = dict(spec)
+        rule_type = params.pop("type")
+        if rule_type not in RULE_TYPES:
+            raise ValueError(f"unknown signal rule type: {rule_type}")
+        rules.append(RULE_TYPES[rule_type](**params))
+    return rules
+
+
+class SignalEngine:
+    """
+    共有のリングバッファ(RollingPriceStore)上で、複数ルールをtick毎に差分評価する
+    """
+    def __init__(self, rules: list[SignalRule]) -> None:
+        if not rules:
+            raise ValueError("at least one signal rule is required")
+        self.rules = rules
+        window = max(2, max(rule.lookback for rule in rules))
+        self.store = RollingPriceStore(window=window)
+        self._sync_capacity()
+
+    def update(self, token_ids: list[str], prices: np.ndarray) -> list[Signal]:
+        rows = self.store.rows_for(token_ids)
+        self._sync_capacity()
+        prev = self.store.last(rows, 1)[:, 0]
+        self.store.append(token_ids, prices)
+
+        prices = np.asarray(prices, dtype=np.float64)
+        valid = np.isfinite(prices) & (prices > 0)
+        invalid_rows = rows[~valid]
+        for rule in self.rules:
+            rule.reset(invalid_rows)
+
+        positions = np.flatnonzero(valid)
+        rows_ok = rows[positions]
+        prices_ok = prices[positions]
+        prev_ok = prev[positions]
+
+        signals: list[Signal] = []
+        for rule in self.rules:
+            fired = rule.update(self.store, rows_ok, prices_ok, prev_ok)
+            for i in positions[np.flatnonzero(fired)]:
+                signals.append(
+                    Signal(
+                        index=int(i),
+                        token_id=token_ids[i],
+                        rule=rule.name,
+                        values=rule.describe(self.store, int(rows[i])),
+                    )
+                )
+        return signals
+
+    def reset(self, token_ids: Iterable[str]) -> None:
+        rows = np.asarray(
+            [self.store.index[t] for t in token_ids if t in self.store.index], dtype=np.int64
+        )
+        self.store.reset_rows(rows)
+        for rule in self.rules:
+            rule.reset(rows)
+
+    def evict(self, token_ids: Iterable[str]) -> None:
+        token_ids = list(token_ids)
+        self.reset(token_ids)
+        self.store.evict(token_ids)
+
+    def retain(self, token_ids: set[str]) -> None:
+        self.evict([token_id for token_id in self.store.index if token_id not in token_ids])
+
+    def _sync_capacity(self) -> None:
+        capacity = len(self.store.counts)
+        for rule in self.rules:
+            if rule.capacity != capacity:
+                rule.resize(capacity)
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import os
+import shutil
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Iterable
+
+import numpy as np
+
+import config
+
+TICK_STORE_DIR = config.TICK_STORE_DIR
+TICK_STORE_RETENTION_HOURS = config.TICK_STORE_RETENTION_HOURS
+
+# 列ごとのファイル名と型（リトルエンディアン固定）
+COLUMNS = {
+    "token": np.dtype("<u4"),   # tokens.txt の行番号
+    "ts": np.dtype("<i8"),      # UNIX時刻[ms]
+    "mid": np.dtype("<f4"),     # 中値
+}
+
+
+def _column_path(partition: Path, name: str) -> Path:
+    dtype = COLUMNS[name]
+    return partition / f"{name}.{dtype.kind}{dtype.itemsize * 8}"
+
+
+@dataclass
+class TickSlice:
+    token_ids: list[str]     # token_index -> token_id
+    token_index: np.ndarray
+    timestamps: np.ndarray
+    prices: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+class TickStore:
+    """
+    トラッカーの毎tickの中値を追記専用で保存する列指向ストア
+        tick_logs/
+            tokens.txt            token_id 一覧（行番号 = token_index）
+            YYYYmmdd/HH/          UTC 1時間ごとのパーティション
+                token.u32 / ts.i64 / mid.f32
+    読み出しは memmap で必要なパーティション・範囲だけ触る
+    パーティションを開く時に列の長さを最短の列に揃え（書き込み途中で落ちた分を捨てる）、
+    retention_hours より古いパーティションを消す
+    """
+    def __init__(
+        self, root: str | Path = TICK_STORE_DIR, *, retention_hours: float = TICK_STORE_RETENTION_HOURS
+    ) -> None:
+        self.root = Path(root)
+        self.retention_hours = retention_hours
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.tokens_path = self.root / "tokens.txt"
+        self.token_ids: list[str] = []
+        self.index: dict[str, int] = {}
+        if self.tokens_path.exists():
+            for line in self.tokens_path.read_text(encoding="utf-8").splitlines():
+                self.index[line] = len(self.token_ids)
+                self.token_ids.append(line)
+        self._partition: Path | None = None
+        self._handles: dict[str, BinaryIO] = {}
+        self._cached_ids: list[str] = []
+        self._cached_index = np.zeros(0, dtype=COLUMNS["token"])
+
+    def append(self, timestamp: float, token_ids: list[str], prices: np.ndarray) -> int:
+        """1tick分を追記する。価格が無いトークンは書かない。書いた件数を返す"""
+        prices = np.asarray(prices, dtype=np.float64)
+        valid = np.isfinite(prices)
+        token_index = self._token_index(token_ids)[valid]
+        count = len(token_index)
+        if count == 0:
+            return 0
+
+        self._open_partition(timestamp)
+        columns = {
+            "token": token_index,
+            "mid": prices[valid].astype(COLUMNS["mid"]),
+            # ts を最後に書く（途中で落ちても読み出しは最短の列に揃える）
+            "ts": np.full(count, int(timestamp * 1000), dtype=COLUMNS["ts"]),
+        }
+        for name, values in columns.items():
+            handle = self._handles[name]
+            values.tofile(handle)
+            handle.flush()
+        return count
+
+    def close(self) -> None:
+        for handle in self._handles.values():
+            handle.close()
+        self._handles = {}
+        self._partition = None
+
+    def read(
+        self,
+        token_ids: Iterable[str] | None = None,
+        start: float | None = None,
+        end: float | None = None,
+    ) -> TickSlice:
+        """
+        [start, end) (UNIX秒) の範囲を、token_ids で絞って返す（None なら全件）
+        """
+        wanted = None
+        if token_ids is not None:
+            wanted = np.asarray(
+                [self.index[t] for t in token_ids if t in self.index], dtype=COLUMNS["token"]
+            )
+        start_ms = None if start is None else int(start * 1000)
+        end_ms = None if end is None else int(end * 1000)
+
+        parts: dict[str, list[np.ndarray]] = {name: [] for name in COLUMNS}
+        for partition in self.partitions(start, end):
+            columns = self._map_partition(partition)
+            if columns is None:
+                continue
+            ts = columns["ts"]
+            lo = 0 if start_ms is None else int(np.searchsorted(ts, start_ms, side="left"))
+            hi = len(ts) if end_ms is None else int(np.searchsorted(ts, end_ms, side="left"))
+            if lo >= hi:
+                continue
+            token = columns["token"][lo:hi]
+            mask = slice(None) if wanted is None else np.isin(token, wanted)
+            parts["token"].append(np.array(token[mask]))
+            parts["ts"].append(np.array(ts[lo:hi][mask]))
+            parts["mid"].append(np.array(columns["mid"][lo:hi][mask]))
+
+        merged = {
+            name: np.concatenate(chunks) if chunks else np.zeros(0, dtype=COLUMNS[name])
+            for name, chunks in parts.items()
+        }
+        return TickSlice(
+            token_ids=self.token_ids,
+            token_index=merged["token"],
+            timestamps=merged["ts"],
+            prices=merged["mid"],
+        )
+
+    def series(
+        self, token_id: str, start: float | None = None, end: float | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        ticks = self.read([token_id], start, end)
+        return ticks.timestamps, ticks.prices
+
+    def partitions(self, start: float | None = None, end: float | None = None) -> list[Path]:
+        start_key = None if start is None else self._partition_key(start)
+        end_key = None if end is None else self._partition_key(end)
+        found = []
+        for date_dir in sorted(p for p in self.root.iterdir() if p.is_dir()):
+            for hour_dir in sorted(p for p in date_dir.iterdir() if p.is_dir()):
+                key = f"{date_dir.name}/{hour_dir.name}"
+                if start_key is not None and key < start_key:
+                    continue
+                if end_key is not None and key > end_key:
+                    continue
+                found.append(hour_dir)
+        return found
+
+    def _map_partition(self, partition: Path) -> dict[str, np.ndarray] | None:
+        lengths = {}
+        for name, dtype in COLUMNS.items():
+            path = _column_path(partition, name)
+            lengths[name] = path.stat().st_size // dtype.itemsize if path.exists() else 0
+        rows = min(lengths.values())
+        if rows == 0:
+            return None
+        return {
+            name: np.memmap(_column_path(partition, name), dtype=dtype, mode="r", shape=(rows,))
+            for name, dtype in COLUMNS.items()
+        }
+
+    def _open_partition(self, timestamp: float) -> None:
+        partition = self.root / self._partition_key(timestamp)
+        if partition == self._partition:
+            return
+        self.close()
+        partition.mkdir(parents=True, exist_ok=True)
+        self._repair_partition(partition)
+        self.prune(timestamp)
+        for name in COLUMNS:
+            self._handles[name] = open(_column_path(partition, name), "ab")
+        self._partition = partition
+
+    def prune(self, now: float) -> list[Path]:
+        """retention_hours より前のパーティションを消し、消したものを返す"""
+        if self.retention_hours <= 0:
+            return []
+        cutoff = self._partition_key(now - self.retention_hours * 3600)
+        removed = [p for p in self.partitions() if f"{p.parent.name}/{p.name}" < cutoff]
+        for partition in removed:
+            shutil.rmtree(partition, ignore_errors=True)
+            if not any(partition.parent.iterdir()):
+                partition.parent.rmdir()
+        return removed
+
+    @staticmethod
+    def _repair_partition(partition: Path) -> None:
+        """列の長さを最短の列に揃える（追記の途中で落ちると、列ごとに書けた行数がずれる）"""
+        lengths = {}
+        for name, dtype in COLUMNS.items():
+            path = _column_path(partition, name)
+            lengths[name] = path.stat().st_size // dtype.itemsize if path.exists() else 0
+        rows = min(lengths.values())
+        for name, dtype in COLUMNS.items():
+            path = _column_path(partition, name)
+            if path.exists() and path.stat().st_size != rows * dtype.itemsize:
+                os.truncate(path, rows * dtype.itemsize)
+
+    def _token_index(self, token_ids: list[str]) -> np.ndarray:
+        if token_ids == self._cached_ids:
+            return self._cached_index
+        new_ids = [t for t in dict.fromkeys(token_ids) if t not in self.index]
+        if new_ids:
+            with open(self.tokens_path, "a", encoding="utf-8") as f:
+                for token_id in new_ids:
+                    self.index[token_id] = len(self.token_ids)
+                    self.token_ids.append(token_id)
+                    f.write(f"{token_id}\n")
+        self._cached_ids = list(token_ids)
+        self._cached_index = np.asarray(
+            [self.index[t] for t in token_ids], dtype=COLUMNS["token"]
+        )
+        return self._cached_index
+
+    @staticmethod
+    def _partition_key(timestamp: float) -> str:
+        return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y%m%d/%H")
@@ -6,89 +6,150 @@ from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any
 
+import numpy as np
 import requests
 from zoneinfo import ZoneInfo
 
 import config
+from http_client import shared_client
+from market_stream import MarketStream
+from midpoints import MidpointFetcher
+from positions import Position
+from scheduler import TickScheduler
+from signals import SignalEngine, build_rules
 from trade import TRADE
 
 POLL_INTERVAL_SECONDS = config.POLL_INTERVAL_SECONDS
-MIDPOINT_BATCH_SIZE = config.MIDPOINT_BATCH_SIZE
-CONSECUTIVE_DECREASE_THRESHOLD = config.CONSECUTIVE_DECREASE_THRESHOLD
+HTTP_REPORT_EVERY = config.HTTP_REPORT_EVERY
 
 
 class OwnTokenPriceTracker:
     def __init__(self) -> None:
         self.clob_api_base = config.CLOB_API_BASE
-        self.session = requests.Session()
-        self.price_history: dict[str, list[float]] = {}
+        self.http = shared_client()
+        self.signals = SignalEngine(build_rules(config.SELL_SIGNAL_RULES))
+        self.midpoint_fetcher = MidpointFetcher(self.clob_api_base)
+        self.scheduler = TickScheduler(POLL_INTERVAL_SECONDS)
         self.tr = TRADE()
+        self.order_prep = self.tr.enable_order_prep() if config.ORDER_PREP_ENABLED else None
 
     def post(self, url: str, *, payload: list[dict[str, Any]]) -> Any:
-        response = self.session.post(url, json=payload, timeout=30)
-        response.raise_for_status()
-        return response.json()
+        return self.http.post(url, payload=payload)
 
     def fetch_midpoints(self, token_ids: list[str]) -> dict[str, str]:
-        url = f"{self.clob_api_base}/midpoints"
-        results: dict[str, str] = {}
-
-        for start in range(0, len(token_ids), MIDPOINT_BATCH_SIZE):
-            batch = token_ids[start : start + MIDPOINT_BATCH_SIZE]
-            payload = [{"token_id": token_id} for token_id in batch]
-            batch_result = self.post(url, payload=payload)
-            if isinstance(batch_result, dict):
-                results.update(batch_result)
-
-        return results
+        return self.midpoint_fetcher.fetch(token_ids)
 
     def poll_forever(self) -> None:
         print(f"tracking own positions every {POLL_INTERVAL_SECONDS} seconds")
 
-        while True:
-            positions = self.tr.get_self_status()
-            active_token_ids = {position["token_id"] for position in positions}
-            self._prune_history(active_token_ids)
-
-            if not positions:
-                print(f"[{self._utc_now()}] no open positions")
-                time.sleep(POLL_INTERVAL_SECONDS)
-                continue
-
-            midpoints = self.fetch_midpoints([position["token_id"] for position in positions])
-            snapshot = {
-                "timestamp": self._utc_now(),
-                "position_count": len(positions),
-                "positions": [],
-                "alerts": [],
-            }
-
-            for position in positions:
-                midpoint = midpoints.get(position["token_id"])
-                current_price = float(midpoint) if midpoint is not None else position["price"]
-
-                alert = self._update_price_history_and_detect_alert(
-                    position=position,
-                    current_price=current_price,
-                )
-                if alert is not None:
-                    snapshot["alerts"].append(alert)
-
-                snapshot["positions"].append(
-                    {
-                        "condition_id": position["condition_id"],
-                        "token_name": position["token_name"],
-                        "token_id": position["token_id"],
-                        "size": position["size"],
-                        "average_price": position["avr_price"],
-                        "current_price": current_price,
-                    }
+        def tick(cycle: int) -> None:
+            try:
+                self.poll_once()
+            except requests.RequestException as exc:
+                # 再試行しても失敗した時はこのtickだけ飛ばす（ループは止めない）
+                print(f"[{self._utc_now()}] tick {cycle} skipped: {exc}")
+            if cycle % HTTP_REPORT_EVERY == 0:
+                print(self.http.report())
+
+        self.scheduler.run(tick)
+
+    def stream_forever(self) -> None:
+        """
+        保有トークンの価格更新をWebSocketで受け取り、イベント毎に検知する
+        保有状況は POLL_INTERVAL_SECONDS 毎に取り直し、ストリームが切れている間はポーリングで補う
+        """
+        stream = MarketStream()
+        positions_by_token: dict[str, Position] = {}
+        next_refresh = 0.0
+        print(f"streaming own positions from {stream.url}")
+
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= next_refresh:
+                    next_refresh = now + POLL_INTERVAL_SECONDS
+                    try:
+                        if stream.connected.is_set():
+                            positions = self._refresh_positions()
+                        else:
+                            positions = self.poll_once()
+                    except requests.RequestException as exc:
+                        # 再試行しても失敗した時は前回の保有状況のまま続ける（ループは止めない）
+                        print(f"[{self._utc_now()}] positions refresh skipped: {exc}")
+                    else:
+                        positions_by_token = {position.token_id: position for position in positions}
+                        if positions_by_token:
+                            stream.subscribe(list(positions_by_token))
+
+                update = stream.next_update(timeout=1.0)
+                if update is None or update.token_id not in positions_by_token:
+                    continue
+                alerts = self._detect_alerts(
+                    [positions_by_token[update.token_id]], np.array([update.price])
                 )
-
-            if snapshot["alerts"]:
+                if alerts:
+                    self._sell_alert_positions(alerts)
+        finally:
+            stream.stop()
+
+    def poll_once(self) -> list[Position]:
+        with self.scheduler.phase("positions"):
+            positions = self._refresh_positions()
+        if not positions:
+            print(f"[{self._utc_now()}] no open positions")
+            return positions
+
+        with self.scheduler.phase("midpoints"):
+            midpoints = self.fetch_midpoints([position.token_id for position in positions])
+        # 中値が取れなかったトークンはこのtickの検知から外す（保有状況の価格は最大 POSITION_REFRESH_SECONDS 古い）
+        priced = [position for position in positions if position.token_id in midpoints]
+        current_prices = np.array(
+            [float(midpoints[position.token_id]) for position in priced], dtype=np.float64
+        )
+        with self.scheduler.phase("detection"):
+            alerts = self._detect_alerts(priced, current_prices) if priced else []
+        snapshot = {
+            "timestamp": self._utc_now(),
+            "position_count": len(positions),
+            "positions": [],
+            "alerts": alerts,
+        }
+
+        for position in positions:
+            current_price = midpoints.get(position.token_id)
+            snapshot["positions"].append(
+                {
+                    "condition_id": position.condition_id,
+                    "token_name": position.token_name,
+                    "token_id": position.token_id,
+                    "size": position.size,
+                    "average_price": position.avr_price,
+                    "current_price": None if current_price is None else float(current_price),
+                }
+            )
+
+        if snapshot["alerts"]:
+            with self.scheduler.phase("execution"):
                 self._sell_alert_positions(snapshot["alerts"])
-
-            time.sleep(POLL_INTERVAL_SECONDS)
+        return positions
+
+    def _refresh_positions(self) -> list[Position]:
+        # 保有状況は POSITION_REFRESH_SECONDS 毎（売却後は次のtick）にだけ取り直す
+        delta = self.tr.positions.refresh()
+        positions = self.tr.positions.positions
+        if not delta.fetched:
+            return positions
+        if delta:
+            print(
+                f"[{self._utc_now()}] positions delta: +{len(delta.added)} -{len(delta.removed)} "
+                f"~{len(delta.resized)} (total {len(positions)})"
+            )
+        active_token_ids = {position.token_id for position in positions}
+        self._prune_history(active_token_ids)
+        if self.order_prep is not None:
+            self.order_prep.retain(active_token_ids)
+            self.order_prep.watch(active_token_ids)
+        return positions
 
     def _sell_alert_positions(self, alerts: list[dict[str, Any]]) -> None:
         full_log: dict[str, Any] = {}
@@ -106,85 +167,72 @@ class OwnTokenPriceTracker:
                 "token_id": alert["token_id"],
                 "size": alert["size"],
                 "token_price": alert["sell_price"],
-                "prices": alert["prices"],
-                "decrease_rates": alert["decrease_rates"],
+                "signals": alert["signals"],
             }
 
-            try:
-                tlog_path = self.tr.make_book_order(
-                    alert["token_id"],
-                    alert["sell_price"],
-                    alert["size"],
-                    side="S",
-                )
+        orders = [
+            {
+                "token_id": alert["token_id"],
+                "price": alert["sell_price"],
+                "size": alert["size"],
+                "side": "S",
+            }
+            for alert in alerts
+        ]
+        try:
+            results, tlog_path = self.tr.make_book_orders(orders)
+            print(f"Order response saved to: {tlog_path}")
+        except Exception as exc:
+            results, tlog_path = [{"success": False, "error": str(exc)} for _ in alerts], None
+
+        for alert, result in zip(alerts, results):
+            entry = full_log[alert["condition_id"]]
+            if result["success"]:
                 print(
                     f"{alert['token_name']}を価格{alert['sell_price']}で、{alert['size']}個売却しました。"
                 )
-                print(f"Order response saved to: {tlog_path}")
-                full_log[condition_id]["result"] = "成功"
-                full_log[condition_id]["transaction_log_path"] = str(tlog_path)
-            except Exception as exc:
-                print(f"{alert['token_name']}を売却できませんでした。{exc}")
-                full_log[condition_id]["result"] = "失敗"
-                full_log[condition_id]["error"] = str(exc)
+                entry["result"] = "成功"
+                entry["transaction_log_path"] = str(tlog_path)
+            else:
+                print(f"{alert['token_name']}を売却できませんでした。{result.get('error')}")
+                entry["result"] = "失敗"
+                entry["error"] = result.get("error")
 
         log_path = log_dir / f"{time_str}_sell_alerts.json"
         with open(log_path, "w", encoding="utf-8") as f:
             json.dump(full_log, f, ensure_ascii=False, indent=2)
 
-    def _update_price_history_and_detect_alert(
+    def _detect_alerts(
         self,
-        *,
-        position: dict[str, Any],
-        current_price: float | None,
-    ) -> dict[str, Any] | None:
-        token_id = position["token_id"]
-
-        if current_price is None or current_price <= 0:
-            self.price_history.pop(token_id, None)
-            return None
-
-        history = self.price_history.setdefault(token_id, [])
-        history.append(current_price)
-        if len(history) > 3:
-            history.pop(0)
-
-        if len(history) < 3:
-            return None
-
-        first, second, third = history
-        if first <= 0 or second <= 0:
-            return None
-
-        first_change = (second - first) / first
-        second_change = (third - second) / second
-        if (
-            first_change <= -CONSECUTIVE_DECREASE_THRESHOLD
-            and second_change <= -CONSECUTIVE_DECREASE_THRESHOLD
-        ):
-            sell_price = max(third * config.SELL_BUFFER_RATE, 0.01)
-            self.price_history.pop(token_id, None)
-            return {
-                "condition_id": position["condition_id"],
-                "token_name": position["token_name"],
-                "token_id": token_id,
-                "size": position["size"],
-                "prices": [first, second, third],
-                "decrease_rates": [first_change, second_change],
-                "sell_price": sell_price,
-                "message": (
-                    f"{position['token_name']} price decreased by threshold twice consecutively"
-                ),
+        positions: list[Position],
+        current_prices: np.ndarray,
+    ) -> list[dict[str, Any]]:
+        token_ids = [position.token_id for position in positions]
+        signals = self.signals.update(token_ids, current_prices)
+
+        alerts: dict[str, dict[str, Any]] = {}
+        for signal in signals:
+            if signal.token_id in alerts:
+                alerts[signal.token_id]["signals"][signal.rule] = signal.values
+                continue
+            position = positions[signal.index]
+            current_price = float(current_prices[signal.index])
+            alerts[signal.token_id] = {
+                "condition_id": position.condition_id,
+                "token_name": position.token_name,
+                "token_id": position.token_id,
+                "size": position.size,
+                "price": current_price,
+                "signals": {signal.rule: signal.values},
+                "sell_price": max(current_price * config.SELL_BUFFER_RATE, 0.01),
+                "message": f"{position.token_name} triggered {signal.rule}",
             }
-
-        return None
+        # 売却対象になったトークンは履歴をリセット
+        self.signals.reset(alerts.keys())
+        return list(alerts.values())
 
     def _prune_history(self, active_token_ids: set[str]) -> None:
-        stale_token_ids = [
-            token_id for token_id in self.price_history if token_id not in active_token_ids
-        ]
-        for token_id in stale_token_ids:
-            self.price_history.pop(token_id, None)
+        self.signals.retain(active_token_ids)
 
     @staticmethod
     def _utc_now() -> str:
@@ -193,4 +241,7 @@ class OwnTokenPriceTracker:
 
 if __name__ == "__main__":
     tracker = OwnTokenPriceTracker()
-    tracker.poll_forever()
+    if config.MARKET_STREAM_ENABLED:
+        tracker.stream_forever()
+    else:
+        tracker.poll_forever()
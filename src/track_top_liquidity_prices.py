@@ -1,54 +1,43 @@
 from __future__ import annotations
 from trade import TRADE
-import json
 import time
-from dataclasses import dataclass
-from from datetime import datetime, timezone
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
 from typing import Any
+import numpy as np
 import requests
 import config
-from zoneinfo import ZoneInfo
-from pathlib import Path
+from execution import AlertExecutor
+from http_client import shared_client
+from market_stream import MarketStream
+from midpoints import MidpointFetcher
+from scheduler import TickScheduler
+from signals import SignalEngine, build_rules
+from tick_store import TickStore
+from universe import MarketInfo, MarketToken, MarketUniverse
 
 POLL_INTERVAL_SECONDS = config.POLL_INTERVAL_SECONDS
-TOP_MARKET_COUNT = config.TOP_MARKET_COUNT
+HTTP_REPORT_EVERY = config.HTTP_REPORT_EVERY
 MARKET_REFRESH_EVERY = config.MARKET_REFRESH_EVERY
 GAMMA_PAGE_SIZE = config.GAMMA_PAGE_SIZE
-MIDPOINT_BATCH_SIZE = config.MIDPOINT_BATCH_SIZE
-CONSECUTIVE_INCREASE_THRESHOLD = config.CONSECUTIVE_INCREASE_THRESHOLD
-
-@dataclass
-class MarketToken:
-    token_id: str
-    outcome: str
-
-
-@dataclass
-class MarketInfo:
-    market_id: str
-    condition_id: str
-    question: str
-    slug: str | None
-    liquidity: float
-    volume: float
-    end_date: str | None
-    tokens: list[MarketToken]
+GAMMA_MAX_PAGES = config.GAMMA_MAX_PAGES
+GAMMA_PAGE_CONCURRENCY = config.GAMMA_PAGE_CONCURRENCY
 
 def summarize_event_and_market(marketdata):
+    if marketdata is None:
+        return None, None  # 見つからなかった場合
     try:
-        marketdata = json.loads(marketdata)[0]
-        print(marketdata)
         lines = []
         token_info = []
-        lines.append(f"予測テーマ: {marketdata['question']}")
-        lines.append(f"詳細：{marketdata['description']}")
-        lines.append(f"終了日: {marketdata['end_date']}")
-        for i in range(len(marketdata['token_name'])):
-            lines.append(f" トークン「{marketdata['token_name'][i]}」の価格：{marketdata['token_price'][i]}")
+        lines.append(f"予測テーマ: {marketdata.question}")
+        lines.append(f"詳細：{marketdata.description}")
+        lines.append(f"終了日: {marketdata.end_date}")
+        for i in range(len(marketdata.token_name)):
+            lines.append(f" トークン「{marketdata.token_name[i]}」の価格：{marketdata.token_price[i]}")
             token_info.append({
-                'token_name': marketdata['token_name'][i],
-                'token_id': marketdata['token_ids'][i],
-                'token_price': marketdata['token_price'][i]
+                'token_name': marketdata.token_name[i],
+                'token_id': marketdata.token_ids[i],
+                'token_price': marketdata.token_price[i]
             })
         market_detail_text = "\n".join(lines)
         return market_detail_text, token_info
@@ -59,108 +48,115 @@ class PolymarketPriceTracker:
     def __init__(self) -> None:
         self.gamma_api_base = config.GEMMA_API_BASE
         self.clob_api_base = config.CLOB_API_BASE
-        self.session = requests.Session()
-        self.price_history: dict[str, list[float]] = {}
+        # ページを並列取得するので、HTTP_POOL_SIZE は GAMMA_PAGE_CONCURRENCY 以上にしておく
+        self.http = shared_client()
+        self.last_refresh_timing: dict[str, Any] = {}
+        self.universe = MarketUniverse()
+        self.signals = SignalEngine(build_rules(config.BUY_SIGNAL_RULES))
+        self.midpoint_fetcher = MidpointFetcher(self.clob_api_base)
+        self.scheduler = TickScheduler(POLL_INTERVAL_SECONDS)
+        self.tick_store = TickStore() if config.TICK_STORE_ENABLED else None
         self.tr = TRADE()
+        self.order_prep = self.tr.enable_order_prep() if config.ORDER_PREP_ENABLED else None
+        self.executor = AlertExecutor(self._execute_buy_alert)
 
     def get(self, url: str, *, params: dict[str, Any] | None = None) -> Any:
-        response = self.session.get(url, params=params, timeout=30)
-        response.raise_for_status()
-        return response.json()
+        return self.http.get(url, params=params)
 
     def post(self, url: str, *, payload: list[dict[str, Any]]) -> Any:
-        response = self.session.post(url, json=payload, timeout=30)
-        response.raise_for_status()
-        return response.json()
+        return self.http.post(url, payload=payload)
 
-    def fetch_open_markets(self, max_pages: int = 5) -> list[dict[str, Any]]:
-        markets: list[dict[str, Any]] = []
+    def fetch_open_markets(
+        self,
+        max_pages: int = GAMMA_MAX_PAGES,
+        concurrency: int = GAMMA_PAGE_CONCURRENCY,
+    ) -> list[dict[str, Any]]:
         url = f"{self.gamma_api_base}/markets"
+        concurrency = max(1, concurrency)
+        pages: dict[int, list[dict[str, Any]]] = {}
+        request_seconds: list[float] = []
+        # 短いページ(または空ページ)が返ったら、それより後ろのページは取りに行かない
+        last_page = max_pages
+        next_page = 0
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            pending: dict[Any, int] = {}
+            while pending or next_page < last_page:
+                while next_page < last_page and len(pending) < concurrency:
+                    future = pool.submit(self._fetch_market_page, url, next_page)
+                    pending[future] = next_page
+                    next_page += 1
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page = pending.pop(future)
+                    page_items, elapsed = future.result()
+                    request_seconds.append(elapsed)
+                    pages[page] = page_items
+                    if len(page_items) < GAMMA_PAGE_SIZE:
+                        last_page = min(last_page, page + 1)
+
+                for future, page in list(pending.items()):
+                    if page >= last_page and future.cancel():
+                        pending.pop(future)
 
-        for page in range(max_pages):
-            params = {
-                "active": "true",
-                "closed": "false",
-                "limit": GAMMA_PAGE_SIZE,
-                "offset": page * GAMMA_PAGE_SIZE,
-                "order": "volume24hr"
-            }
-            page_items = self.get(url, params=params)
-            if not page_items:
-                break
-            markets.extend(page_items)
-            if len(page_items) < GAMMA_PAGE_SIZE:
-                break
-
+        markets: list[dict[str, Any]] = []
+        for page in range(last_page):
+            markets.extend(pages.get(page, []))
+
+        wall_seconds = time.perf_counter() - started
+        self.last_refresh_timing = {
+            "pages": len(request_seconds),
+            "markets": len(markets),
+            "concurrency": concurrency,
+            "wall_seconds": wall_seconds,
+            "sequential_seconds": sum(request_seconds),
+        }
+        print(
+            f"[{self._utc_now()}] fetched {len(markets)} markets from "
+            f"{len(request_seconds)} pages in {wall_seconds:.2f}s wall-clock "
+            f"(sequential sum {sum(request_seconds):.2f}s, concurrency {concurrency})"
+        )
         return markets
 
+    def _fetch_market_page(
+        self, url: str, page: int
+    ) -> tuple[list[dict[str, Any]], float]:
+        params = {
+            "active": "true",
+            "closed": "false",
+            "limit": GAMMA_PAGE_SIZE,
+            "offset": page * GAMMA_PAGE_SIZE,
+            "order": "volume24hr"
+        }
+        started = time.perf_counter()
+        page_items = self.get(url, params=params)
+        elapsed = time.perf_counter() - started
+        if not isinstance(page_items, list):
+            page_items = []
+        return page_items, elapsed
+
     def build_market_universe(self) -> list[MarketInfo]:
         raw_markets = self.fetch_open_markets()
-        candidates: list[MarketInfo] = []
-
-        for market in raw_markets:
-            if not market.get("active") or market.get("closed"):
-                continue
-            if not market.get("enableOrderBook"):
-                continue
-
-            outcomes_raw = market.get("outcomes")
-            token_ids_raw = market.get("clobTokenIds")
-            if not outcomes_raw or not token_ids_raw:
-                continue
-
-            try:
-                outcomes = json.loads(outcomes_raw)
-                token_ids = json.loads(token_ids_raw)
-            except (TypeError, json.JSONDecodeError):
-                continue
-
-            if len(outcomes) != len(token_ids) or len(token_ids) < 2:
-                continue
-
-            tokens = [
-                MarketToken(token_id=str(token_id), outcome=str(outcome))
-                for outcome, token_id in zip(outcomes, token_ids)
-            ]
-
-            liquidity = self._to_float(
-                market.get("liquidityNum", market.get("liquidity", 0))
-            )
-            volume = self._to_float(
-                market.get("volumeNum", market.get("volume", 0))
-            )
-
-            candidates.append(
-                MarketInfo(
-                    market_id=str(market.get("id")),
-                    condition_id=str(market.get("conditionId")),
-                    question=str(market.get("question") or ""),
-                    slug=market.get("slug"),
-                    liquidity=liquidity,
-                    volume=volume,
-                    end_date=market.get("endDate"),
-                    tokens=tokens,
-                )
-            )
-
-        candidates.sort(key=lambda item: item.liquidity, reverse=True)
-        return candidates[:TOP_MARKET_COUNT]
+        delta = self.universe.refresh(raw_markets)
+        # 上位から外れたトークンの履歴はすぐに捨てる
+        if delta.removed_token_ids:
+            self.signals.evict(delta.removed_token_ids)
+        if self.order_prep is not None:
+            token_ids = [token.token_id for market in self.universe.markets for token in market.tokens]
+            self.order_prep.retain(token_ids)
+            self.order_prep.watch(token_ids)
+        print(
+            f"[{self._utc_now()}] universe delta: +{len(delta.added)} -{len(delta.removed)} "
+            f"~{len(delta.changed)} (re-parsed {delta.reparsed}/{len(raw_markets)} markets)"
+        )
+        return self.universe.markets
 
     def fetch_midpoints(self, token_ids: list[str]) -> dict[str, str]:
-        url = f"{self.clob_api_base}/midpoints"
-        results: dict[str, str] = {}
-
-        for start in range(0, len(token_ids), MIDPOINT_BATCH_SIZE):
-            batch = token_ids[start : start + MIDPOINT_BATCH_SIZE]
-            payload = [{"token_id": token_id} for token_id in batch]
-            batch_result = self.post(url, payload=payload)
-            if isinstance(batch_result, dict):
-                results.update(batch_result)
-
-        return results
+        return self.midpoint_fetcher.fetch(token_ids)
 
     def poll_forever(self) -> None:
-        cycle = 0
         markets = self.build_market_universe()
 
         if not markets:
@@ -170,141 +166,185 @@ class PolymarketPriceTracker:
             f"tracking {len(markets)} markets every {POLL_INTERVAL_SECONDS} seconds"
         )
 
-        while True:
-            cycle += 1
-
-            if cycle == 1 or cycle % MARKET_REFRESH_EVERY == 0:
-                markets = self.build_market_universe()
-                print(
-                    f"[{self._utc_now()}] refreshed market universe: {len(markets)} markets"
-                )
-
-            token_ids = [token.token_id for market in markets for token in market.tokens]
-            midpoints = self.fetch_midpoints(token_ids)
+        def tick(cycle: int) -> None:
+            nonlocal markets
+            try:
+                if cycle == 1 or cycle % MARKET_REFRESH_EVERY == 0:
+                    with self.scheduler.phase("universe"):
+                        markets = self.build_market_universe()
+                    print(
+                        f"[{self._utc_now()}] refreshed market universe: {len(markets)} markets"
+                    )
+                self.poll_once(markets)
+            except requests.RequestException as exc:
+                # 再試行しても失敗した時はこのtickだけ飛ばす（ループは止めない）
+                print(f"[{self._utc_now()}] tick {cycle} skipped: {exc}")
+            if cycle % HTTP_REPORT_EVERY == 0:
+                print(self.http.report())
+
+        self.scheduler.run(tick)
+
+    def stream_forever(self) -> None:
+        """
+        WebSocketの価格更新をイベント毎に検知ロジックへ流す
+        ストリームが切れている間は POLL_INTERVAL_SECONDS 毎のポーリングで補う
+        """
+        markets = self.build_market_universe()
+        if not markets:
+            raise RuntimeError("open markets could not be loaded from Polymarket API")
 
-            snapshot = {
-                "timestamp": self._utc_now(),
-                "market_count": len(markets),
-                "markets": [],
-                "alerts": [],
-            }
+        token_refs = {token.token_id: (market, token) for market in markets for token in market.tokens}
+        stream = MarketStream()
+        stream.start(list(token_refs))
+        print(f"streaming {len(markets)} markets from {stream.url}")
 
-            for rank, market in enumerate(markets, start=1):
-                prices = {}
-                for token in market.tokens:
-                    midpoint = midpoints.get(token.token_id)
-                    current_price = float(midpoint) if midpoint is not None else None
-                    prices[token.outcome] = current_price
-
-                    alert = self._update_price_history_and_detect_alert(
-                        market=market,
-                        token=token,
-                        current_price=current_price,
-                    )
-                    if alert is not None:
-                        snapshot["alerts"].append(alert)
-                snapshot["markets"].append(
-                    {
-                        "rank": rank,
-                        "market_id": market.market_id,
-                        "condition_id": market.condition_id,
-                        "question": market.question,
-                        "slug": market.slug,
-                        "liquidity": market.liquidity,
-                        "volume": market.volume,
-                        "end_date": market.end_date,
-                        "prices": prices,
-                    }
+        refresh_interval = POLL_INTERVAL_SECONDS * MARKET_REFRESH_EVERY
+        last_refresh = last_poll = time.monotonic()
+        try:
+            while True:
+                now = time.monotonic()
+                if now - last_refresh >= refresh_interval:
+                    try:
+                        markets = self.build_market_universe()
+                    except requests.RequestException as exc:
+                        # 再試行しても失敗した時は今のユニバースのまま続け、POLL_INTERVAL_SECONDS 後に取り直す
+                        print(f"[{self._utc_now()}] universe refresh skipped: {exc}")
+                        last_refresh = now - refresh_interval + POLL_INTERVAL_SECONDS
+                    else:
+                        token_refs = {
+                            token.token_id: (market, token) for market in markets for token in market.tokens
+                        }
+                        stream.subscribe(list(token_refs))
+                        last_refresh = now
+                        print(
+                            f"[{self._utc_now()}] refreshed market universe: {len(markets)} markets"
+                        )
+
+                if not stream.connected.is_set():
+                    if now - last_poll >= POLL_INTERVAL_SECONDS:
+                        print(f"[{self._utc_now()}] stream down, polling instead")
+                        last_poll = now
+                        try:
+                            self.poll_once(markets)
+                        except requests.RequestException as exc:
+                            print(f"[{self._utc_now()}] poll skipped: {exc}")
+                    stream.connected.wait(timeout=1.0)
+                    continue
+
+                update = stream.next_update(timeout=1.0)
+                if update is None or update.token_id not in token_refs:
+                    continue
+                alerts = self._detect_alerts(
+                    [token_refs[update.token_id]], np.array([update.price])
                 )
+                if alerts:
+                    self._buy_alert_markets(alerts, self._utc_now())
+        finally:
+            stream.stop()
+
+    def poll_once(self, markets: list[MarketInfo]) -> dict[str, Any]:
+        token_refs = [(market, token) for market in markets for token in market.tokens]
+        token_ids = [token.token_id for _, token in token_refs]
+        with self.scheduler.phase("midpoints"):
+            midpoints = self.fetch_midpoints(token_ids)
+        current_prices = np.array(
+            [self._to_float(midpoints.get(token_id, "nan")) for token_id in token_ids],
+            dtype=np.float64,
+        )
+        if self.tick_store is not None:
+            with self.scheduler.phase("store"):
+                self.tick_store.append(time.time(), token_ids, current_prices)
+
+        with self.scheduler.phase("detection"):
+            alerts = self._detect_alerts(token_refs, current_prices)
+        snapshot = {
+            "timestamp": self._utc_now(),
+            "market_count": len(markets),
+            "markets": [],
+            "alerts": alerts,
+        }
+
+        price_iter = iter(current_prices.tolist())
+        for rank, market in enumerate(markets, start=1):
+            prices = {}
+            for token in market.tokens:
+                current_price = next(price_iter)
+                prices[token.outcome] = None if np.isnan(current_price) else current_price
+            snapshot["markets"].append(
+                {
+                    "rank": rank,
+                    "market_id": market.market_id,
+                    "condition_id": market.condition_id,
+                    "question": market.question,
+                    "slug": market.slug,
+                    "liquidity": market.liquidity,
+                    "volume": market.volume,
+                    "end_date": market.end_date,
+                    "prices": prices,
+                }
+            )
 
-            # print(json.dumps(snapshot, ensure_ascii=False))
-            # アラートが鳴った場合
-            if snapshot["alerts"] != []:
-                full_log = {}
-                now = datetime.now(ZoneInfo("Asia/Tokyo"))
-                date_str = now.strftime("%Y%m%d")
-                time_str = now.strftime("%H%M%S")
-                log_dir = Path("full_logs") / date_str
-                log_dir.mkdir(parents=True, exist_ok=True)
-                print(snapshot["timestamp"])
-                for market in snapshot["alerts"]:
-                    ## STEP 1: 現在の購入済トークンの状態を確認
-                    market_data = self.tr.get_market_by_conditionid(market["condition_id"])
-                    _, token_info = summarize_event_and_market(market_data)
-                    for ti in token_info:
-                        if ti["token_id"] == market["token_id"]:
-                            size = max(1.01/ ti["token_price"], 5.0)
-                            token = ti["token_name"]
-                            token_id = ti['token_id']
-                    price = float(ti["token_price"]) * config.BUY_BUFFER_RATE
-                    full_log[market["condition_id"]] = {}
-                    full_log[market["condition_id"]]["question"] = market["question"]
-                    full_log[market["condition_id"]]["token"] = token
-                    full_log[market["condition_id"]]["token_id"] = token_id
-                    full_log[market["condition_id"]]["size"] = size
-                    full_log[market["condition_id"]]["token_price"] = price
-                    full_log[market["condition_id"]]["increase_rates"] = market["increase_rates"]
-                    try:
-                        tlog_path = self.tr.make_book_order(token_id, price, size, side="B")
-                        print(f"トークンを価格{price}で、{size}個購入しました。")
-                        print(f"Order response saved to: {tlog_path}")
-                        full_log[market["condition_id"]]["result"] = "成功"
-                        log_path = log_dir / f"{time_str}_★.json"
-                    except:
-                        log_path = log_dir / f"{time_str}_☆.json"
-                        print(f"トークンを購入できませんでした。{log_path}を確認してください。")
-                        full_log[market["condition_id"]]["result"] = "失敗"
-                    
-                # full_logを保存
-                with open(log_path, "w", encoding="utf-8") as f:
-                    json.dump(full_log, f, ensure_ascii=False, indent=2)
-
-            time.sleep(POLL_INTERVAL_SECONDS)
-
-    def _update_price_history_and_detect_alert(
+        # print(json.dumps(snapshot, ensure_ascii=False))
+        # アラートが鳴った場合
+        if snapshot["alerts"] != []:
+            with self.scheduler.phase("execution"):
+                self._buy_alert_markets(snapshot["alerts"], snapshot["timestamp"])
+        return snapshot
+
+    def _buy_alert_markets(self, alerts: list[dict[str, Any]], timestamp: str) -> None:
+        print(timestamp)
+        for alert in alerts:
+            self.executor.submit(alert)
+
+    def _execute_buy_alert(self, alert: dict[str, Any], record: dict[str, Any]) -> None:
+        ## STEP 1: 現在の購入済トークンの状態を確認
+        market_data = self.tr.get_market_by_conditionid(alert["condition_id"])
+        _, token_info = summarize_event_and_market(market_data)
+        target = next(
+            (ti for ti in token_info or [] if ti["token_id"] == alert["token_id"]), None
+        )
+        if target is None:
+            raise RuntimeError(f"token {alert['token_id']} not found in market data")
+
+        size = max(1.01 / target["token_price"], 5.0)
+        price = float(target["token_price"]) * config.BUY_BUFFER_RATE
+        record["question"] = alert["question"]
+        record["token"] = target["token_name"]
+        record["token_id"] = target["token_id"]
+        record["size"] = size
+        record["token_price"] = price
+
+        ## STEP 2: 発注
+        tlog_path = self.tr.make_book_order(target["token_id"], price, size, side="B")
+        record["transaction_log_path"] = str(tlog_path)
+
+    def _detect_alerts(
         self,
-        *,
-        market: MarketInfo,
-        token: MarketToken,
-        current_price: float | None,
-    ) -> dict[str, Any] | None:
-        if current_price is None or current_price <= 0:
-            self.price_history.pop(token.token_id, None)
-            return None
-
-        history = self.price_history.setdefault(token.token_id, [])
-        history.append(current_price)
-        if len(history) > 3:
-            history.pop(0)
-
-        if len(history) < 3:
-            return None
-
-        first, second, third = history
-        if first <= 0 or second <= 0:
-            return None
-
-        first_change = (second - first) / first
-        second_change = (third - second) / second
-        if (
-            first_change >= CONSECUTIVE_INCREASE_THRESHOLD
-            and second_change >= CONSECUTIVE_INCREASE_THRESHOLD
-        ):
-            return {
+        token_refs: list[tuple[MarketInfo, MarketToken]],
+        current_prices: np.ndarray,
+    ) -> list[dict[str, Any]]:
+        token_ids = [token.token_id for _, token in token_refs]
+        signals = self.signals.update(token_ids, current_prices)
+
+        alerts: dict[str, dict[str, Any]] = {}
+        for signal in signals:
+            if signal.token_id in alerts:
+                alerts[signal.token_id]["signals"][signal.rule] = signal.values
+                continue
+            market, token = token_refs[signal.index]
+            alerts[signal.token_id] = {
                 "market_id": market.market_id,
                 "condition_id": market.condition_id,
                 "question": market.question,
                 "slug": market.slug,
                 "outcome": token.outcome,
                 "token_id": token.token_id,
-                "prices": [first, second, third],
-                "increase_rates": [first_change, second_change],
-                "message": (
-                    f"{token.outcome} price increased by 5%+ twice consecutively"
-                ),
+                "price": float(current_prices[signal.index]),
+                "detected_at": time.time(),
+                "signals": {signal.rule: signal.values},
+                "message": f"{token.outcome} triggered {signal.rule}",
             }
-
-        return None
+        return list(alerts.values())
 
     @staticmethod
     def _to_float(value: Any) -> float:
@@ -312,3 +352,15 @@ class PolymarketPriceTracker:
             return float(value)
         except (TypeError, ValueError):
             return 0.0
+
+    @staticmethod
+    def _utc_now() -> str:
+        return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+if __name__ == "__main__":
+    tracker = PolymarketPriceTracker()
+    if config.MARKET_STREAM_ENABLED:
+        tracker.stream_forever()
+    else:
+        tracker.poll_forever()
@@ -1,31 +1,32 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Any, Optional
-import requests
+from typing import Any, Iterable, Iterator, Optional
 import config
 import json
+from http_client import shared_client
+from market_cache import shared_cache
+from models import Event, Market
+from positions import Position, PositionService
 from pathlib import Path
-from matplotlib import pyplot as plt
 from datetime import datetime, timezone
-from dateutil.relativedelta import relativedelta
-import matplotlib.dates as mdates
-import base64
-from io import BytesIO
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from zoneinfo import ZoneInfo
-from eth_account import Account
-from py_clob_client_v2 import (
-    ClobClient,
-    OrderArgs,
-    PartialCreateOrderOptions,
-    SignatureTypeV2,
-)
-from py_clob_client_v2.clob_types import ApiCreds
-from py_clob_client_v2.order_builder.constants import BUY, SELL
-from py_clob_client_v2.clob_types import OrderType
+
+# matplotlib / dateutil / py_clob_client_v2 (eth_account) は読み込みが重いので、使う時に読み込む
+# （cron で何度も起動するスクリプトの大半は発注も図示もしない）
 
 CREDS_FILE = Path("api_creds.json")
-SIGNATURE_TYPE = SignatureTypeV2.POLY_GNOSIS_SAFE
+BATCH_ORDER_LIMIT = config.BATCH_ORDER_LIMIT
+EVENT_PAGE_SIZE = config.EVENT_PAGE_SIZE
+EVENT_MAX_PAGES = config.EVENT_MAX_PAGES
+MAX_CANDIDATE_MARKETS = config.MAX_CANDIDATE_MARKETS
+
+
+def signature_type():
+    from py_clob_client_v2 import SignatureTypeV2
+    return SignatureTypeV2.POLY_GNOSIS_SAFE
 
 class TRADE:
     """
@@ -39,214 +40,208 @@ class TRADE:
         self.data_api_base = config.DATA_API_BASE
         self.chain_id = config.CHAIN_ID
 
-        # セッションを使うとコネクション再利用できる（任意）
-        self.session = requests.Session()
+        # 共有HTTPクライアント（コネクション再利用・再試行・レート制限）
+        self.http = shared_client()
+        # マーケット情報はプロセス内で共有キャッシュする
+        self.market_cache = shared_cache()
+        # 発注用クライアントとAPIキー（初回発注時に作る）
+        self._clob_client = None
+        self._api_creds = None
+        self._clob_lock = threading.Lock()
+        # 価格履歴ストア・チャート・保有状況は初回に使う時に作る（self.history_store / self.charts / self.positions）
+        self._history_store = None
+        self._charts = None
+        self._positions = None
+        # enable_order_prep() を呼ぶと署名をプロセスプールで行う
+        self.order_prep = None
+
+    @property
+    def history_store(self):
+        """価格履歴はローカルに溜めて差分だけ取る"""
+        if self._history_store is None:
+            from history_store import PriceHistoryStore
+            self._history_store = PriceHistoryStore(self.get, self.clob_api_base)
+        return self._history_store
+
+    @property
+    def positions(self):
+        """保有状況のスナップショット（ページ送り・差分）"""
+        if self._positions is None:
+            self._positions = PositionService(self.get, self.data_api_base, self.funder)
+        return self._positions
+
+    @property
+    def charts(self):
+        """価格履歴チャート（同じ履歴なら描画し直さない）"""
+        if self._charts is None:
+            from charts import ChartService
+            self._charts = ChartService(self.get_price_history)
+        return self._charts
 
     def get(self, url: str, *, params: Optional[dict[str, Any]] = None) -> Any:
-        r = self.session.get(url, params=params, timeout=30)
-        r.raise_for_status()
-        return r.json()
+        return self.http.get(url, params=params)
 
-    def get_recent_event_list(self, limit: int = 20, tag_slug=None, volume_min: int = 10000, max_months_ahead: int = 6):
-        now = datetime.now(timezone.utc)
-        some_months_later = (now + relativedelta(months=max_months_ahead)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    def get_recent_event_list(self, limit: int = 20, tag_slug=None, volume_min: int = 10000, max_months_ahead: int = 6, offset: int = 0):
         url = f"{self.gemma_api_base}/events"
-        params = {
-            "closed": "false",
-            "active": "true",
-            "limit": limit,
-            "offset": 0,
-            "tag_slug": tag_slug,
-            "order": "volume24hr",
-            "volume_min": volume_min,
-            "end_date_max": some_months_later,
-            "ascending": "false",
-        }
+        params = self._event_params(tag_slug, volume_min, max_months_ahead)
+        params.update(limit=limit, offset=offset)
         events = self.get(url, params=params)
         return events
-    
-    def get_market_by_conditionid(self, condition_id):
-        url = f"{self.gemma_api_base}/markets"
-        params = {
-            "condition_ids": [condition_id],
-        }
-        markets = self.get(url, params=params)
-        marketdata = []
-        for market in markets:
-            market_id = int(market.get('id'))
-            condition_id = f"{market.get('conditionId')}"
-            question = f"{market.get('question')}"
-            detail = market.get('description')
-            tokenname = market.get('outcomes')
-            tokenprice = market.get('outcomePrices')
-            token_ids = market.get('clobTokenIds')
-            enddate = f"{market.get('endDate')}"
-            tokenname = json.loads(tokenname)
-            tokenprice = json.loads(tokenprice)
-            tokenprice = [float(p) for p in tokenprice]   
-            token_ids = json.loads(token_ids)
-            marketdata.append({
-                "market_id": market_id,
-                "condition_id": condition_id,
-                "question": question,
-                "description": detail,
-                "token_name": tokenname,
-                "token_price": tokenprice,
-                "token_ids": token_ids,
-                "end_date": enddate
-            })
-        
-        return json.dumps(marketdata, ensure_ascii=False, indent=2)
-
-
-    def get_recent_events_and_markets(self, tag_slug=None, volume_min=10000, max_months_ahead=6, max_higher_price=0.90):
-        events = self.get_recent_event_list(tag_slug=tag_slug, 
-                                            volume_min = volume_min, 
-                                            max_months_ahead=max_months_ahead)
-        eventdata = []
+
+    def iter_events(self, tag_slug=None, volume_min: int = 10000, max_months_ahead: int = 6,
+                    page_size: int = EVENT_PAGE_SIZE, max_pages: int = EVENT_MAX_PAGES) -> Iterator[dict]:
+        """
+        /events を volume24hr の降順にページ送りしながら1件ずつ返す（Gamma の生データ）
+        今のページを処理している間に次のページを先に取りに行く。途中でやめれば残りのページは取らない
+        """
+        def fetch(page):
+            return self.get_recent_event_list(limit=page_size, tag_slug=tag_slug, volume_min=volume_min,
+                                              max_months_ahead=max_months_ahead, offset=page * page_size)
+
+        pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="events-prefetch")
+        try:
+            pending = pool.submit(fetch, 0)
+            for page in range(max_pages):
+                events = pending.result()
+                last_page = len(events) < page_size or page + 1 >= max_pages
+                if not last_page:
+                    pending = pool.submit(fetch, page + 1)
+                yield from events
+                if last_page:
+                    return
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def filter_events(events: Iterable[dict], max_higher_price: float = 0.90, end_date_max: Optional[datetime] = None) -> Iterator[Event]:
+        """
+        Gamma の生データを Event に変換しながら、条件に合うマーケットだけ残す（1件ずつ流す）
+        Yes, No以外のトークンがあるものは除去
+        高い方の勝率がmax_higher_price以上のものは除去
+        終了日が過ぎている・end_date_max より後のものは除去
+        """
+        now = datetime.now(timezone.utc)
         for event in events:
-            event_id = int(event.get('id'))
-            title = f"{event.get('title')}"
-            detail = f" {event.get('description')}"
-            liquidity = float(event.get('liquidity', 0))
-            volume = float(event.get('volume', 0))
-            markets = event.get("markets", [])
             marketdata = []
-            for market in markets:
-                market_id = int(market.get('id'))
-                condition_id = f"{market.get('conditionId')}"
-                question = f"{market.get('question')}"
-                market_volume = float(market.get('volume', 0))
-                tokenname = market.get('outcomes')
-                tokenprice = market.get('outcomePrices')
-                token_ids = market.get('clobTokenIds')
-                enddate = f"{market.get('endDate')}"
-                """
-                Yes, No以外のトークンがあるものは除去
-                高い方の勝率がmax_higher_price以上のものは除去
-                """
-                if tokenname is not None:
-                    tokenname = json.loads(tokenname)
-                    if 'Yes' not in tokenname[0]:
-                        continue
-                else:
+            for market in event.get("markets", []):
+                parsed = Market.from_gamma(market)
+                if parsed is None or 'Yes' not in parsed.token_name[0]:
                     continue
-                if tokenprice is not None:
-                    tokenprice = json.loads(tokenprice)
-                    tokenprice = [float(p) for p in tokenprice]
-                    if max(tokenprice) > max_higher_price:
-                        continue
-                else:
+                if max(parsed.token_price) > max_higher_price:
                     continue
-                if token_ids is not None:
-                    token_ids = json.loads(token_ids)
-                else:
+                try:
+                    end_date = datetime.fromisoformat(parsed.end_date)
+                except ValueError:
                     continue
-
-                marketdata.append({
-                    "market_id": market_id,
-                    "condition_id": condition_id,
-                    "question": question,
-                    "volume": market_volume,
-                    "token_name": tokenname,
-                    "token_price": tokenprice,
-                    "token_ids": token_ids,
-                    "end_date": enddate
-                })
+                if end_date.tzinfo is None:
+                    end_date = end_date.replace(tzinfo=timezone.utc)
+                if end_date <= now or (end_date_max is not None and end_date > end_date_max):
+                    continue
+                # イベント一覧ではマーケットの説明文は使わない（プロンプトにはイベントの説明を使う）
+                parsed.description = None
+                marketdata.append(parsed)
             if len(marketdata) == 0:
                 continue
-            eventdata.append({
-                "event_id": event_id,
-                "title": title,
-                "description": detail.strip(),
-                "liquidity": liquidity,
-                "volume": volume,
-                "markets": marketdata
-            })
-
-        return json.dumps(eventdata, ensure_ascii=False, indent=2)
+            yield Event.from_gamma(event, marketdata)
+
+    def get_recent_events_and_markets(self, tag_slug=None, volume_min=10000, max_months_ahead=6, max_higher_price=0.90,
+                                      max_candidates: int = MAX_CANDIDATE_MARKETS) -> list[Event]:
+        """
+        条件に合うマーケットが max_candidates 件集まるまで /events をページ送りする
+        （集まった時点のイベントまで返すので、最後のイベントの分だけ超えることがある）
+        """
+        events = self.iter_events(tag_slug=tag_slug, volume_min=volume_min, max_months_ahead=max_months_ahead)
+        eventdata = []
+        n_markets = 0
+        try:
+            for event in self.filter_events(events, max_higher_price, self._end_date_max(max_months_ahead)):
+                eventdata.append(event)
+                n_markets += len(event.markets)
+                if n_markets >= max_candidates:
+                    break
+        finally:
+            events.close()
+        return eventdata
+
+    @staticmethod
+    def _end_date_max(max_months_ahead: int) -> datetime:
+        from dateutil.relativedelta import relativedelta
+        return datetime.now(timezone.utc) + relativedelta(months=max_months_ahead)
+
+    def _event_params(self, tag_slug, volume_min, max_months_ahead) -> dict:
+        return {
+            "closed": "false",
+            "active": "true",
+            "tag_slug": tag_slug,
+            "order": "volume24hr",
+            "volume_min": volume_min,
+            "end_date_max": self._end_date_max(max_months_ahead).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "ascending": "false",
+        }
     
-    def get_market_history_img(self, market_id: str, condition_id: str=""):
-        if condition_id == "":
-            url = f"{self.gemma_api_base}/markets/{market_id}"
-            market = self.get(url)
+    def get_market_raw(self, *, market_id: str = "", condition_id: str = "", need_prices: bool = True) -> dict:
+        """
+        Gamma のマーケット生データ（キャッシュ優先）
+        need_prices=False なら価格系が古くても静的情報が新しければキャッシュを返す
+        """
+        key = condition_id or str(market_id)
+        market = self.market_cache.get(key, need_prices=need_prices)
+        if market is not None:
+            return market
+        if condition_id:
+            markets = self.get(f"{self.gemma_api_base}/markets", params={"condition_ids": [condition_id]})
+            if not markets:
+                raise ValueError(f"market not found: condition_id={condition_id}")
+            market = markets[0]
         else:
-            url = f"{self.gemma_api_base}/markets?condition_ids={condition_id}"
-            market = self.get(url)[0]
-        token_info = []
-        token_name = json.loads(market.get('outcomes'))
-        token_id = json.loads(market.get('clobTokenIds'))
-        token_price = json.loads(market.get('outcomePrices'))
+            market = self.get(f"{self.gemma_api_base}/markets/{market_id}")
+        self.market_cache.put(market)
+        return market
+
+    def get_market_by_conditionid(self, condition_id) -> Market | None:
+        try:
+            market = self.get_market_raw(condition_id=condition_id)
+        except ValueError:
+            return None
+        return Market.from_gamma(market)
+
+    def get_market_history_img(self, market_id: str, condition_id: str=""):
         """
-        トークンの価格履歴を図示
+        トークンの価格履歴を図示（描画・キャッシュは ChartService）
         """
-        ts = {}
-        plt.figure()
-        for i in range(len(token_name)):
-            token_info.append({
-                'token_name': token_name[i],
-                'token_id': token_id[i],
-                'token_price': token_price[i]
-            })
-            url = f"{self.clob_api_base}/prices-history"
-            params = {
-                        "market": token_id[i],
-                        "interval": '6h'
-                    }
-            data = self.get(url, params=params)
-            ts['time'] = []
-            ts[token_name[i]] = []
-            for item in data["history"]:
-                ts["time"].append(datetime.utcfromtimestamp(item["t"])) 
-                ts[token_name[i]].append(item["p"])
-            plt.plot(ts['time'], ts[token_name[i]], label=token_name[i])
-        plt.gca().xaxis.set_major_formatter(mdates.DateFormatter("%m-%d %H:%M"))
-        plt.gca().xaxis.set_major_locator(mdates.AutoDateLocator())
-        plt.xticks(rotation=45)
-        plt.title(f"{market.get('question')}")
-        plt.xlabel('time')
-        plt.ylabel('price of tokens')
-        plt.legend()
-        plt.tight_layout()
-        # 画像を保存（日付フォルダ分割）
-        now = datetime.now(ZoneInfo("Asia/Tokyo"))
-        date_str = now.strftime("%Y%m%d")
-        time_str = now.strftime("%H%M%S")
-
-        # 日付ディレクトリ作成
-        img_dir = Path("img_logs") / date_str
-        img_dir.mkdir(parents=True, exist_ok=True)
-
-        # ファイル名生成
-        img_path = img_dir / f"{time_str}_{market_id}.png"
-
-        # 保存
-        plt.savefig(img_path, format="png", bbox_inches="tight")
-        # 画像をメモリに保存
-        buf = BytesIO()
-        plt.savefig(buf, format="png", bbox_inches="tight")
-        plt.close()  # メモリリーク防止
-        buf.seek(0)
-        # base64 エンコード
-        img_base64 = base64.b64encode(buf.read()).decode("utf-8")
-        
-        return img_path, img_base64
-    
-    def _get_api_creds(self):
-        if CREDS_FILE.exists():
+        # 図示に使うのは静的情報だけなので、価格が古くてもキャッシュを使う
+        market = self.get_market_raw(market_id=market_id, condition_id=condition_id, need_prices=False)
+        return self.charts.market_chart(market, name=market_id)
+
+    def get_price_history(self, token_id: str, interval: str = "6h"):
+        """直近 interval の価格履歴を (UNIX秒のリスト, 価格のリスト) で返す（差分だけ /prices-history から取る）"""
+        from history_store import INTERVAL_SECONDS
+        timestamps, prices = self.history_store.history(token_id, INTERVAL_SECONDS[interval])
+        return timestamps.tolist(), prices.tolist()
+
+    def _get_api_creds(self, refresh: bool = False):
+        """
+        APIキーはメモリに保持し、api_creds.json の読み込み・鍵の導出は初回（または拒否された時）だけ行う
+        """
+        if self._api_creds is not None and not refresh:
+            return self._api_creds
+        from py_clob_client_v2 import ClobClient
+        from py_clob_client_v2.clob_types import ApiCreds
+        if CREDS_FILE.exists() and not refresh:
             with open(CREDS_FILE) as f:
                 d = json.load(f)
-            return ApiCreds(
+            self._api_creds = ApiCreds(
                 api_key=d["api_key"],
                 api_secret=d["api_secret"],
                 api_passphrase=d["api_passphrase"],
             )
+            return self._api_creds
         # signature_type, funder は指定しない
         temp = ClobClient(
             host=self.clob_api_base,
             chain_id=self.chain_id,
             key=self.private_key,
-            signature_type=SIGNATURE_TYPE,
+            signature_type=signature_type(),
             funder=self.funder,
         )
 
@@ -257,69 +252,165 @@ class TRADE:
                 "api_secret": creds.api_secret,
                 "api_passphrase": creds.api_passphrase,
             }, f, indent=2)
+        self._api_creds = creds
         return creds
 
+    def _get_clob_client(self):
+        """
+        発注用クライアントは初回に1度だけ作って使い回す（tick size 等のキャッシュも生きる）
+        作成とAPIキー更新だけロックし、発注自体は複数スレッドから同時に呼んでよい
+        """
+        if self._clob_client is None:
+            with self._clob_lock:
+                if self._clob_client is None:
+                    from py_clob_client_v2 import ClobClient
+                    # signature_type, funder は指定しない（EOAとして直接取引）
+                    self._clob_client = ClobClient(
+                        host=self.clob_api_base,
+                        chain_id=self.chain_id,
+                        key=self.private_key,
+                        creds=self._get_api_creds(),
+                        signature_type=signature_type(),
+                        funder=self.funder,
+                    )
+        return self._clob_client
+
+    def _refresh_api_creds(self, rejected) -> None:
+        with self._clob_lock:
+            # 他のスレッドが既に更新済みなら何もしない
+            if self._api_creds is not rejected:
+                return
+            print("APIキーが拒否されたため再取得します")
+            creds = self._get_api_creds(refresh=True)
+            if self._clob_client is not None:
+                self._clob_client.set_api_creds(creds)
+
+    def _post_with_creds_refresh(self, post):
+        """post(client) を実行し、認証エラーならAPIキーを取り直して1回だけ再送する"""
+        from py_clob_client_v2.exceptions import PolyApiException
+        client = self._get_clob_client()
+        creds = client.creds
+        try:
+            return post(client)
+        except PolyApiException as exc:
+            if exc.status_code not in (401, 403):
+                raise
+            self._refresh_api_creds(creds)
+            return post(client)
+
+    def enable_order_prep(self, **kwargs):
+        """署名をプロセスプールに任せ、注文テンプレートを使うようにする（trackerから呼ぶ）"""
+        if self.order_prep is None:
+            from order_prep import OrderPreparer
+            self.order_prep = OrderPreparer(self, signature_type(), **kwargs)
+            self.order_prep.warm_up()
+        return self.order_prep
+
     def make_book_order(self, token_id: str, price: float, size: int, side: str):
+        from py_clob_client_v2 import OrderArgs, OrderType, PartialCreateOrderOptions
         from py_clob_client_v2.order_builder.constants import BUY, SELL
-        from py_clob_client_v2.clob_types import OrderType
+        if self.order_prep is not None:
+            signed = self.order_prep.sign(token_id, price, size, side)
+            resp = self._post_with_creds_refresh(
+                lambda client: client.post_order(signed, OrderType.GTC)
+            )
+        else:
+            order_side = BUY if side == "B" else SELL
+            order_args = OrderArgs(token_id=token_id, price=price, size=size, side=order_side)
+            options = PartialCreateOrderOptions(tick_size="0.01", neg_risk=False)
+            resp = self._post_with_creds_refresh(
+                lambda client: client.create_and_post_order(order_args, options=options)
+            )
+        print(f"結果: {resp}")
+        self._invalidate_positions()
+        return self._write_transaction_log(resp)
 
-        # signature_type, funder は指定しない（EOAとして直接取引）
-        client = ClobClient(
-            host=self.clob_api_base,
-            chain_id=self.chain_id,
-            key=self.private_key,
-            creds=self._get_api_creds(),
-            signature_type=SIGNATURE_TYPE,
-            funder=self.funder,
-        )
+    def make_book_orders(self, orders: list[dict[str, Any]]):
+        """
+        複数の注文をまとめて署名し、/orders に BATCH_ORDER_LIMIT 件ずつ送る
+        orders: [{"token_id", "price", "size", "side"("B"/"S")}, ...]
+        戻り値: (注文ごとの結果リスト（orders と同じ順）, トランザクションログのパス)
+            結果は注文の内容に "success" と "response" または "error" を足したもの
+        """
+        from py_clob_client_v2 import OrderType
+        from py_clob_client_v2.clob_types import PostOrdersV2Args
+        results = [dict(order, success=False) for order in orders]
+        signed = []  # (results の添字, 署名済み注文)
+        for i, order in enumerate(self._sign_orders(orders)):
+            if isinstance(order, Exception):
+                results[i]["error"] = f"署名に失敗: {order}"
+            else:
+                signed.append((i, order))
 
-        order_side = BUY if side == "B" else SELL
-        resp = client.create_and_post_order(
-            OrderArgs(token_id=token_id, price=price, size=size, side=order_side),
-            options=PartialCreateOrderOptions(tick_size="0.01", neg_risk=False),
-        )
-        print(f"結果: {resp}")
+        for start in range(0, len(signed), BATCH_ORDER_LIMIT):
+            chunk = signed[start : start + BATCH_ORDER_LIMIT]
+            args = [PostOrdersV2Args(order=order, orderType=OrderType.GTC) for _, order in chunk]
+            try:
+                responses = self._post_with_creds_refresh(lambda client: client.post_orders(args))
+            except Exception as exc:
+                for i, _ in chunk:
+                    results[i]["error"] = str(exc)
+                continue
+            if not isinstance(responses, list) or len(responses) != len(chunk):
+                for i, _ in chunk:
+                    results[i]["error"] = f"想定外のレスポンス: {responses}"
+                continue
+            for (i, _), resp in zip(chunk, responses):
+                results[i]["response"] = resp
+                results[i]["success"] = isinstance(resp, dict) and bool(resp.get("success"))
+                if not results[i]["success"]:
+                    results[i]["error"] = resp.get("errorMsg") if isinstance(resp, dict) else str(resp)
 
+        succeeded = sum(1 for result in results if result["success"])
+        print(f"結果: {succeeded}/{len(results)}件の注文が成功")
+        if succeeded:
+            self._invalidate_positions()
+        return results, self._write_transaction_log(results)
+
+    def _invalidate_positions(self) -> None:
+        # 約定すると保有数が変わるので、次の get_self_status(force=False) で取り直す
+        if self._positions is not None:
+            self._positions.invalidate()
+
+    def _sign_orders(self, orders: list[dict[str, Any]]) -> list[Any]:
+        """orders と同じ順に、署名済み注文か例外を返す"""
+        if self.order_prep is not None:
+            return self.order_prep.sign_many(orders)
+        from py_clob_client_v2 import OrderArgs, PartialCreateOrderOptions
+        from py_clob_client_v2.order_builder.constants import BUY, SELL
+        client = self._get_clob_client()
+        options = PartialCreateOrderOptions(tick_size="0.01", neg_risk=False)
+        signed = []
+        for order in orders:
+            order_args = OrderArgs(
+                token_id=order["token_id"],
+                price=order["price"],
+                size=order["size"],
+                side=BUY if order["side"] == "B" else SELL,
+            )
+            try:
+                signed.append(client.create_order(order_args, options))
+            except Exception as exc:
+                signed.append(exc)
+        return signed
+
+    @staticmethod
+    def _write_transaction_log(resp) -> Path:
         now = datetime.now(ZoneInfo("Asia/Tokyo"))
         log_dir = Path("transaction_logs") / now.strftime("%Y%m%d")
         log_dir.mkdir(parents=True, exist_ok=True)
-        log_path = log_dir / f"{now.strftime('%H%M%S')}.txt"
+        log_path = log_dir / f"{now.strftime('%H%M%S_%f')}.txt"
         with open(log_path, "w", encoding="utf-8") as f:
             json.dump(resp if isinstance(resp, (dict, list)) else str(resp), f, ensure_ascii=False, indent=2)
         return log_path
-    
-    def get_self_status(self):
-        url = f"{self.data_api_base}/positions"
-        params = {
-            "user": self.funder,
-        }
-        data = self.get(url, params=params)
-        self_status = []
-
-        for dat in data:
-            condition_id = dat['conditionId']
-            delta =  dat['currentValue'] - dat['size'] * dat['avgPrice']
-            lines = []
-            lines.append(f"タイトル: {dat['title']}")
-            lines.append(f"あなたの所持トークン: {dat['outcome']}")
-            lines.append(f"あなたのトークン保有数: {dat['size']}")
-            lines.append(f"あなたのトークン購入時の平均買値(単価): ${dat['avgPrice']}")
-            lines.append(f"現在のトークン価値(単価): ${dat['currentValue'] / dat['size']}")
-            lines.append(f"あなたがトークン購入に費やした総額: ${dat['size'] * dat['avgPrice']}")
-            lines.append(f"今このトークンをすべて売却すると得られるお金: ${dat['currentValue']}")
-            lines.append(f"予想が当たった時、このトークンと交換できるお金: ${dat['size'] * 1.0}")
-            summary_text = "\n".join(lines)
-            self_status.append({
-                "condition_id": condition_id,
-                "delta": delta,
-                "text": summary_text,
-                "token_name": dat['outcome'],
-                "token_id": dat["asset"],
-                "size": float(dat['size']),
-                "price": float(dat['currentValue'] / dat['size']),
-                "avr_price": float(dat['avgPrice'])
-            })
-        return self_status
+
+    def get_self_status(self, force: bool = True) -> list[Position]:
+        """
+        保有中のポジション一覧（全ページ）
+        force=False なら POSITION_REFRESH_SECONDS 以内は前回の一覧を返す（差分は self.positions.refresh() で取れる）
+        """
+        self.positions.refresh(force=force)
+        return self.positions.positions
 
 
 if __name__=='__main__':
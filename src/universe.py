@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from typing import Any
+
+import config
+
+TOP_MARKET_COUNT = config.TOP_MARKET_COUNT
+
+# 差分判定に使う生データの構造的なフィールド（これ以外が変わっても再パースしない）
+# liquidity / volume はほぼ毎回変わるので含めず、キャッシュした MarketInfo をその場で更新する
+FINGERPRINT_FIELDS = (
+    "active",
+    "closed",
+    "enableOrderBook",
+    "outcomes",
+    "clobTokenIds",
+    "conditionId",
+    "question",
+    "slug",
+    "endDate",
+)
+
+
+@dataclass
+class MarketToken:
+    token_id: str
+    outcome: str
+
+
+@dataclass
+class MarketInfo:
+    market_id: str
+    condition_id: str
+    question: str
+    slug: str | None
+    liquidity: float
+    volume: float
+    end_date: str | None
+    tokens: list[MarketToken]
+
+
+@dataclass
+class UniverseDelta:
+    added: list[MarketInfo] = field(default_factory=list)
+    removed: list[MarketInfo] = field(default_factory=list)
+    changed: list[MarketInfo] = field(default_factory=list)
+    removed_token_ids: set[str] = field(default_factory=set)
+    reparsed: int = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+
+class MarketUniverse:
+    """
+    パース済みのマーケットを market_id で保持し、構造的なフィールドが変わったものだけ再パースする
+    refresh() の度に上位 TOP_MARKET_COUNT 件を選び直し、前回との差分を返す
+    （changed は再パースしたもの。liquidity / volume の更新だけでは changed にならない）
+    """
+    def __init__(self, top_count: int = TOP_MARKET_COUNT) -> None:
+        self.top_count = top_count
+        self.markets: list[MarketInfo] = []
+        self._parsed: dict[str, tuple[tuple[Any, ...], MarketInfo | None]] = {}
+
+    def refresh(self, raw_markets: list[dict[str, Any]]) -> UniverseDelta:
+        delta = UniverseDelta()
+        parsed: dict[str, tuple[tuple[Any, ...], MarketInfo | None]] = {}
+        for raw in raw_markets:
+            market_id = str(raw.get("id"))
+            fingerprint = tuple(raw.get(name) for name in FINGERPRINT_FIELDS)
+            cached = self._parsed.get(market_id)
+            if cached is not None and cached[0] == fingerprint:
+                info = cached[1]
+                if info is not None:
+                    info.liquidity, info.volume = _liquidity_and_volume(raw)
+                parsed[market_id] = cached
+                continue
+            parsed[market_id] = (fingerprint, self._parse_market(raw))
+            delta.reparsed += 1
+        self._parsed = parsed
+
+        candidates = [info for _, info in parsed.values() if info is not None]
+        candidates.sort(key=lambda item: item.liquidity, reverse=True)
+        top = candidates[: self.top_count]
+
+        previous = {market.market_id: market for market in self.markets}
+        current = {market.market_id: market for market in top}
+        for market_id, market in current.items():
+            old = previous.get(market_id)
+            if old is None:
+                delta.added.append(market)
+            elif old is not market:
+                delta.changed.append(market)
+        delta.removed = [market for market_id, market in previous.items() if market_id not in current]
+
+        old_tokens = {token.token_id for market in self.markets for token in market.tokens}
+        new_tokens = {token.token_id for market in top for token in market.tokens}
+        delta.removed_token_ids = old_tokens - new_tokens
+
+        self.markets = top
+        return delta
+
+    @staticmethod
+    def _parse_market(market: dict[str, Any]) -> MarketInfo | None:
+        if not market.get("active") or market.get("closed"):
+            return None
+        if not market.get("enableOrderBook"):
+            return None
+
+        outcomes_raw = market.get("outcomes")
+        token_ids_raw = market.get("clobTokenIds")
+        if not outcomes_raw or not token_ids_raw:
+            return None
+
+        try:
+            outcomes = json.loads(outcomes_raw)
+            token_ids = json.loads(token_ids_raw)
+        except (TypeError, json.JSONDecodeError):
+            return None
+
+        if len(outcomes) != len(token_ids) or len(token_ids) < 2:
+            return None
+
+        liquidity, volume = _liquidity_and_volume(market)
+        tokens = [
+            MarketToken(token_id=str(token_id), outcome=str(outcome))
+            for outcome, token_id in zip(outcomes, token_ids)
+        ]
+
+        return MarketInfo(
+            market_id=str(market.get("id")),
+            condition_id=str(market.get("conditionId")),
+            question=str(market.get("question") or ""),
+            slug=market.get("slug"),
+            liquidity=liquidity,
+            volume=volume,
+            end_date=market.get("endDate"),
+            tokens=tokens,
+        )
+
+
+def _liquidity_and_volume(market: dict[str, Any]) -> tuple[float, float]:
+    return (
+        _to_float(market.get("liquidityNum", market.get("liquidity", 0))),
+        _to_float(market.get("volumeNum", market.get("volume", 0))),
+    )
+
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0